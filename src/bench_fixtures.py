@@ -0,0 +1,90 @@
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from hadith import Hadith
+from hadith_database import HadithDatabase
+
+# Arabic letters used to build synthetic narrator names
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+
+def random_word(rng, length=5):
+    return ''.join(rng.choice(LETTERS) for _ in range(length))
+
+
+def synthetic_narrators(count, seed=0):
+    """
+    Yield (name, location, death_date, link, truncated_names) rows for count
+    distinct narrators, each with two aliases.
+    """
+    rng = random.Random(seed)
+    locations = ["Madinah", "Makkah", "Basra", "Kufa", "Baghdad"]
+    for i in range(count):
+        first, last = random_word(rng), random_word(rng)
+        name = f"{first} بن {last} {i}"
+        aliases = [f"{first} {i}", f"ابن {last} {i}"]
+        yield name, rng.choice(locations), rng.randint(50, 300), None, aliases
+
+
+def synthetic_hadith_texts(narrator_names, count, chain_length=6, seed=0):
+    """
+    Yield raw hadith texts whose isnads are drawn from narrator_names.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        isnad = "\n".join(f"حَدَّثَنَا {name}" for name in rng.sample(narrator_names, chain_length))
+        matn = " ".join(random_word(rng) for _ in range(20))
+        yield f"{isnad}\n\n{matn}"
+
+
+def populate_narrators(db, narrators):
+    rows = list(synthetic_narrators(narrators))
+    db.add_narrators(rows)
+    return rows
+
+
+def build_corpus_database(db_path, hadiths, narrators):
+    db = HadithDatabase(db_path, profile="bulk-load")
+    rows = populate_narrators(db, narrators)
+    names = [row[0] for row in rows]
+    db.insert_hadiths((Hadith(text) for text in synthetic_hadith_texts(names, hadiths)), commit_every=10000)
+    db.close()
+
+
+@contextmanager
+def corpus_database(hadiths, narrators):
+    # Yield (temporary directory, database path) for a synthetic corpus, removed afterwards
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'hadith.db')
+        build_corpus_database(db_path, hadiths, narrators)
+        yield tmp, db_path
+
+
+def report(label, count, seconds):
+    print(f"{label}: {count} in {seconds:.3f}s ({count / seconds:,.0f}/s)")
+
+
+def timed(label, function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    print(f"{label}: {(time.perf_counter() - start) / repeat * 1000:.2f}ms")
+    return result
+
+
+def measure_peak(function):
+    """
+    Run function under tracemalloc, returning its result, the peak traced
+    memory, the memory still held once it returned, and the elapsed time.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, retained, seconds
@@ -0,0 +1,190 @@
+import os
+import random
+import tempfile
+import time
+
+from bench_fixtures import corpus_database, measure_peak, report, synthetic_narrators, timed
+from common_link import score_narrators
+from graph_export import EXPORTERS, export_narrator_graph
+from graph_snapshot import GraphSnapshot, snapshot_is_current, write_snapshot
+from hadith_database import HadithDatabase
+from hadith_tree import HadithTree
+
+
+def bench_narrator_graph(hadiths=50000, narrators=2000):
+    """
+    Load time of the narrator transmission graph and latency of its queries.
+    """
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        db = HadithDatabase(db_path, profile="serving")
+
+        graph = timed("Load graph", lambda: db.narrator_graph)
+        print(f"{len(graph)} edges")
+        top_id = timed("Out-degree ranking", lambda: graph.degree_ranking(limit=10), repeat=10)[0][0]
+        timed("In-degree ranking (weighted)", lambda: graph.degree_ranking("in", weighted=True, limit=10), repeat=10)
+        timed("Students of a narrator", lambda: graph.students_of(top_id), repeat=100)
+        chains = timed("Chains through a narrator", lambda: db.get_chains_through_narrator(top_id), repeat=10)
+        print(f"{len(chains)} chains")
+
+        db.close()
+
+
+def synthetic_transmissions(edges, chain_length=6, layer_width=2000, seed=0):
+    """
+    Return (teacher_id, student_id, hadith_id) rows for about edges transmissions
+    along random chains through layers of narrators, each layer wider than the
+    one above it so chains converge towards the source.
+    """
+    rng = random.Random(seed)
+    widths = [max(1, layer_width >> (2 * layer)) for layer in range(chain_length)]
+    offsets = [sum(widths[:layer]) for layer in range(chain_length)]
+
+    rows = []
+    hadith_id = 0
+    while len(rows) < edges:
+        hadith_id += 1
+        chain = [offsets[layer] + rng.randrange(widths[layer]) for layer in range(chain_length)]
+        rows.extend((chain[layer + 1], chain[layer], hadith_id) for layer in range(chain_length - 1))
+    return rows
+
+
+def bench_common_link(edges=1000000):
+    """
+    Common link scoring throughput on a synthetic transmission graph.
+    """
+    rows = synthetic_transmissions(edges)
+
+    start = time.perf_counter()
+    scores = score_narrators(rows)
+    report("Scored transmissions", len(rows), time.perf_counter() - start)
+
+    common_link = scores[0]
+    print(f"Common link {common_link.narrator_id}: {common_link.chains} chains over {common_link.branches} branches")
+
+
+def bench_subgraph(hadiths=100000, narrators=5000):
+    """
+    Latency of each subgraph selector on a synthetic corpus.
+    """
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        tree = HadithTree(db_path)
+        name = next(synthetic_narrators(1))[0]
+
+        for label, function in (
+            ("Narrator, 1 hop up and down", lambda: tree.subgraph.around_narrator(name, up=1, down=1)),
+            ("Geography", lambda: tree.subgraph.for_geography("Basra")),
+            ("Death-date range", lambda: tree.subgraph.for_death_range(100, 110)),
+            ("100 hadith ids", lambda: tree.subgraph.for_hadiths(range(1, hadiths, hadiths // 100))),
+        ):
+            elements = timed(label, function)
+            print(f"  {len(elements)} elements")
+
+        tree.close()
+
+
+def bench_graph_export(edges=1000000):
+    """
+    Time and peak memory of streaming a synthetic narrator graph to each
+    export format available.
+    """
+    rows = synthetic_transmissions(edges)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = HadithDatabase(os.path.join(tmp, 'hadith.db'), profile="bulk-load")
+        narrator_ids = {narrator_id for row in rows for narrator_id in row[:2]}
+        db.conn.executemany(
+            'INSERT INTO Narrators (id, name, location, death_date) VALUES (?, ?, ?, ?)',
+            ((narrator_id, f"narrator {narrator_id}", "Basra", 100 + narrator_id % 200) for narrator_id in sorted(narrator_ids)),
+        )
+        db.conn.executemany('INSERT OR IGNORE INTO NarratorTransmissions (teacher_id, student_id, hadith_id) VALUES (?, ?, ?)', rows)
+        db.conn.commit()
+        del rows
+        graph_edges = db.conn.execute('SELECT COUNT(*) FROM (SELECT 1 FROM NarratorTransmissions GROUP BY teacher_id, student_id)').fetchone()[0]
+        print(f"{len(narrator_ids)} narrators, {graph_edges} edges")
+
+        for file_format in EXPORTERS:
+            path = os.path.join(tmp, f'graph_{file_format}')
+            try:
+                _, peak, _, seconds = measure_peak(lambda: export_narrator_graph(db, path, file_format))
+            except ImportError as e:
+                print(f"{file_format}: skipped, {e}")
+                continue
+            print(f"{file_format}: {seconds:.2f}s, peak {peak / 2**20:.1f} MiB")
+        db.close()
+
+
+def bench_snapshot(hadiths=100000, narrators=5000):
+    """
+    Size and write time of the binary snapshot, and how long a process takes
+    to be ready to answer from it compared with from the database.
+    """
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        snapshot_path = os.path.join(tmp, 'hadith.snapshot')
+        db = HadithDatabase(db_path, profile="serving")
+        timed("Write snapshot", lambda: write_snapshot(db, snapshot_path))
+        print(f"{os.path.getsize(snapshot_path) / 2**20:.1f} MiB")
+        timed("Check the snapshot is current", lambda: snapshot_is_current(db, snapshot_path))
+        db.close()
+
+        def database_ready():
+            database = HadithDatabase(db_path, profile="serving")
+            database.narrator_graph.degree_ranking(limit=1)
+            return database
+
+        def snapshot_ready():
+            snapshot = GraphSnapshot(snapshot_path)
+            snapshot.degree_ranking(limit=1)
+            return snapshot
+
+        db = timed("Database: open and load the graph", database_ready)
+        snapshot = timed("Snapshot: open and rank narrators", snapshot_ready)
+        timed("Database: read every hadith", lambda: sum(1 for _ in db.iter_hadiths_with_isnad()))
+        timed("Snapshot: read every hadith", lambda: sum(1 for _ in snapshot.iter_hadiths()))
+        narrator_id = snapshot.degree_ranking(limit=1)[0][0]
+        timed("Snapshot: students of a narrator", lambda: snapshot.students_of(narrator_id), repeat=1000)
+        snapshot.close()
+        db.close()
+
+
+def bench_corpus_stats(hadiths=100000, narrators=5000):
+    """
+    Corpus statistics computed with CorpusStats compared with a loop over
+    iter_hadiths_with_isnad, as in the notebooks it replaces. Needs numpy.
+    """
+    from corpus_stats import CorpusStats
+
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        db = HadithDatabase(db_path, profile="serving")
+        links = db.conn.execute('SELECT COUNT(*) FROM Isnads').fetchone()[0]
+        print(f"{links} isnad links")
+
+        def loop():
+            lengths, frequency = [], {}
+            for hadith in db.iter_hadiths_with_isnad():
+                lengths.append(len({link.position_in_chain for link in hadith.isnad}))
+                for link in hadith.isnad:
+                    frequency[link.name] = frequency.get(link.name, 0) + 1
+            return sum(lengths) / len(lengths), frequency
+
+        def every_statistic(stats):
+            return (
+                stats.chain_lengths(), stats.narrator_frequency(), stats.geography_flows(),
+                stats.death_date_gaps(), stats.era_histogram(),
+            )
+
+        timed("Loop: isnad length and narrator frequency", loop)
+        stats = CorpusStats(db)
+        timed("CorpusStats: load the columns", lambda: stats.data)
+        timed("CorpusStats: every statistic", lambda: every_statistic(stats))
+        timed("CorpusStats: every statistic, cached", lambda: every_statistic(stats), repeat=100)
+        stats.close()
+        db.close()
+
+
+BENCHMARKS = {
+    "graph": bench_narrator_graph,
+    "common-link": bench_common_link,
+    "subgraph": bench_subgraph,
+    "graph-export": bench_graph_export,
+    "snapshot": bench_snapshot,
+    "stats": bench_corpus_stats,
+}
@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from bench_fixtures import populate_narrators, report, synthetic_hadith_texts, synthetic_narrators
+from hadith import Hadith
+from hadith_database import HadithDatabase
+from main import HADITH_DIR, iter_hadiths, list_hadith_files, load_hadith_from_file, sync_hadiths
+
+
+def bench_bulk_ingest(hadiths=100000, legacy_hadiths=10000, narrators=5000):
+    """
+    Isnad rows per second written by insert_hadiths compared with calling
+    insert_hadith once per hadith (one commit each) on an on-disk database.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db = HadithDatabase(os.path.join(tmp, 'hadith.db'))
+        rows = populate_narrators(db, narrators)
+        names = [row[0] for row in rows]
+
+        parsed = [Hadith(text) for text in synthetic_hadith_texts(names, hadiths)]
+        isnad_rows = sum(len(hadith.narrators) for hadith in parsed)
+
+        start = time.perf_counter()
+        for hadith in parsed[:legacy_hadiths]:
+            db.insert_hadith(hadith)
+        legacy_rows = sum(len(hadith.narrators) for hadith in parsed[:legacy_hadiths])
+        report("Per-hadith insert (isnad rows)", legacy_rows, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db.insert_hadiths(parsed)
+        report("Bulk insert_hadiths (isnad rows)", isnad_rows, time.perf_counter() - start)
+
+        db.close()
+
+
+def bench_parallel_parse(files=20000, workers=None, narrators=2000):
+    """
+    Hadith files parsed per second serially and with a process pool.
+    """
+    workers = workers or os.cpu_count()
+    names = [row[0] for row in synthetic_narrators(narrators)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_hadith_files(tmp, synthetic_hadith_texts(names, files))
+
+        start = time.perf_counter()
+        serial = [hadith.narrators for hadith in iter_hadiths(tmp)]
+        report("Serial parse", files, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        parallel = [hadith.narrators for hadith in iter_hadiths(tmp, workers=workers)]
+        report(f"Parallel parse ({workers} workers)", files, time.perf_counter() - start)
+
+        if serial != parallel:
+            print("Error: parallel output differs from serial output.")
+
+
+def write_hadith_files(directory, texts):
+    for i, text in enumerate(texts):
+        with open(os.path.join(directory, f"h_{i:06d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def bench_incremental_sync(files=20000, edited=10, narrators=2000):
+    """
+    Time a full sync of a hadiths directory against a re-sync after editing a
+    handful of files.
+    """
+    names = [row[0] for row in synthetic_narrators(narrators)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        hadith_dir = os.path.join(tmp, 'hadiths')
+        os.mkdir(hadith_dir)
+        write_hadith_files(hadith_dir, synthetic_hadith_texts(names, files))
+
+        db = HadithDatabase(os.path.join(tmp, 'hadith.db'))
+        populate_narrators(db, narrators)
+
+        start = time.perf_counter()
+        sync_hadiths(db, hadith_dir)
+        report("Full sync (files)", files, time.perf_counter() - start)
+
+        for i in range(edited):
+            with open(os.path.join(hadith_dir, f"h_{i:06d}.txt"), 'a', encoding='utf-8') as f:
+                f.write(" تعديل")
+
+        start = time.perf_counter()
+        added, updated, removed = sync_hadiths(db, hadith_dir)
+        print(f"Re-sync after editing {edited} files: {time.perf_counter() - start:.3f}s "
+              f"(added {added}, updated {updated}, removed {removed})")
+
+        db.close()
+
+
+def bench_connection_profiles(hadiths=20000, narrators=2000, reads=5):
+    """
+    Ingest and full-corpus read throughput for each connection profile, and
+    reads completed by a serving connection while an ingest is running.
+    """
+    rows = list(synthetic_narrators(narrators))
+    names = [row[0] for row in rows]
+    parsed = [Hadith(text) for text in synthetic_hadith_texts(names, hadiths)]
+    isnad_rows = sum(len(hadith.narrators) for hadith in parsed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in ("default", "ingest", "bulk-load"):
+            db_path = os.path.join(tmp, f"{profile}.db")
+            db = HadithDatabase(db_path, profile=profile)
+            db.add_narrators(rows)
+
+            start = time.perf_counter()
+            db.insert_hadiths(parsed, commit_every=1000)
+            report(f"{profile}: ingest (isnad rows)", isnad_rows, time.perf_counter() - start)
+            db.close()
+
+        for profile in ("default", "serving"):
+            db = HadithDatabase(os.path.join(tmp, "default.db"), profile=profile)
+            start = time.perf_counter()
+            for _ in range(reads):
+                db.get_all_hadiths_with_isnad()
+            report(f"{profile}: full-corpus reads", reads, time.perf_counter() - start)
+            db.close()
+
+        # A serving reader alongside an ingesting writer on the same WAL database
+        db_path = os.path.join(tmp, "ingest.db")
+        writing = threading.Event()
+        writing.set()
+        completed = []
+        errors = []
+
+        def read_while_writing():
+            reader = HadithDatabase(db_path, profile="serving")
+            while writing.is_set():
+                try:
+                    reader.get_hadith_with_isnad(1)
+                    completed.append(1)
+                except sqlite3.OperationalError as e:
+                    errors.append(e)
+            reader.close()
+
+        thread = threading.Thread(target=read_while_writing)
+        thread.start()
+        writer = HadithDatabase(db_path, profile="ingest")
+        start = time.perf_counter()
+        writer.insert_hadiths(parsed, commit_every=1000)
+        seconds = time.perf_counter() - start
+        writing.clear()
+        thread.join()
+        writer.close()
+        print(f"Concurrent: {len(completed)} reads during a {seconds:.2f}s ingest, {len(errors)} lock errors")
+
+
+def bench_hadith_parse(repeat=2000):
+    """
+    Micro-benchmarks for Hadith parsing and its normalization steps, run over
+    the hadiths directory repeated to get stable timings.
+    """
+    texts = [load_hadith_from_file(os.path.join(HADITH_DIR, path)) for path in list_hadith_files()]
+    texts = texts * (repeat // len(texts) + 1)
+    hadith = Hadith(texts[0])
+    words = [word for text in texts[:repeat] for word in text.split()]
+    lines = [line for text in texts[:repeat] for line in text.split("\n")]
+
+    start = time.perf_counter()
+    for text in texts[:repeat]:
+        Hadith(text)
+    report("Hadiths parsed", repeat, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for word in words:
+        hadith.remove_tashkeel(word)
+    report("remove_tashkeel (words)", len(words), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for line in lines:
+        hadith.remove_honorifics(line)
+    report("remove_honorifics (lines)", len(lines), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for line in lines:
+        hadith.remove_introductory_words(line)
+    report("remove_introductory_words (lines)", len(lines), time.perf_counter() - start)
+
+
+BENCHMARKS = {
+    "ingest": bench_bulk_ingest,
+    "parse": bench_parallel_parse,
+    "hadith": bench_hadith_parse,
+    "sync": bench_incremental_sync,
+    "profiles": bench_connection_profiles,
+}
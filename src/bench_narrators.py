@@ -0,0 +1,214 @@
+import csv
+import os
+import random
+import tempfile
+import time
+
+from bench_fixtures import LETTERS, populate_narrators, random_word, report, synthetic_narrators
+from hadith import Hadith
+from hadith_database import HadithDatabase
+
+
+def bench_narrator_resolver(narrators=50000, lookups=200000):
+    """
+    Time to build the in-memory narrator index, and lookups per second of
+    the indexed NarratorAliases table, against a synthetic narrator table.
+    """
+    db = HadithDatabase(':memory:')
+    rows = populate_narrators(db, narrators)
+
+    start = time.perf_counter()
+    db.narrator_resolver
+    report("Build narrator index", narrators, time.perf_counter() - start)
+
+    rng = random.Random(1)
+    queries = [rng.choice(rows[rng.randrange(narrators)][4]) for _ in range(lookups)]
+
+    start = time.perf_counter()
+    for query in queries:
+        db.find_narrator_candidates(query)
+    report("Indexed NarratorAliases lookups", lookups, time.perf_counter() - start)
+
+    db.close()
+
+
+def misspell(rng, name, edits=1):
+    # Replace, drop or insert a letter, edits times
+    for _ in range(edits):
+        position = rng.randrange(len(name))
+        edit = rng.randrange(3)
+        if edit == 0:
+            name = name[:position] + rng.choice(LETTERS) + name[position + 1:]
+        elif edit == 1:
+            name = name[:position] + name[position + 1:]
+        else:
+            name = name[:position] + rng.choice(LETTERS) + name[position:]
+    return name
+
+
+def bench_fuzzy_narrators(narrators=50000, lookups=2000):
+    """
+    Latency and top-1 accuracy of fuzzy narrator matching for misspelled
+    names and aliases, and latency for names that match nothing.
+    """
+    db = HadithDatabase(':memory:')
+    rows = populate_narrators(db, narrators)
+    resolver = db.narrator_resolver
+
+    start = time.perf_counter()
+    resolver.fuzzy_candidates(rows[0][0])
+    print(f"Build trigram index over {len(resolver)} names and aliases: {time.perf_counter() - start:.3f}s")
+
+    rng = random.Random(2)
+    for edits in (1, 2):
+        queries = []
+        for _ in range(lookups):
+            narrator_id = rng.randrange(narrators)
+            queries.append((narrator_id + 1, misspell(rng, rng.choice([rows[narrator_id][0], *rows[narrator_id][4]]), edits)))
+
+        start = time.perf_counter()
+        correct = sum(
+            bool(matches) and matches[0].narrator_id == narrator_id
+            for narrator_id, matches in ((narrator_id, resolver.fuzzy_candidates(query)) for narrator_id, query in queries)
+        )
+        seconds = time.perf_counter() - start
+        print(f"{edits} edit(s): {seconds / lookups * 1000:.2f}ms per name, top-1 accuracy {correct / lookups:.3f}")
+
+    queries = [f"{random_word(rng)} {random_word(rng)}" for _ in range(lookups)]
+    start = time.perf_counter()
+    for query in queries:
+        resolver.fuzzy_candidates(query)
+    print(f"Unknown names: {(time.perf_counter() - start) / lookups * 1000:.2f}ms per name")
+    db.close()
+
+
+def synthetic_lineages(generations=6, width=300, teachers=3, seed=0):
+    """
+    Return narrators for a world of teacher -> student lineages: each
+    generation died 40 years before the next, and every narrator learned
+    from a few fixed teachers of the previous generation. Every narrator
+    also has a shared alias used by one other narrator, either of the same
+    generation or of a much older one. Returns (rows, teachers_of, shared)
+    where rows are add_narrators rows, teachers_of maps a narrator index to
+    its teachers and shared maps it to its shared alias.
+    """
+    rng = random.Random(seed)
+    rows, teachers_of, shared = [], {}, {}
+    for generation in range(generations):
+        for i in range(width):
+            index = generation * width + i
+            rows.append((f"{random_word(rng)} بن {random_word(rng)} {index}", "Basra", 300 - 40 * generation, None, []))
+            if generation + 1 < generations:
+                teachers_of[index] = rng.sample(range((generation + 1) * width, (generation + 2) * width), teachers)
+
+    indexes = list(range(len(rows)))
+    rng.shuffle(indexes)
+    for a, b in zip(indexes[::2], indexes[1::2]):
+        shared[a] = shared[b] = f"{random_word(rng)} {a}"
+        rows[a][4].append(shared[a])
+        rows[b][4].append(shared[b])
+    return rows, teachers_of, shared
+
+
+def lineage_chain(rng, teachers_of, width, length):
+    # Walk from a collector of the youngest generation up through their teachers
+    chain = [rng.randrange(width)]
+    while len(chain) < length and chain[-1] in teachers_of:
+        chain.append(rng.choice(teachers_of[chain[-1]]))
+    return chain
+
+
+def bench_disambiguation(training=20000, labeled=2000, generations=6, width=300):
+    """
+    Accuracy and links per second of resolving ambiguous aliases from chain
+    context. A training corpus written with full names fills the narrator
+    graph, then a labeled set of chains is written with shared aliases only.
+    """
+    rows, teachers_of, shared = synthetic_lineages(generations, width)
+    rng = random.Random(3)
+    db = HadithDatabase(':memory:')
+    db.add_narrators(rows)
+
+    texts = []
+    for _ in range(training):
+        chain = lineage_chain(rng, teachers_of, width, generations)
+        texts.append("\n".join(f"حَدَّثَنَا {rows[index][0]}" for index in chain) + "\n\nمتن")
+    db.insert_hadiths(Hadith(text) for text in texts)
+
+    # The collector keeps their full name so the chain has an anchor
+    labeled_chains = [lineage_chain(rng, teachers_of, width, generations) for _ in range(labeled)]
+    hadiths = [
+        Hadith("\n".join([f"حَدَّثَنَا {rows[chain[0]][0]}"] + [f"عَنْ {shared[index]}" for index in chain[1:]]) + "\n\nمتن")
+        for chain in labeled_chains
+    ]
+    links = sum(len(chain) - 1 for chain in labeled_chains)
+
+    # Narrator ids follow the order of rows
+    first_listed = sum(
+        db.find_narrator_candidates(shared[index])[0] == index + 1
+        for chain in labeled_chains for index in chain[1:]
+    )
+
+    db.narrator_graph  # Loaded once before timing
+    start = time.perf_counter()
+    isnads = [db.resolve_isnad(hadith) for hadith in hadiths]
+    seconds = time.perf_counter() - start
+
+    correct = sum(
+        narrator_ids == [index + 1]
+        for chain, isnad in zip(labeled_chains, isnads) for index, narrator_ids in zip(chain[1:], isnad[1:])
+    )
+    print(f"First listed candidate accuracy: {first_listed / links:.3f}")
+    print(f"Chain context accuracy: {correct / links:.3f}")
+    report("Ambiguous links resolved", links, seconds)
+
+    # The same chains with full names, which need no context
+    hadiths = [Hadith("\n".join(f"حَدَّثَنَا {rows[index][0]}" for index in chain) + "\n\nمتن") for chain in labeled_chains]
+    start = time.perf_counter()
+    for hadith in hadiths:
+        db.resolve_isnad(hadith)
+    report("Unambiguous links resolved", links, time.perf_counter() - start)
+    db.close()
+
+
+def write_narrators_csv(file_path, rows):
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'location', 'death_date', 'link', 'truncated_names'])
+        for name, location, death_date, link, aliases in rows:
+            writer.writerow([name, location, death_date, link or '', '|'.join(aliases)])
+
+
+def bench_narrator_sync(narrators=50000):
+    """
+    Time loading a narrators CSV and re-syncing it after editing one line.
+    """
+    rows = list(synthetic_narrators(narrators))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'narrators.csv')
+        write_narrators_csv(csv_path, rows)
+
+        db = HadithDatabase(os.path.join(tmp, 'hadith.db'))
+        start = time.perf_counter()
+        db.read_narrators_from_csv(csv_path)
+        report("Initial CSV load (narrators)", narrators, time.perf_counter() - start)
+        db.narrator_resolver
+
+        name, location, death_date, link, aliases = rows[narrators // 2]
+        rows[narrators // 2] = (name, "Baghdad", death_date + 1, link, aliases)
+        write_narrators_csv(csv_path, rows)
+
+        start = time.perf_counter()
+        db.read_narrators_from_csv(csv_path)
+        print(f"Re-sync after editing one line: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        db.close()
+
+
+BENCHMARKS = {
+    "resolver": bench_narrator_resolver,
+    "narrator-sync": bench_narrator_sync,
+    "fuzzy": bench_fuzzy_narrators,
+    "disambiguation": bench_disambiguation,
+}
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from bench_fixtures import build_corpus_database, corpus_database, measure_peak, random_word, timed
+from hadith_tree import HadithTree
+from layout import LayoutCache
+from records import elements_to_json, to_cytoscape
+
+
+def bench_tree_memory(hadiths=20000, narrators=2000):
+    """
+    Memory of whole-corpus tree generation: peak when loading the full join
+    first compared with streaming, and bytes held per element as Node/Edge
+    records compared with the Cytoscape.js dicts used before.
+    """
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        tree = HadithTree(db_path)
+
+        def from_lists():
+            return tree.build_hadith_tree_for_multiple_hadiths(*tree.fetch_all_hadiths())
+
+        def from_stream():
+            return tree.build_hadith_tree_for_multiple_hadiths(tree.db.iter_hadiths_with_isnad())
+
+        for label, function in (("Full join", from_lists), ("Streaming", from_stream)):
+            elements, peak, retained, seconds = measure_peak(function)
+            print(f"{label}: {len(elements)} elements, peak {peak / 2**20:.1f} MiB, {seconds:.2f}s")
+
+        print(f"Records: {retained / len(elements):.0f} bytes/element")
+        dicts, peak, retained, seconds = measure_peak(lambda: to_cytoscape(elements))
+        print(f"Cytoscape dicts: {retained / len(dicts):.0f} bytes/element")
+
+        tree.close()
+
+
+def bench_layout(hadiths=2000, narrators=2000):
+    """
+    Time of the layered layout of a whole-corpus tree, and of a layout cache
+    hit for the same tree from memory and from disk.
+    """
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        tree = HadithTree(db_path)
+        elements = tree.build_hadith_tree_for_multiple_hadiths(tree.db.iter_hadiths_with_isnad())
+        print(f"{len(elements)} elements")
+
+        cache = LayoutCache(os.path.join(tmp, 'layouts'))
+        timed("Layout", lambda: cache.positions(elements))
+        timed("Cached layout (memory)", lambda: cache.positions(elements), repeat=10)
+        timed("Cached layout (disk)", lambda: LayoutCache(cache.cache_dir).positions(elements), repeat=10)
+
+        tree.close()
+
+
+def bench_chunked_export(sizes=(2000, 8000), narrators=2000):
+    """
+    Peak Python memory of exporting the whole-corpus tree as one JSON string
+    (what generate_html is given) compared with streaming it to chunk files,
+    at growing corpus sizes.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        for hadiths in sizes:
+            db_path = os.path.join(tmp, f'hadith_{hadiths}.db')
+            build_corpus_database(db_path, hadiths, narrators)
+            tree = HadithTree(db_path)
+
+            def single_file():
+                elements = tree.build_hadith_tree_for_multiple_hadiths(tree.db.iter_hadiths_with_isnad())
+                return len(elements_to_json(elements, tree.layout_cache.positions(elements)))
+
+            def chunked():
+                return tree.generate_chunked_tree_from_database({}, os.path.join(tmp, f'chunks_{hadiths}'))
+
+            for label, function in (("Single JSON", single_file), ("Chunked", chunked)):
+                _, peak, _, seconds = measure_peak(function)
+                print(f"{hadiths} hadiths, {label}: peak {peak / 2**20:.1f} MiB, {seconds:.2f}s")
+
+            tree.close()
+
+
+def bench_render_cache(hadiths=2000, narrators=2000, repeat=20):
+    """
+    Time to produce the HTML of one hadith's tree and of the whole corpus,
+    regenerated every time compared with served from the render cache.
+    """
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        colors = {"Basra": "#F5CBA7"}
+        uncached = HadithTree(db_path)
+        cached = HadithTree(db_path, render_cache_dir=os.path.join(tmp, 'render_cache'))
+        output_path = os.path.join(tmp, 'tree.html')
+
+        def regenerate_hadith():
+            uncached.render_html(uncached.fetch_hadith_tree_data(hadiths // 2), colors, output_path)
+
+        def regenerate_corpus():
+            elements = uncached.build_hadith_tree_for_multiple_hadiths(uncached.db.iter_hadiths_with_isnad())
+            uncached.layout_cache.layouts.clear()  # Time the layout too, as a new process would
+            uncached.render_html(elements, colors, output_path)
+
+        timed("One hadith, regenerated", regenerate_hadith, repeat)
+        cached.generate_tree_html(hadiths // 2, colors)
+        timed("One hadith, cached", lambda: cached.generate_tree_html(hadiths // 2, colors), repeat)
+        timed("Corpus, regenerated", regenerate_corpus)
+        cached.generate_tree_from_database(colors)
+        timed("Corpus, cached", lambda: cached.generate_tree_from_database(colors), repeat)
+
+        uncached.close()
+        cached.close()
+
+
+async def http_get(reader, writer, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode('utf-8'))
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def load_test(port, paths, concurrency):
+    """
+    Request paths over concurrency keep-alive connections, returning the
+    latency of each request and the total time.
+    """
+    queue = list(reversed(paths))
+    latencies = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        while queue:
+            path = queue.pop()
+            start = time.perf_counter()
+            status = await http_get(reader, writer, path)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                print(f"{path}: HTTP {status}")
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def bench_tree_server(hadiths=20000, narrators=2000, requests=4000, concurrency=200):
+    """
+    p50/p99 latency of the tree server under concurrency clients, for a mix
+    of hadith trees (80%) and searches, cold and then served from the render
+    cache. The server runs in its own process, as it would in use.
+    """
+    with corpus_database(hadiths, narrators) as (tmp, db_path):
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tree_server.py'),
+             '--db', db_path, '--port', '0', '--render-cache', os.path.join(tmp, 'render_cache')],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            port = int(server.stdout.readline().rsplit(':', 1)[1].strip('/\n'))
+
+            rng = random.Random(0)
+            words = [random_word(rng, 3) for _ in range(50)]
+            paths = [
+                f"/hadith/{rng.randrange(1, hadiths + 1)}/tree" if rng.random() < 0.8
+                else f"/search?q={quote(rng.choice(words))}*&limit=10"
+                for _ in range(requests)
+            ]
+
+            for label in ("Cold", "Cached"):
+                latencies, seconds = asyncio.run(load_test(port, paths, concurrency))
+                latencies.sort()
+                p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+                print(f"{label}: {len(latencies) / seconds:.0f} requests/s, p50 {p50 * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+BENCHMARKS = {
+    "tree-memory": bench_tree_memory,
+    "layout": bench_layout,
+    "chunked-export": bench_chunked_export,
+    "render-cache": bench_render_cache,
+    "server": bench_tree_server,
+}
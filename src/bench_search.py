@@ -0,0 +1,99 @@
+import os
+import random
+import tempfile
+import time
+
+from bench_fixtures import build_corpus_database, random_word, report, synthetic_narrators, timed
+from hadith_database import HadithDatabase
+
+
+def synthetic_matn_families(families, variants=5, edit_rate=0.15, seed=0):
+    """
+    Yield (family, matn) pairs: families of variant wordings, each variant
+    replacing, dropping or inserting about edit_rate of a base matn's words.
+    """
+    rng = random.Random(seed)
+    for family in range(families):
+        base = [random_word(rng, rng.randint(3, 6)) for _ in range(25)]
+        for _ in range(variants):
+            words = []
+            for word in base:
+                edit = rng.random()
+                if edit < edit_rate / 3:
+                    words.append(random_word(rng, len(word)))
+                elif edit < edit_rate * 2 / 3:
+                    continue
+                elif edit < edit_rate:
+                    words.extend((word, random_word(rng, 4)))
+                else:
+                    words.append(word)
+            yield family, " ".join(words)
+
+
+def count_pairs(groups):
+    return sum(len(group) * (len(group) - 1) // 2 for group in groups)
+
+
+def bench_matn_clusters(families=4000, variants=5):
+    """
+    Throughput of the incremental matn index and the recall and precision of
+    its clusters against synthetic families of variant matns.
+    """
+    matns = list(synthetic_matn_families(families, variants))
+    db = HadithDatabase(':memory:')
+
+    start = time.perf_counter()
+    db.index_matns((hadith_id, matn) for hadith_id, (_, matn) in enumerate(matns, 1))
+    db.conn.commit()
+    report("Matns indexed", len(matns), time.perf_counter() - start)
+
+    clusters = timed("Cluster listing", db.get_matn_clusters)
+
+    # Pairs of variants from the same family that ended up in the same cluster
+    true_pairs = families * variants * (variants - 1) // 2
+    clustered_pairs = count_pairs(clusters.values())
+    correct_pairs = count_pairs(
+        [hadith_id for hadith_id in hadith_ids if matns[hadith_id - 1][0] == family]
+        for hadith_ids in clusters.values()
+        for family in {matns[hadith_id - 1][0] for hadith_id in hadith_ids}
+    )
+    print(f"{len(clusters)} clusters for {families} families")
+    print(f"Recall: {correct_pairs / true_pairs:.3f}, precision: {correct_pairs / max(clustered_pairs, 1):.3f}")
+
+    # One more variant of an existing family, as on insert
+    start = time.perf_counter()
+    db.index_matns([(len(matns) + 1, matns[0][1] + " " + random_word(random.Random(1)))])
+    report("Incremental insert", 1, time.perf_counter() - start)
+    db.close()
+
+
+def bench_search(hadiths=100000, narrators=5000, repeat=20):
+    """
+    Latency of full-text searches on a synthetic corpus.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'hadith.db')
+        start = time.perf_counter()
+        build_corpus_database(db_path, hadiths, narrators)
+        report("Hadiths ingested and indexed", hadiths, time.perf_counter() - start)
+
+        db = HadithDatabase(db_path, profile="serving")
+        matn = db.conn.execute('SELECT matn FROM Hadiths WHERE id = ?', (hadiths // 2,)).fetchone()[0].split()
+        name = next(synthetic_narrators(1))[0]
+
+        for label, query, columns, phrase in (
+            ("One word", matn[0], None, False),
+            ("Two words", f"{matn[1]} {matn[2]}", None, False),
+            ("Prefix", f"{matn[3][:3]}*", None, False),
+            ("Narrator name as a phrase", name, ["narrators"], True),
+        ):
+            results = timed(label, lambda: db.search(query, columns=columns, phrase=phrase), repeat)
+            print(f"  {len(results)} results")
+
+        db.close()
+
+
+BENCHMARKS = {
+    "matn-cluster": bench_matn_clusters,
+    "search": bench_search,
+}
@@ -0,0 +1,28 @@
+import argparse
+
+import bench_graph
+import bench_ingest
+import bench_narrators
+import bench_render
+import bench_search
+
+# Each area's benchmarks live in its bench_* module, fixtures in bench_fixtures
+BENCHMARKS = {
+    **bench_narrators.BENCHMARKS,
+    **bench_ingest.BENCHMARKS,
+    **bench_graph.BENCHMARKS,
+    **bench_render.BENCHMARKS,
+    **bench_search.BENCHMARKS,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run pyicma benchmarks.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args()
+
+    for name in args.names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark '{name}'")
+        print(f"--- {name} ---")
+        BENCHMARKS[name]()
@@ -0,0 +1,173 @@
+from typing import NamedTuple
+
+COMMON_LINK = "common link"
+PARTIAL_COMMON_LINK = "partial common link"
+
+
+class NarratorScore(NamedTuple):
+    """
+    How many distinct partial chains converge on a narrator within a set of
+    hadiths. branches is the number of distinct students the narrator passed
+    the hadith to, and kind marks the common link and partial common links.
+    cyclic marks narrators on a cycle, scored together with the rest of it.
+    """
+    narrator_id: int
+    chains: int
+    branches: int
+    hadiths: int
+    kind: str = None
+    cyclic: bool = False
+
+
+def strongly_connected_components(successors):
+    """
+    Return the strongly connected components of a graph given as
+    {node: successors}, as lists of nodes. Uses an iterative Tarjan's
+    algorithm, so every component comes after the components it reaches.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in successors:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors[child])))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while not component or component[-1] != node:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    components.append(component)
+    return components
+
+
+def score_narrators(transmissions):
+    """
+    Score every narrator of a set of (teacher_id, student_id, hadith_id)
+    transmissions. The number of chains converging on a narrator is the
+    number of distinct paths from it down to the collectors, counted with one
+    pass over the narrators in topological order, so this is linear in the
+    number of transmissions. Cycles (a name repeated in one chain) are
+    condensed first, each counting as one narrator whose members share its
+    score and are marked cyclic. Returns NarratorScore records ranked with
+    the common link first.
+    """
+    students = {}
+    teachers = {}
+    hadiths = {}
+    for teacher_id, student_id, hadith_id in transmissions:
+        students.setdefault(teacher_id, set()).add(student_id)
+        students.setdefault(student_id, set())
+        teachers.setdefault(student_id, set()).add(teacher_id)
+        hadiths.setdefault(teacher_id, set()).add(hadith_id)
+        hadiths.setdefault(student_id, set()).add(hadith_id)
+
+    # Walk up from the collectors, who have no students, towards the source
+    component_of = {}
+    component_chains = []
+    chains = {}
+    cyclic = set()
+    for component_id, component in enumerate(strongly_connected_components(students)):
+        for narrator_id in component:
+            component_of[narrator_id] = component_id
+        below = {component_of[student_id] for narrator_id in component for student_id in students[narrator_id]}
+        if len(component) > 1 or component_id in below:
+            cyclic.update(component)
+        below.discard(component_id)
+
+        component_chains.append(sum(component_chains[student_component] for student_component in below) if below else 1)
+        for narrator_id in component:
+            chains[narrator_id] = component_chains[component_id]
+
+    scores = sorted(
+        (
+            NarratorScore(
+                narrator_id, chains[narrator_id], len(students[narrator_id]), len(hadiths[narrator_id]),
+                cyclic=narrator_id in cyclic,
+            )
+            for narrator_id in students
+        ),
+        key=lambda score: (-(score.branches >= 2), -score.chains, -score.hadiths, score.narrator_id),
+    )
+
+    # The narrator where most chains fan out is the common link, the other
+    # branching narrators are partial common links
+    for index, score in enumerate(scores):
+        if score.branches < 2:
+            break
+        scores[index] = score._replace(kind=COMMON_LINK if index == 0 else PARTIAL_COMMON_LINK)
+
+    return scores
+
+
+class CommonLinkAnalyzer:
+    """
+    Common link (madar) detection over the NarratorTransmissions of a
+    HadithDatabase. Results are cached per set of hadiths and dropped when an
+    ingest touches one of those hadiths.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.cache = {}  # frozenset of hadith ids, or None for the whole corpus -> scores
+        self.data_version = self.db.get_data_version()
+        self.db.ingest_listeners.append(self.invalidate)
+
+    def invalidate(self, hadith_ids=None):
+        """
+        Drop cached results for clusters containing any of hadith_ids, or all
+        cached results if hadith_ids is None.
+        """
+        if hadith_ids is None:
+            self.cache.clear()
+            return
+
+        hadith_ids = set(hadith_ids)
+        for cluster in list(self.cache):
+            if cluster is None or not hadith_ids.isdisjoint(cluster):
+                del self.cache[cluster]
+
+    def analyze(self, hadith_ids=None):
+        """
+        Return NarratorScore records for the given hadiths, or the whole corpus.
+        """
+        # Another connection committed since the cache was filled
+        data_version = self.db.get_data_version()
+        if data_version != self.data_version:
+            self.cache.clear()
+            self.data_version = data_version
+
+        cluster = frozenset(hadith_ids) if hadith_ids is not None else None
+        if cluster not in self.cache:
+            self.cache[cluster] = score_narrators(self.db.get_transmissions(cluster))
+        return self.cache[cluster]
+
+    def common_links(self, hadith_ids=None, limit=10):
+        """
+        Return the common link and partial common links, best candidate first.
+        """
+        return [score for score in self.analyze(hadith_ids) if score.kind][:limit]
+
+    def close(self):
+        if self.invalidate in self.db.ingest_listeners:
+            self.db.ingest_listeners.remove(self.invalidate)
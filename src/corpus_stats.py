@@ -0,0 +1,252 @@
+import argparse
+from typing import NamedTuple
+
+import numpy as np
+
+from hadith_database import TEACHER_DIED_BEFORE_STUDENT_YEARS, TEACHER_OUTLIVED_STUDENT_YEARS, HadithDatabase
+from narrator_resolver import parse_death_date
+
+ISNAD_LINKS_SQL = 'SELECT hadith_id, position_in_chain, narrator_id FROM Isnads ORDER BY hadith_id, position_in_chain'
+TRANSMISSIONS_SQL = 'SELECT teacher_id, student_id FROM NarratorTransmissions'
+
+
+class ChainLengths(NamedTuple):
+    """
+    Number of positions in the isnads of the corpus (co-narrators count once).
+    histogram[n] is the number of hadiths with an isnad of n positions.
+    """
+    hadiths: int
+    mean: float
+    median: float
+    maximum: int
+    histogram: dict
+
+
+class DeathDateGaps(NamedTuple):
+    """
+    Teacher's death date minus student's over every transmission where both
+    are known, in years. Negative when the teacher died first, as expected.
+    implausible counts the pairs outside the bounds used to disambiguate names.
+    """
+    transmissions: int
+    mean: float
+    median: float
+    p10: float
+    p90: float
+    implausible: int
+    histogram: dict  # Start of each bin of years -> transmissions
+
+
+class CorpusData:
+    """
+    The Isnads and NarratorTransmissions tables as NumPy columns, with the
+    narrator attributes they refer to. Narrators are referred to by their
+    index in narrator_ids; links to narrators no longer in the table are dropped.
+    """
+    def __init__(self, db):
+        narrators = db.conn.execute('SELECT id, name, location, death_date FROM Narrators ORDER BY id').fetchall()
+        self.narrator_ids = np.array([row[0] for row in narrators], dtype=np.int64)
+        self.names = [row[1] for row in narrators]
+
+        # Locations as codes into self.locations, -1 when unknown
+        self.locations = sorted({row[2] for row in narrators if row[2]})
+        codes = {location: code for code, location in enumerate(self.locations)}
+        self.location_codes = np.array([codes.get(row[2], -1) for row in narrators], dtype=np.int64)
+
+        death_dates = (parse_death_date(row[3]) for row in narrators)
+        self.death_dates = np.array(
+            [np.nan if death_date is None else death_date for death_date in death_dates], dtype=np.float64
+        )
+
+        links = np.array(db.conn.execute(ISNAD_LINKS_SQL).fetchall(), dtype=np.int64).reshape(-1, 3)
+        narrators_of_links, known = self.narrator_indexes(links[:, 2])
+        self.link_hadiths = links[known, 0]
+        self.link_positions = links[known, 1]
+        self.link_narrators = narrators_of_links[known]
+
+        transmissions = np.array(db.conn.execute(TRANSMISSIONS_SQL).fetchall(), dtype=np.int64).reshape(-1, 2)
+        teachers, known_teachers = self.narrator_indexes(transmissions[:, 0])
+        students, known_students = self.narrator_indexes(transmissions[:, 1])
+        known = known_teachers & known_students
+        self.teachers = teachers[known]
+        self.students = students[known]
+
+    def narrator_indexes(self, narrator_ids):
+        # Index of each id in self.narrator_ids, and whether it is there
+        if not len(self.narrator_ids):
+            return np.zeros(len(narrator_ids), dtype=np.int64), np.zeros(len(narrator_ids), dtype=bool)
+        indexes = np.searchsorted(self.narrator_ids, narrator_ids).clip(max=len(self.narrator_ids) - 1)
+        return indexes, self.narrator_ids[indexes] == narrator_ids
+
+
+def binned(values, bin_years):
+    # {start of bin: count} for an array of years
+    bins, counts = np.unique((np.floor(values / bin_years) * bin_years).astype(np.int64), return_counts=True)
+    return dict(zip(bins.tolist(), counts.tolist()))
+
+
+class CorpusStats:
+    """
+    Corpus statistics computed with NumPy over columns loaded once from a
+    HadithDatabase. Results are cached until the data changes, either by an
+    ingest through this connection or a commit from another one.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.cache = {}  # (statistic, arguments) -> result, and 'data' -> CorpusData
+        self.data_version = self.db.get_data_version()
+        self.db.ingest_listeners.append(self.invalidate)
+
+    def invalidate(self, hadith_ids=None):
+        self.cache.clear()
+
+    def cached(self, key, compute):
+        # Another connection committed since the cache was filled
+        data_version = self.db.get_data_version()
+        if data_version != self.data_version:
+            self.cache.clear()
+            self.data_version = data_version
+
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    @property
+    def data(self):
+        return self.cached('data', lambda: CorpusData(self.db))
+
+    def chain_lengths(self):
+        """
+        Return the ChainLengths of every hadith with an isnad.
+        """
+        def compute():
+            data = self.data
+            hadiths, positions = data.link_hadiths, data.link_positions
+            if not len(hadiths):
+                return ChainLengths(0, 0.0, 0.0, 0, {})
+
+            # Links are ordered by hadith then position, so each change starts a new position
+            new_hadith = np.empty(len(hadiths), dtype=bool)
+            new_hadith[0] = True
+            new_hadith[1:] = hadiths[1:] != hadiths[:-1]
+            new_position = new_hadith.copy()
+            new_position[1:] |= positions[1:] != positions[:-1]
+
+            lengths = np.add.reduceat(new_position.astype(np.int64), np.flatnonzero(new_hadith))
+            counts = np.bincount(lengths)
+            histogram = {length: int(count) for length, count in enumerate(counts) if count}
+            return ChainLengths(len(lengths), float(lengths.mean()), float(np.median(lengths)), int(lengths.max()), histogram)
+
+        return self.cached(('chain_lengths',), compute)
+
+    def narrator_frequency(self, limit=20):
+        """
+        Return (narrator id, name, isnad links) for the narrators appearing in
+        the most isnads, most frequent first.
+        """
+        def compute():
+            data = self.data
+            counts = np.bincount(data.link_narrators, minlength=len(data.narrator_ids))
+            # Stable sort on the negated counts keeps ties in narrator id order
+            top = np.argsort(-counts, kind='stable')[:limit]
+            return [
+                (int(data.narrator_ids[index]), data.names[index], int(counts[index]))
+                for index in top if counts[index]
+            ]
+
+        return self.cached(('narrator_frequency', limit), compute)
+
+    def geography_flows(self):
+        """
+        Return (locations, matrix) where matrix[i, j] is the number of
+        transmissions from a teacher in locations[i] to a student in
+        locations[j]. Narrators without a location are left out.
+        """
+        def compute():
+            data = self.data
+            teachers = data.location_codes[data.teachers]
+            students = data.location_codes[data.students]
+            known = (teachers >= 0) & (students >= 0)
+            size = len(data.locations)
+            matrix = np.bincount(teachers[known] * size + students[known], minlength=size * size).reshape(size, size)
+            return data.locations, matrix
+
+        return self.cached(('geography_flows',), compute)
+
+    def death_date_gaps(self, bin_years=10):
+        """
+        Return the DeathDateGaps between teachers and students.
+        """
+        def compute():
+            data = self.data
+            gaps = data.death_dates[data.teachers] - data.death_dates[data.students]
+            gaps = gaps[~np.isnan(gaps)]
+            if not len(gaps):
+                return DeathDateGaps(0, 0.0, 0.0, 0.0, 0.0, 0, {})
+
+            implausible = int(np.count_nonzero(
+                (gaps > TEACHER_OUTLIVED_STUDENT_YEARS) | (gaps < -TEACHER_DIED_BEFORE_STUDENT_YEARS)
+            ))
+            p10, median, p90 = np.percentile(gaps, [10, 50, 90])
+            return DeathDateGaps(
+                len(gaps), float(gaps.mean()), float(median), float(p10), float(p90), implausible, binned(gaps, bin_years)
+            )
+
+        return self.cached(('death_date_gaps', bin_years), compute)
+
+    def era_histogram(self, bin_years=50, weighted=False):
+        """
+        Return {start year: narrators} for narrators by death date, or the
+        number of isnad links of those narrators if weighted.
+        """
+        def compute():
+            data = self.data
+            death_dates = data.death_dates[data.link_narrators] if weighted else data.death_dates
+            return binned(death_dates[~np.isnan(death_dates)], bin_years)
+
+        return self.cached(('era_histogram', bin_years, weighted), compute)
+
+    def report(self, top=10):
+        """
+        Return a plain text report of every statistic.
+        """
+        lines = []
+        lengths = self.chain_lengths()
+        lines.append(f"Hadiths with an isnad: {lengths.hadiths}")
+        lines.append(f"Isnad length: mean {lengths.mean:.2f}, median {lengths.median:g}, max {lengths.maximum}")
+        lines.extend(f"  {length:>3} positions: {count}" for length, count in lengths.histogram.items())
+
+        lines.append("\nMost frequent narrators:")
+        lines.extend(f"  {count:>7}  {name} ({narrator_id})" for narrator_id, name, count in self.narrator_frequency(top))
+
+        locations, matrix = self.geography_flows()
+        lines.append("\nTransmissions between locations (teacher -> student):")
+        flows = sorted(zip(*np.nonzero(matrix)), key=lambda pair: -matrix[pair])
+        lines.extend(f"  {matrix[i, j]:>7}  {locations[i]} -> {locations[j]}" for i, j in flows[:top])
+
+        gaps = self.death_date_gaps()
+        lines.append(f"\nDeath date gaps (teacher - student) over {gaps.transmissions} transmissions:")
+        lines.append(f"  mean {gaps.mean:.1f}, median {gaps.median:g}, 10th-90th percentile {gaps.p10:g} to {gaps.p90:g}")
+        lines.append(f"  implausible: {gaps.implausible}")
+
+        lines.append("\nNarrators by death date:")
+        lines.extend(f"  {start:>5}: {count}" for start, count in self.era_histogram().items())
+        return "\n".join(lines)
+
+    def close(self):
+        if self.invalidate in self.db.ingest_listeners:
+            self.db.ingest_listeners.remove(self.invalidate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print statistics of the hadith corpus.")
+    parser.add_argument("--db", default="data/hadith.db", help="Database file")
+    parser.add_argument("--top", type=int, default=10, help="Narrators and location pairs listed")
+    args = parser.parse_args()
+
+    # "serving" opens the file with mode=ro, so the report can neither write to nor create the database
+    db = HadithDatabase(args.db, profile="serving")
+    stats = CorpusStats(db)
+    print(stats.report(args.top))
+    stats.close()
+    db.close()
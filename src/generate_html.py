@@ -1,6 +1,83 @@
 import json
 
-def generate_html(tree_data_json, geography_colors):
+# Shared by the single-file page and the chunked viewer, pasted into their scripts
+DARKER_COLOR_JS = """    // Function to generate a slightly darker border color
+    function darkerColor(color) {
+      const darkerHex = (hex) => Math.max(0, hex - 40).toString(16).padStart(2, '0');  // Darken by 40 (hex)
+      const r = darkerHex(parseInt(color.slice(1, 3), 16));
+      const g = darkerHex(parseInt(color.slice(3, 5), 16));
+      const b = darkerHex(parseInt(color.slice(5, 7), 16));
+        
+      const darkColor = `#${r}${g}${b}`;  // Format correctly as a hex color
+      
+      return darkColor;
+    }"""
+
+NODE_STYLES = """      style: [
+        {
+          selector: 'node',
+          style: {
+            'label': 'data(label)',
+            'text-valign': 'center',
+            'text-halign': 'center',
+            'background-color': (ele) => geographyColors[ele.data('geography')] || '#D3D3D3',  // Assign color based on geography
+            'border-color': function(ele) { 
+              const geographyColor = geographyColors[ele.data('geography')] || '#D3D3D3';
+              return darkerColor(geographyColor);  // Apply the darker color
+            },
+            'border-width': 2,
+            'shape': 'rectangle',
+            'width': '150px',
+            'height': '40px',
+            'font-family': 'Arial, sans-serif',  // Ensure text looks good for Arabic
+            'font-size': '14px',
+            'direction': 'rtl',  // Right-to-left direction for Arabic text
+            'text-align': 'right'
+          }
+        },
+        {
+          selector: 'node[isMatn]',  // Style for matn nodes
+          style: {
+            'label': 'data(label)',
+            'background-color': '#f0f0f0',  // Light gray background for matn
+            'border-color': '#ddd',
+            'border-width': 2,
+            'shape': 'rectangle',
+            'width': '150px',  // Match width to parent node
+            'height': function(ele) {
+              const textLength = ele.data('label').length;
+              const estimatedLines = Math.ceil(textLength / 30);  // Estimate lines based on 30 chars per line
+              const baseHeight = 20;  // Base height for a single line
+              const buffer = 1.2;  // 20% buffer for additional space
+              return (baseHeight * estimatedLines * buffer) + 'px';  // Calculate dynamic height
+            },
+            'font-family': 'Arial, sans-serif',
+            'font-size': '14px',
+            'direction': 'rtl',  // Right-to-left for Arabic text
+            'text-halign': 'center',  // Ensure text is aligned to the right within the box
+            'text-valign': 'center',  // Vertical alignment (adjust if you need something else)
+            'text-wrap': 'wrap',  // Enable text wrapping
+            'text-max-width': '150px',  // Match node width
+            'padding': '5px'  // Padding for better readability
+          }
+
+        },
+        {
+          selector: 'edge',
+          style: {
+            'width': 2,
+            'line-color': '#ccc',
+            'target-arrow-color': '#ccc',
+            'target-arrow-shape': 'triangle'
+          }
+        }
+      ],"""
+
+
+OUTPUT_PATH = 'hadith_tree_visualization.html'
+
+
+def generate_html(tree_data_json, geography_colors, output_path=OUTPUT_PATH):
     """
     Generates an HTML file with Cytoscape.js for visualizing the hadith tree.
     """
@@ -41,23 +118,23 @@ def generate_html(tree_data_json, geography_colors):
     // Define colors based on geography
     const geographyColors = {json.dumps(geography_colors)};
 
-    // Function to generate a slightly darker border color
-    function darkerColor(color) {{
-      const darkerHex = (hex) => Math.max(0, hex - 40).toString(16).padStart(2, '0');  // Darken by 40 (hex)
-      const r = darkerHex(parseInt(color.slice(1, 3), 16));
-      const g = darkerHex(parseInt(color.slice(3, 5), 16));
-      const b = darkerHex(parseInt(color.slice(5, 7), 16));
-        
-      const darkColor = `#${{r}}${{g}}${{b}}`;  // Format correctly as a hex color
-      
-      return darkColor;
-    }}
+{DARKER_COLOR_JS}
+
+    const elements = {tree_data_json};
+
+    // Positions computed in Python (see layout.py) are only painted, elements
+    // without them are laid out with dagre instead of stacking at (0, 0)
+    const hasPositions = elements.every(element => element.data.source !== undefined || element.position !== undefined);
 
     const cy = cytoscape({{
       container: document.getElementById('cy'),  // container to render in
-      elements: {tree_data_json},
+      elements: elements,
 
-      layout: {{
+      layout: hasPositions ? {{
+        name: 'preset',
+        fit: true,
+        padding: 30
+      }} : {{
         name: 'dagre',  // Hierarchical layout (Dagre)
         rankDir: 'TB',  // Top-to-bottom direction
         nodeSep: 30,  // Space between nodes
@@ -65,65 +142,7 @@ def generate_html(tree_data_json, geography_colors):
         rankSep: 50  // Space between levels
       }},
 
-      style: [
-        {{
-          selector: 'node',
-          style: {{
-            'label': 'data(label)',
-            'text-valign': 'center',
-            'text-halign': 'center',
-            'background-color': (ele) => geographyColors[ele.data('geography')] || '#D3D3D3',  // Assign color based on geography
-            'border-color': function(ele) {{ 
-              const geographyColor = geographyColors[ele.data('geography')] || '#D3D3D3';
-              return darkerColor(geographyColor);  // Apply the darker color
-            }},
-            'border-width': 2,
-            'shape': 'rectangle',
-            'width': '150px',
-            'height': '40px',
-            'font-family': 'Arial, sans-serif',  // Ensure text looks good for Arabic
-            'font-size': '14px',
-            'direction': 'rtl',  // Right-to-left direction for Arabic text
-            'text-align': 'right'
-          }}
-        }},
-        {{
-          selector: 'node[isMatn]',  // Style for matn nodes
-          style: {{
-            'label': 'data(label)',
-            'background-color': '#f0f0f0',  // Light gray background for matn
-            'border-color': '#ddd',
-            'border-width': 2,
-            'shape': 'rectangle',
-            'width': '150px',  // Match width to parent node
-            'height': function(ele) {{
-              const textLength = ele.data('label').length;
-              const estimatedLines = Math.ceil(textLength / 30);  // Estimate lines based on 30 chars per line
-              const baseHeight = 20;  // Base height for a single line
-              const buffer = 1.2;  // 20% buffer for additional space
-              return (baseHeight * estimatedLines * buffer) + 'px';  // Calculate dynamic height
-            }},
-            'font-family': 'Arial, sans-serif',
-            'font-size': '14px',
-            'direction': 'rtl',  // Right-to-left for Arabic text
-            'text-halign': 'center',  // Ensure text is aligned to the right within the box
-            'text-valign': 'center',  // Vertical alignment (adjust if you need something else)
-            'text-wrap': 'wrap',  // Enable text wrapping
-            'text-max-width': '150px',  // Match node width
-            'padding': '5px'  // Padding for better readability
-          }}
-
-        }},
-        {{
-          selector: 'edge',
-          style: {{
-            'width': 2,
-            'line-color': '#ccc',
-            'target-arrow-color': '#ccc',
-            'target-arrow-shape': 'triangle'
-          }}
-        }}
-      ],
+{NODE_STYLES}
 
       userZoomingEnabled: true,  // Re-enable zooming
       userPanningEnabled: true,  // Re-enable panning
@@ -132,15 +151,6 @@ def generate_html(tree_data_json, geography_colors):
       selectionType: 'additive'  // Allow adding more nodes to the selection
     }});
 
-    // Apply the layout and lock the nodes in place
-    cy.layout({{
-      name: 'dagre',
-      rankDir: 'TB',
-      nodeSep: 50,
-      edgeSep: 10,
-      rankSep: 50
-    }}).run();
-
     // Enable dragging of multiple nodes
     cy.on('select', 'node', function(evt) {{
       let selectedNodes = cy.nodes(':selected');  // Get all selected nodes
@@ -168,11 +178,10 @@ def generate_html(tree_data_json, geography_colors):
       snapToGrid(node);  // Snap the node to the nearest grid after dragging
     }});
 
-    // Lock the nodes after the layout
-    cy.nodes().forEach(node => {{
-      node.unlock();  // Lock all nodes to prevent moving
-      snapToGrid(node) // Snap all nodes to grid
-    }});
+    // Precomputed positions are already on the grid, dagre's are not
+    if (!hasPositions) {{
+      cy.nodes().forEach(node => snapToGrid(node));
+    }}
 
   </script>
 </body>
@@ -180,32 +189,182 @@ def generate_html(tree_data_json, geography_colors):
     """
 
     # Save the generated HTML to a file
-    with open('hadith_tree_visualization.html', 'w', encoding='utf-8') as f:
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+
+def generate_chunked_html(manifest, geography_colors, output_path):
+    """
+    Generates the HTML viewer for a tree written in chunks by tree_chunks.
+    The page holds only the manifest and loads each chunk script when its
+    part of the tree scrolls into view, so no single file holds the tree.
+    """
+    html_content = f"""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>Hadith Tree</title>
+  <script src="https://unpkg.com/cytoscape/dist/cytoscape.min.js"></script>
+  <style>
+    #cy {{
+      width: 100%;
+      height: 100vh;
+      background-color: #f9f9f9;
+    }}
+
+    #status {{
+      position: absolute;
+      top: 8px;
+      left: 8px;
+      font-family: Arial, sans-serif;
+      font-size: 12px;
+      color: #666;
+    }}
+  </style>
+</head>
+<body>
+  <div id="cy"></div>
+  <div id="status"></div>
+
+  <script>
+    // Define colors based on geography
+    const geographyColors = {json.dumps(geography_colors)};
+
+    // Chunk files with the x range of their nodes, in the order they were written
+    const manifest = {json.dumps(manifest, ensure_ascii=False)};
+
+{DARKER_COLOR_JS}
+
+    const cy = cytoscape({{
+      container: document.getElementById('cy'),  // container to render in
+      elements: [],
+      layout: {{ name: 'preset' }},
+
+{NODE_STYLES}
+
+      userZoomingEnabled: true,
+      userPanningEnabled: true,
+      boxSelectionEnabled: true,
+      autounselectify: true,
+      selectionType: 'additive'
+    }});
+
+    const requested = new Set();
+    const waiting = new Map();  // Node id -> edges waiting for that node, from a chunk not loaded yet
+    let loaded = 0;
+
+    // Add an edge, or file it under an endpoint that is not loaded yet
+    function addEdge(edge) {{
+      const missing = [edge.data.source, edge.data.target].find(id => !cy.hasElementWithId(id));
+      if (missing === undefined) {{
+        cy.add(edge);
+      }} else if (waiting.has(missing)) {{
+        waiting.get(missing).push(edge);
+      }} else {{
+        waiting.set(missing, [edge]);
+      }}
+    }}
+
+    // Called by each chunk script
+    function hadithTreeChunk(index, elements) {{
+      const nodes = elements.filter(element => element.data.source === undefined && !cy.hasElementWithId(element.data.id));
+      cy.add(nodes);
+      elements.filter(element => element.data.source !== undefined).forEach(addEdge);
+      nodes.forEach(node => {{
+        const edges = waiting.get(node.data.id);
+        if (edges) {{
+          waiting.delete(node.data.id);
+          edges.forEach(addEdge);
+        }}
+      }});
+
+      loaded += 1;
+      if (loaded === manifest.chunks.length) {{
+        waiting.clear();  // Every chunk is in, so these edges point at nodes that were never written
+      }}
+      document.getElementById('status').textContent = `${{loaded}} / ${{manifest.chunks.length}} chunks loaded`;
+      if (loaded === 1) {{
+        cy.fit(undefined, 30);
+      }}
+    }}
+
+    function loadChunk(index) {{
+      if (requested.has(index)) {{
+        return;
+      }}
+      requested.add(index);
+      const script = document.createElement('script');
+      script.src = manifest.chunks[index].file;
+      document.body.appendChild(script);
+    }}
+
+    // Load the chunks overlapping the visible part of the tree, plus a screen on each side
+    function loadVisibleChunks() {{
+      const extent = cy.extent();
+      const margin = extent.w;
+      manifest.chunks.forEach((chunk, index) => {{
+        if (chunk.x_max >= extent.x1 - margin && chunk.x_min <= extent.x2 + margin) {{
+          loadChunk(index);
+        }}
+      }});
+    }}
+
+    let viewportTimer = null;
+    cy.on('viewport', () => {{
+      clearTimeout(viewportTimer);
+      viewportTimer = setTimeout(loadVisibleChunks, 200);
+    }});
+
+    if (manifest.chunks.length) {{
+      loadChunk(0);
+    }}
+
+    const gridSize = 50;  // Define the grid size for snapping
+
+    // Snap dragged nodes to the nearest grid position
+    cy.on('dragfree', 'node', function(evt) {{
+      const node = evt.target;
+      const pos = node.position();
+      node.position({{
+        x: Math.round(pos.x / gridSize) * gridSize,
+        y: Math.round(pos.y / gridSize) * gridSize
+      }});
+    }});
+  </script>
+</body>
+</html>
+    """
+
+    with open(output_path, 'w', encoding='utf-8') as f:
         f.write(html_content)
 
 if __name__ == "__main__":
-    # Example tree data as JSON
+    from layout import layered_layout
+    from records import Edge, Node, elements_to_json
+
+    # Example tree data
     tree_data = [
-        { 'data': { 'id': 'A', 'label': 'النبي', 'geography': 'Madinah' } },
-        { 'data': { 'id': 'B', 'label': 'ن1a', 'geography': 'Basra' } },
-        { 'data': { 'id': 'C', 'label': 'ن1b', 'geography': 'Baghdad' } },
-        { 'data': { 'id': 'D', 'label': 'ن0', 'geography': 'Makkah' } },
-        { 'data': { 'id': 'E', 'label': 'ن2a', 'geography': 'Basra' } },
-        { 'data': { 'id': 'F', 'label': 'ن2b', 'geography': 'Madinah' } },
-        { 'data': { 'id': 'MatnE', 'label': 'إنما الأعمال بالنيات', 'isMatn': True } },
-        { 'data': { 'id': 'MatnF', 'label': 'لا يؤمن أحدكم حتى يحب لأخيه ما يحب لنفسه', 'isMatn': True } },
-        { 'data': { 'source': 'A', 'target': 'B' } },
-        { 'data': { 'source': 'A', 'target': 'C' } },
-        { 'data': { 'source': 'B', 'target': 'D' } },
-        { 'data': { 'source': 'C', 'target': 'D' } },
-        { 'data': { 'source': 'D', 'target': 'E' } },
-        { 'data': { 'source': 'D', 'target': 'F' } },
-        { 'data': { 'source': 'E', 'target': 'MatnE' } },
-        { 'data': { 'source': 'F', 'target': 'MatnF' } }
+        Node('A', 'النبي', 'Madinah', position_in_chain=3),
+        Node('B', 'ن1a', 'Basra', position_in_chain=2),
+        Node('C', 'ن1b', 'Baghdad', position_in_chain=2),
+        Node('D', 'ن0', 'Makkah', position_in_chain=1),
+        Node('E', 'ن2a', 'Basra', position_in_chain=0),
+        Node('F', 'ن2b', 'Madinah', position_in_chain=0),
+        Node('MatnE', 'إنما الأعمال بالنيات', is_matn=True),
+        Node('MatnF', 'لا يؤمن أحدكم حتى يحب لأخيه ما يحب لنفسه', is_matn=True),
+        Edge('A', 'B'),
+        Edge('A', 'C'),
+        Edge('B', 'D'),
+        Edge('C', 'D'),
+        Edge('D', 'E'),
+        Edge('D', 'F'),
+        Edge('E', 'MatnE'),
+        Edge('F', 'MatnF'),
     ]
 
-    # Convert the tree data to JSON string
-    tree_data_json = json.dumps(tree_data, ensure_ascii=False)
+    # Lay out the tree and convert it to a JSON string
+    tree_data_json = elements_to_json(tree_data, layered_layout(tree_data))
 
     # Define geography colors for the visualization
     geography_colors = {
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+from itertools import islice
+from xml.sax.saxutils import escape, quoteattr
+
+from narrator_resolver import parse_death_date
+
+# Columns of the exported node and edge tables, with their Table Schema types.
+# weight is the number of hadiths supporting a teacher -> student transmission.
+NODE_SCHEMA = (('id', 'integer'), ('name', 'string'), ('location', 'string'), ('death_date', 'integer'))
+EDGE_SCHEMA = (('source', 'integer'), ('target', 'integer'), ('weight', 'integer'))
+
+GRAPHML_TYPES = {'integer': 'long', 'string': 'string'}
+GEXF_TYPES = {'integer': 'long', 'string': 'string'}
+
+# Rows per Parquet row group
+PARQUET_BATCH_SIZE = 100000
+
+NODES_SQL = 'SELECT id, name, location, death_date FROM Narrators ORDER BY id'
+
+# Grouped along the primary key, so edges are read without sorting or holding them
+EDGES_SQL = '''
+    SELECT teacher_id, student_id, COUNT(*) FROM NarratorTransmissions
+    GROUP BY teacher_id, student_id
+'''
+
+
+def iter_nodes(db):
+    # Death dates are stored as text, so a value that is not a year is left out
+    for narrator_id, name, location, death_date in db.conn.execute(NODES_SQL):
+        yield narrator_id, name, location, parse_death_date(death_date)
+
+
+def iter_edges(db):
+    return db.conn.execute(EDGES_SQL)
+
+
+def dot_string(value):
+    return '"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def write_graphml(db, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for target, schema in (('node', NODE_SCHEMA[1:]), ('edge', EDGE_SCHEMA[2:])):
+            for name, kind in schema:
+                f.write(f'  <key id="{name}" for="{target}" attr.name="{name}" attr.type="{GRAPHML_TYPES[kind]}"/>\n')
+        f.write('  <graph id="narrators" edgedefault="directed">\n')
+
+        for narrator_id, *values in iter_nodes(db):
+            data = ''.join(
+                f'<data key="{name}">{escape(str(value))}</data>'
+                for (name, _), value in zip(NODE_SCHEMA[1:], values) if value is not None
+            )
+            f.write(f'    <node id="n{narrator_id}">{data}</node>\n')
+
+        for teacher_id, student_id, weight in iter_edges(db):
+            f.write(f'    <edge source="n{teacher_id}" target="n{student_id}"><data key="weight">{weight}</data></edge>\n')
+
+        f.write('  </graph>\n</graphml>\n')
+
+
+def write_gexf(db, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<gexf xmlns="http://gexf.net/1.3" version="1.3">\n')
+        f.write('  <graph defaultedgetype="directed">\n')
+        f.write('    <attributes class="node">\n')
+        for index, (name, kind) in enumerate(NODE_SCHEMA[2:]):
+            f.write(f'      <attribute id="{index}" title="{name}" type="{GEXF_TYPES[kind]}"/>\n')
+        f.write('    </attributes>\n    <nodes>\n')
+
+        for narrator_id, name, *values in iter_nodes(db):
+            attvalues = ''.join(
+                f'<attvalue for="{index}" value={quoteattr(str(value))}/>'
+                for index, value in enumerate(values) if value is not None
+            )
+            f.write(f'      <node id="{narrator_id}" label={quoteattr(name)}><attvalues>{attvalues}</attvalues></node>\n')
+
+        f.write('    </nodes>\n    <edges>\n')
+        for index, (teacher_id, student_id, weight) in enumerate(iter_edges(db)):
+            f.write(f'      <edge id="{index}" source="{teacher_id}" target="{student_id}" weight="{weight}"/>\n')
+        f.write('    </edges>\n  </graph>\n</gexf>\n')
+
+
+def write_dot(db, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('digraph narrators {\n')
+        for narrator_id, name, location, death_date in iter_nodes(db):
+            attributes = [f'label={dot_string(name)}']
+            if location is not None:
+                attributes.append(f'location={dot_string(location)}')
+            if death_date is not None:
+                attributes.append(f'death_date={dot_string(death_date)}')
+            f.write(f'  n{narrator_id} [{", ".join(attributes)}];\n')
+
+        for teacher_id, student_id, weight in iter_edges(db):
+            f.write(f'  n{teacher_id} -> n{student_id} [weight={weight}];\n')
+        f.write('}\n')
+
+
+def table_schema(schema):
+    return {'fields': [{'name': name, 'type': kind} for name, kind in schema]}
+
+
+def write_csv(db, directory):
+    """
+    Write nodes.csv, edges.csv and a datapackage.json describing their
+    columns, keys and types (Frictionless Table Schema).
+    """
+    os.makedirs(directory, exist_ok=True)
+    for file_name, schema, rows in (('nodes.csv', NODE_SCHEMA, iter_nodes(db)), ('edges.csv', EDGE_SCHEMA, iter_edges(db))):
+        with open(os.path.join(directory, file_name), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(name for name, _ in schema)
+            writer.writerows(rows)
+
+    edges_schema = table_schema(EDGE_SCHEMA)
+    edges_schema['foreignKeys'] = [
+        {'fields': field, 'reference': {'resource': 'nodes', 'fields': 'id'}} for field in ('source', 'target')
+    ]
+    package = {
+        'name': 'narrator-graph',
+        'resources': [
+            {'name': 'nodes', 'path': 'nodes.csv', 'schema': {**table_schema(NODE_SCHEMA), 'primaryKey': 'id'}},
+            {'name': 'edges', 'path': 'edges.csv', 'schema': edges_schema},
+        ],
+    }
+    with open(os.path.join(directory, 'datapackage.json'), 'w', encoding='utf-8') as f:
+        json.dump(package, f, ensure_ascii=False, indent=2)
+
+
+def write_parquet(db, directory):
+    """
+    Write nodes.parquet and edges.parquet in row groups of PARQUET_BATCH_SIZE.
+    Needs pyarrow, which is optional.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow), or use the csv format")
+
+    arrow_types = {'integer': pyarrow.int64(), 'string': pyarrow.string()}
+    os.makedirs(directory, exist_ok=True)
+    for file_name, schema, rows in (('nodes.parquet', NODE_SCHEMA, iter_nodes(db)), ('edges.parquet', EDGE_SCHEMA, iter_edges(db))):
+        arrow_schema = pyarrow.schema([(name, arrow_types[kind]) for name, kind in schema])
+        with pyarrow.parquet.ParquetWriter(os.path.join(directory, file_name), arrow_schema) as writer:
+            while True:
+                batch = list(islice(rows, PARQUET_BATCH_SIZE))
+                if not batch:
+                    break
+                columns = list(zip(*batch))
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(column, type=field.type) for column, field in zip(columns, arrow_schema)],
+                    schema=arrow_schema,
+                ))
+
+
+# Format name -> writer; csv and parquet write a directory, the others a single file
+EXPORTERS = {
+    'graphml': write_graphml,
+    'gexf': write_gexf,
+    'dot': write_dot,
+    'csv': write_csv,
+    'parquet': write_parquet,
+}
+
+
+def export_narrator_graph(db, path, file_format):
+    """
+    Stream the narrator transmission graph of a HadithDatabase to path in
+    one of the EXPORTERS formats. Rows are written as they are read from the
+    database, so the graph is never held in memory.
+    """
+    if file_format not in EXPORTERS:
+        raise ValueError(f"Unknown export format '{file_format}', expected one of {sorted(EXPORTERS)}")
+    EXPORTERS[file_format](db, path)
@@ -0,0 +1,363 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from narrator_resolver import parse_death_date
+from records import HadithRecord, NarratorLink
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'hadith.snapshot')
+SNAPSHOT_MAGIC = b'PYICMASN'
+SNAPSHOT_VERSION = 2
+
+# Every section is an array of little-endian int64, in this order. Narrators
+# and hadiths are referred to by their index in narrator_ids and hadith_ids,
+# strings by their index in the string table.
+SECTIONS = (
+    'narrator_ids',       # Sorted narrator ids
+    'narrator_names',     # String index of each narrator's name
+    'narrator_locations', # String index of each narrator's location, or -1
+    'narrator_deaths',    # Death date of each narrator, or MISSING
+    'student_offsets',    # CSR of teacher -> student transmissions: per narrator,
+    'students',           # the range of students and weights belonging to it
+    'student_weights',    # Number of hadiths supporting the transmission
+    'teacher_offsets',    # The same edges by student
+    'teachers',
+    'teacher_weights',
+    'hadith_ids',         # Sorted hadith ids
+    'hadith_matns',       # String index of each hadith's matn
+    'isnad_offsets',      # CSR of each hadith's isnad, ordered by position_in_chain
+    'isnad_narrators',
+    'isnad_positions',
+    'string_offsets',     # Byte offset of each string in the string bytes, plus the end
+)
+
+MISSING = -1
+
+# Magic, version, the database's user_version and fingerprint (see
+# database_fingerprint), then the element count of each section; the UTF-8
+# string bytes follow the sections
+HEADER = struct.Struct(f'<8sQQ32s{len(SECTIONS)}Q')
+
+NARRATORS_SQL = 'SELECT id, name, location, death_date FROM Narrators ORDER BY id'
+
+TRANSMISSIONS_SQL = {
+    'students': '''
+        SELECT teacher_id, student_id, COUNT(*) FROM NarratorTransmissions
+        GROUP BY teacher_id, student_id ORDER BY teacher_id, student_id
+    ''',
+    'teachers': '''
+        SELECT student_id, teacher_id, COUNT(*) FROM NarratorTransmissions
+        GROUP BY student_id, teacher_id ORDER BY student_id, teacher_id
+    ''',
+}
+
+ISNADS_SQL = '''
+    SELECT h.id, h.matn, i.narrator_id, i.position_in_chain
+    FROM Hadiths h LEFT JOIN Isnads i ON i.hadith_id = h.id
+    ORDER BY h.id, i.position_in_chain, i.id
+'''
+
+
+def database_fingerprint(db):
+    """
+    Return (user_version, fingerprint) of a HadithDatabase, where the
+    fingerprint is a SHA-256 digest of its narrators and of the content
+    hashes stored for each hadith at ingest (HadithDatabase.get_content_hashes).
+    A snapshot whose header holds other values was written from other data.
+    """
+    user_version = db.conn.execute('PRAGMA user_version').fetchone()[0]
+    digest = hashlib.sha256()
+    for row in db.conn.execute(NARRATORS_SQL):
+        digest.update(json.dumps(row, ensure_ascii=False).encode('utf-8'))
+    for hadith_id, hadith_hash in db.get_content_hashes():
+        digest.update(f"{hadith_id}:{hadith_hash}\n".encode('utf-8'))
+    return user_version, digest.digest()
+
+
+def snapshot_is_current(db, path=SNAPSHOT_PATH):
+    # False for a missing snapshot, one of an older format or one written from other data
+    try:
+        snapshot = GraphSnapshot(path)
+    except (OSError, ValueError):
+        return False
+    try:
+        return snapshot.is_current(db)
+    finally:
+        snapshot.close()
+
+
+class StringTable:
+    """
+    Interns strings while writing a snapshot, spooling their bytes to a file.
+    """
+    def __init__(self, spool):
+        self.spool = spool
+        self.indexes = {}
+        self.offsets = array('q', [0])
+
+    def add(self, text, intern=True):
+        if text is None:
+            return MISSING
+        if intern and text in self.indexes:
+            return self.indexes[text]
+
+        index = len(self.offsets) - 1
+        encoded = text.encode('utf-8')
+        self.spool.write(encoded)
+        self.offsets.append(self.offsets[-1] + len(encoded))
+        if intern:
+            self.indexes[text] = index
+        return index
+
+
+def write_snapshot(db, path=SNAPSHOT_PATH):
+    """
+    Write the narrators, transmissions and isnads of a HadithDatabase to a
+    binary snapshot that GraphSnapshot opens with mmap. Rows are read from
+    database cursors in order, so only the integer arrays are held while
+    writing and the matns go straight to a spool file. Names and locations
+    are interned; matns are stored once per hadith. The header records the
+    database_fingerprint the snapshot was written from. The file is replaced
+    atomically, so processes that have the old one open keep reading it.
+    """
+    # Taken first, so a commit by another connection while writing leaves the
+    # snapshot stale rather than wrongly current
+    user_version, fingerprint = database_fingerprint(db)
+    sections = {name: array('q') for name in SECTIONS}
+    spool_path = f"{path}.strings.tmp"
+    with open(spool_path, 'w+b') as spool:
+        strings = StringTable(spool)
+
+        narrator_indexes = {}
+        for narrator_id, name, location, death_date in db.conn.execute(NARRATORS_SQL):
+            narrator_indexes[narrator_id] = len(sections['narrator_ids'])
+            sections['narrator_ids'].append(narrator_id)
+            sections['narrator_names'].append(strings.add(name))
+            sections['narrator_locations'].append(strings.add(location))
+            death_date = parse_death_date(death_date)
+            sections['narrator_deaths'].append(death_date if death_date is not None else MISSING)
+
+        # Both CSR directions, skipping transmissions of narrators since removed
+        for direction, offsets_name, weights_name in (
+            ('students', 'student_offsets', 'student_weights'),
+            ('teachers', 'teacher_offsets', 'teacher_weights'),
+        ):
+            counts = array('q', bytes(8 * len(narrator_indexes)))
+            for source_id, target_id, weight in db.conn.execute(TRANSMISSIONS_SQL[direction]):
+                if source_id in narrator_indexes and target_id in narrator_indexes:
+                    counts[narrator_indexes[source_id]] += 1
+                    sections[direction].append(narrator_indexes[target_id])
+                    sections[weights_name].append(weight)
+
+            offsets = sections[offsets_name]
+            offsets.append(0)
+            for count in counts:
+                offsets.append(offsets[-1] + count)
+
+        # Each hadith's isnad starts where the previous one ended
+        previous_id = None
+        for hadith_id, matn, narrator_id, position in db.conn.execute(ISNADS_SQL):
+            if hadith_id != previous_id:
+                sections['isnad_offsets'].append(len(sections['isnad_narrators']))
+                sections['hadith_ids'].append(hadith_id)
+                sections['hadith_matns'].append(strings.add(matn, intern=False))
+                previous_id = hadith_id
+            if narrator_id in narrator_indexes:
+                sections['isnad_narrators'].append(narrator_indexes[narrator_id])
+                sections['isnad_positions'].append(position)
+        sections['isnad_offsets'].append(len(sections['isnad_narrators']))
+        sections['string_offsets'] = strings.offsets
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(
+                SNAPSHOT_MAGIC, SNAPSHOT_VERSION, user_version, fingerprint, *(len(sections[name]) for name in SECTIONS)
+            ))
+            for name in SECTIONS:
+                if sys.byteorder == 'big':
+                    sections[name].byteswap()
+                sections[name].tofile(f)
+            spool.seek(0)
+            shutil.copyfileobj(spool, f)
+
+    os.remove(spool_path)
+    os.replace(temp_path, path)
+
+
+class GraphSnapshot:
+    """
+    Read-only view of a snapshot written by write_snapshot. The file is
+    mapped, not read, so opening it takes milliseconds whatever its size and
+    processes opening the same file share its pages. Answers the read
+    queries of NarratorGraph, and iter_hadiths yields the HadithRecords that
+    HadithTree builds trees from, without touching SQLite. user_version and
+    fingerprint are those of the database it was written from; given that
+    database as db, a snapshot written from other data raises a ValueError.
+    """
+    def __init__(self, path=SNAPSHOT_PATH, db=None):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mmap) < HEADER.size:
+            self.mmap.close()
+            raise ValueError(f"{path} is too short to be a snapshot")
+        magic, version, self.user_version, self.fingerprint, *counts = HEADER.unpack_from(self.mmap)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} snapshot")
+        if len(self.mmap) < HEADER.size + 8 * sum(counts):
+            self.mmap.close()
+            raise ValueError(f"{path} is truncated")
+        if db is not None and not self.is_current(db):
+            self.mmap.close()
+            raise ValueError(f"{path} was written from other data than the database, rewrite it with main.py")
+        if sys.byteorder == 'big':
+            self.mmap.close()
+            raise ValueError("Snapshots are little-endian and can only be mapped on little-endian machines")
+
+        self.view = memoryview(self.mmap)
+        offset = HEADER.size
+        for name, count in zip(SECTIONS, counts):
+            # Zero-copy int64 views of the mapped file
+            setattr(self, name, self.view[offset:offset + 8 * count].cast('q'))
+            offset += 8 * count
+        self.string_bytes = self.view[offset:]
+        self.narrator_labels = {}
+
+    def is_current(self, db):
+        return (self.user_version, self.fingerprint) == database_fingerprint(db)
+
+    # ---------
+    # Narrators
+    # ---------
+    def string(self, index):
+        if index == MISSING:
+            return None
+        return str(self.string_bytes[self.string_offsets[index]:self.string_offsets[index + 1]], 'utf-8')
+
+    def narrator_index(self, narrator_id):
+        index = bisect_left(self.narrator_ids, narrator_id)
+        if index == len(self.narrator_ids) or self.narrator_ids[index] != narrator_id:
+            raise KeyError(narrator_id)
+        return index
+
+    def narrator(self, narrator_id):
+        """
+        Return (name, location, death date) of a narrator.
+        """
+        index = self.narrator_index(narrator_id)
+        death_date = self.narrator_deaths[index]
+        return (
+            self.string(self.narrator_names[index]),
+            self.string(self.narrator_locations[index]),
+            death_date if death_date != MISSING else None,
+        )
+
+    def adjacent(self, narrator_id, offsets, targets, weights):
+        try:
+            index = self.narrator_index(narrator_id)
+        except KeyError:
+            return {}
+        start, end = offsets[index], offsets[index + 1]
+        return {self.narrator_ids[targets[i]]: weights[i] for i in range(start, end)}
+
+    def students_of(self, narrator_id):
+        """
+        Return {student id: multiplicity} for a narrator.
+        """
+        return self.adjacent(narrator_id, self.student_offsets, self.students, self.student_weights)
+
+    def teachers_of(self, narrator_id):
+        """
+        Return {teacher id: multiplicity} for a narrator.
+        """
+        return self.adjacent(narrator_id, self.teacher_offsets, self.teachers, self.teacher_weights)
+
+    def degree(self, narrator_id, offsets, weights, weighted):
+        try:
+            index = self.narrator_index(narrator_id)
+        except KeyError:
+            return 0
+        start, end = offsets[index], offsets[index + 1]
+        return sum(weights[start:end]) if weighted else end - start
+
+    def out_degree(self, narrator_id, weighted=False):
+        return self.degree(narrator_id, self.student_offsets, self.student_weights, weighted)
+
+    def in_degree(self, narrator_id, weighted=False):
+        return self.degree(narrator_id, self.teacher_offsets, self.teacher_weights, weighted)
+
+    def degree_ranking(self, direction="out", weighted=False, limit=None):
+        """
+        Rank narrators by their number of students ("out") or teachers ("in"),
+        or by the number of transmissions if weighted. Returns (id, degree) pairs.
+        """
+        if direction == "out":
+            offsets, weights = self.student_offsets, self.student_weights
+        elif direction == "in":
+            offsets, weights = self.teacher_offsets, self.teacher_weights
+        else:
+            raise ValueError(f"Unknown direction '{direction}'")
+
+        ranking = []
+        for index, narrator_id in enumerate(self.narrator_ids):
+            start, end = offsets[index], offsets[index + 1]
+            if end > start:
+                ranking.append((narrator_id, sum(weights[start:end]) if weighted else end - start))
+        ranking.sort(key=lambda item: (-item[1], item[0]))
+        return ranking[:limit] if limit else ranking
+
+    def __len__(self):
+        return len(self.students)
+
+    # -------
+    # Hadiths
+    # -------
+    def narrator_label(self, index):
+        # (name, location) of a narrator, decoded once per process
+        label = self.narrator_labels.get(index)
+        if label is None:
+            label = (self.string(self.narrator_names[index]), self.string(self.narrator_locations[index]))
+            self.narrator_labels[index] = label
+        return label
+
+    def hadith_record(self, index):
+        start, end = self.isnad_offsets[index], self.isnad_offsets[index + 1]
+        isnad = [
+            NarratorLink(*self.narrator_label(narrator), position)
+            for narrator, position in zip(self.isnad_narrators[start:end], self.isnad_positions[start:end])
+        ]
+        return HadithRecord(self.hadith_ids[index], self.string(self.hadith_matns[index]), isnad)
+
+    def iter_hadiths(self, hadith_ids=None):
+        """
+        Yield HadithRecords in hadith id order like
+        HadithDatabase.iter_hadiths_with_isnad, optionally only for hadith_ids.
+        Hadiths without an isnad are skipped, as there.
+        """
+        if hadith_ids is None:
+            indexes = range(len(self.hadith_ids))
+        else:
+            indexes = []
+            for hadith_id in sorted(set(hadith_ids)):
+                index = bisect_left(self.hadith_ids, hadith_id)
+                if index < len(self.hadith_ids) and self.hadith_ids[index] == hadith_id:
+                    indexes.append(index)
+
+        for index in indexes:
+            if self.isnad_offsets[index + 1] > self.isnad_offsets[index]:
+                yield self.hadith_record(index)
+
+    def close(self):
+        # Views of the map must be released before it can be closed
+        for name in SECTIONS:
+            getattr(self, name).release()
+        self.string_bytes.release()
+        self.view.release()
+        self.mmap.close()
@@ -3,6 +3,75 @@ import re
 import arabic_reshaper
 from bidi.algorithm import get_display
 
+# Unicode ranges for tashkeel (Arabic diacritics), mapped to None for str.translate
+TASHKEEL_TABLE = dict.fromkeys(
+    [*range(0x0610, 0x061A + 1), *range(0x064B, 0x065F + 1), 0x0670]
+)
+
+INTRODUCTORY_WORDS = (
+    'حَدَّثَنَا', 'أَخْبَرَنَا', 'سَمِعْتُ', 'ذَكَرَ', 'رَوَى', 
+    'قَالَ', 'قَالَ:','عَنْ', 'عَنِ', 'أَنْبَأَنَا', 'يُقَالُ', 'زَعَمَ',
+    'أُرِيْنَا', 'يُرْوَى', 'حَدَّثَنِي', 'بَلَغَنَا', 'ثُمَّ',
+    'يُحَدِّثُ', 'في', 'حديثه', 'نا', 'قالا:', 'قالا', 'يرفعه',
+    'ُإن',
+)
+
+HONORIFICS = (
+    " رضي الله عنه",  # Radya allahu anhu
+    " صلى الله عليه وسلم",  # Salat allah alayhi wasalam
+)
+
+
+def remove_tashkeel(text):
+    return text.translate(TASHKEEL_TABLE)
+
+
+class HadithNormalizer():
+    """
+    Immutable set of normalization rules shared by all Hadith objects.
+    Use extend() to derive a normalizer with extra words or honorifics.
+    """
+    __slots__ = ('introductory_words', 'honorifics', 'honorifics_regex')
+
+    def __init__(self, introductory_words=INTRODUCTORY_WORDS, honorifics=HONORIFICS):
+        # Stop words are stored without tashkeel so tokens only need stripping once
+        object.__setattr__(self, 'introductory_words', frozenset(remove_tashkeel(word) for word in introductory_words))
+        object.__setattr__(self, 'honorifics', tuple(honorifics))
+        # One alternation instead of one re.sub per honorific, longest first
+        pattern = '|'.join(re.escape(honorific) for honorific in sorted(self.honorifics, key=len, reverse=True))
+        object.__setattr__(self, 'honorifics_regex', re.compile(pattern) if pattern else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("HadithNormalizer is immutable, use extend() instead")
+
+    def __reduce__(self):
+        return (HadithNormalizer, (self.introductory_words, self.honorifics))
+
+    def extend(self, introductory_words=(), honorifics=()):
+        """
+        Return a new normalizer with additional introductory words and honorifics.
+        """
+        return HadithNormalizer(
+            self.introductory_words | set(introductory_words),
+            self.honorifics + tuple(h for h in honorifics if h not in self.honorifics),
+        )
+
+    def remove_tashkeel(self, text):
+        return remove_tashkeel(text)
+
+    def remove_honorifics(self, text):
+        if self.honorifics_regex is None:
+            return text
+        return self.honorifics_regex.sub('', text)
+
+    def remove_introductory_words(self, isnad):
+        # Filter out the words that match any of the common introductory words
+        words = isnad.split()
+        return ' '.join(word for word in words if remove_tashkeel(word) not in self.introductory_words)
+
+
+DEFAULT_NORMALIZER = HadithNormalizer()
+
 
 def fix_arabic_text(text):
     reshaped_text = arabic_reshaper.reshape(text)  # Correct letter shapes
@@ -10,44 +79,30 @@ def fix_arabic_text(text):
     return bidi_text
 
 class Hadith():
-    def __init__(self, raw_text, file_path=""):
+    # Shared by every instance; replace with DEFAULT_NORMALIZER.extend(...) to add words
+    normalizer = DEFAULT_NORMALIZER
+
+    def __init__(self, raw_text, file_path="", normalizer=None):
         self.raw_text = raw_text
         self.file_path = file_path
 
-        self.introductory_words = [
-            'حَدَّثَنَا', 'أَخْبَرَنَا', 'سَمِعْتُ', 'ذَكَرَ', 'رَوَى', 
-            'قَالَ', 'قَالَ:','عَنْ', 'عَنِ', 'أَنْبَأَنَا', 'يُقَالُ', 'زَعَمَ',
-            'أُرِيْنَا', 'يُرْوَى', 'حَدَّثَنِي', 'بَلَغَنَا', 'ثُمَّ',
-            'يُحَدِّثُ', 'في', 'حديثه', 'نا', 'قالا:', 'قالا', 'يرفعه',
-            'ُإن',
-
-        ]
-        self.introductory_words = [self.remove_tashkeel(word) for word in self.introductory_words]
-
+        if normalizer is not None:
+            self.normalizer = normalizer
 
         self.isnads, self.matn, self.comment = self.extract_isnads_and_matn(self.raw_text)
         self.narrators = self.extract_narrators(self.isnads)
         self.matn = self.remove_tashkeel(self.matn)
         self.comment = self.remove_tashkeel(self.comment)
 
+    @property
+    def introductory_words(self):
+        return self.normalizer.introductory_words
+
     def remove_tashkeel(self, text):
-        # Unicode ranges for tashkeel (Arabic diacritics)
-        tashkeel_regex = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670]')
-        return tashkeel_regex.sub('', text)
+        return remove_tashkeel(text)
 
     def remove_honorifics(self, text):
-     # Define patterns for the phrases
-        patterns = [
-            r" رضي الله عنه",  # Radya allahu anhu
-            r" صلى الله عليه وسلم",  # Salat allah alayhi wasalam
-        ]
-        
-        # Iterate over the patterns and remove each one from the text
-        for pattern in patterns:
-            text = re.sub(pattern, '', text)
-        
-        # Return the cleaned text
-        return text
+        return self.normalizer.remove_honorifics(text)
 
     def extract_isnads_and_matn(self, raw_text):
         # Split the text by the new line separating the isnad and matn
@@ -72,16 +127,8 @@ class Hadith():
         return isnad_lines, matn_section, comment_section
 
     def remove_introductory_words(self, isnad):
-        # Split the line into individual words
-        words = isnad.split()
-        
-        # Filter out the words that match any of the common introductory words
-        filtered_words = [word for word in words if self.remove_tashkeel(word) not in self.introductory_words]
-        
         # Join the remaining words to form the narrator's full name
-        narrator_name = ' '.join(filtered_words)
-        
-        return narrator_name
+        return self.normalizer.remove_introductory_words(isnad)
 
     def extract_narrators(self, isnads):
         narrators = []
@@ -1,15 +1,146 @@
 import csv
 import hashlib
+import json
+import os
 import sqlite3
+from itertools import groupby
+from operator import itemgetter
+from urllib.request import pathname2url
 
 from hadith import Hadith
+from hadith_search import SearchResult, build_match_query, fold_arabic
+from matn_index import BANDS, MAX_BUCKET_CANDIDATES, SIMILARITY_THRESHOLD, band_buckets, estimated_similarity, minhash_signature, signature_from_blob
+from records import HadithRecord, NarratorLink, content_hash
+from narrator_graph import NarratorGraph, link_co_narrators, transmission_pairs
+from narrator_resolver import FuzzyMatch, NarratorResolver, normalize_name, split_aliases
+
+# Pragmas applied by each connection profile. Throughput measured with
+# `python benchmark.py profiles` (2k narrators, 20k hadiths, 120k isnad rows, one core):
+#   default    ingest ~6.4k isnad rows/s, full-corpus read ~0.7s
+#   ingest     ingest ~7.3k isnad rows/s, a serving reader completed ~585k lookups
+#              during a 36s ingest without lock errors
+#   bulk-load  ingest ~8.3k isnad rows/s, no journal, no foreign key checks and
+#              no other connections allowed
+#   serving    full-corpus read ~0.7s, read-only and shares pages with other readers
+# Ingest time goes mostly to indexing each hadith as it is written, the matn
+# MinHash (about 55%), full-text search and content hashes, which is the same
+# for every profile, so the profiles differ by little more than the journal.
+# Profiles with query_only open the file read-only and never create or
+# migrate the schema, so they keep the journal mode a writer chose (WAL with
+# "ingest") and need a database a writer already brought to SCHEMA_VERSION.
+CONNECTION_PROFILES = {
+    "default": {
+        "foreign_keys": "ON",
+    },
+    "ingest": {
+        "journal_mode": "WAL",
+        "foreign_keys": "ON",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,  # 64 MiB
+        "temp_store": "MEMORY",
+    },
+    "bulk-load": {
+        "journal_mode": "OFF",
+        "synchronous": "OFF",
+        "cache_size": -262144,  # 256 MiB
+        "locking_mode": "EXCLUSIVE",
+        "temp_store": "MEMORY",
+    },
+    "serving": {
+        "mmap_size": 268435456,  # 256 MiB
+        "cache_size": -65536,
+        "query_only": "ON",
+    },
+}
+
+# Profiles whose connections share one page cache within a process
+SHARED_CACHE_PROFILES = {"serving"}
+
+# Fuzzy narrator matches scoring at least this are linked without review
+FUZZY_LINK_THRESHOLD = 0.85
+
+# A teacher who died this many years after their student, or this many years
+# before, is an implausible reading of an ambiguous name
+TEACHER_OUTLIVED_STUDENT_YEARS = 30
+TEACHER_DIED_BEFORE_STUDENT_YEARS = 100
+
+# Bumped when stored data must be migrated, kept in PRAGMA user_version
+SCHEMA_VERSION = 4
+
+# Signature and cluster of the matns sharing an LSH bucket with a new matn,
+# the newest MAX_BUCKET_CANDIDATES of each bucket
+MATN_CANDIDATES_SQL = f'''
+    SELECT signature, cluster_id FROM MatnSignatures
+    WHERE hadith_id IN ({' UNION ALL '.join(
+        ['SELECT * FROM (SELECT hadith_id FROM MatnBuckets WHERE bucket = ? ORDER BY hadith_id DESC LIMIT ?)'] * BANDS
+    )})
+'''
+
+
+class SchemaError(Exception):
+    """
+    Raised when a read-only connection opens a database that is missing or
+    that a writer has not yet created or migrated to SCHEMA_VERSION.
+    """
+
 
 class HadithDatabase:
-    def __init__(self, db_name='data/hadith.db'):
+    def __init__(self, db_name='data/hadith.db', profile="default", fuzzy_link_threshold=FUZZY_LINK_THRESHOLD):
         # Initialize and connect to the SQLite database
-        self.conn = sqlite3.connect(db_name)
+        if profile not in CONNECTION_PROFILES:
+            raise ValueError(f"Unknown connection profile '{profile}'")
+
+        self.profile = profile
+        self.read_only = CONNECTION_PROFILES[profile].get("query_only") == "ON"
+        self.conn = self.connect(db_name, profile)
+        self.conn.create_function('fold_arabic', 1, fold_arabic, deterministic=True)
         self.cursor = self.conn.cursor()
-        self.setup_tables()
+        self._narrator_resolver = None
+        self._narrator_resolver_version = None
+        self._narrator_graph = None
+        self.ingest_listeners = []  # Called with the hadith ids an ingest touched
+        self.fuzzy_link_threshold = fuzzy_link_threshold
+
+        self.apply_pragmas(CONNECTION_PROFILES[profile])
+        if self.read_only:
+            self.check_schema(db_name)
+        else:
+            self.setup_tables()
+
+    def connect(self, db_name, profile):
+        if not self.read_only:
+            return sqlite3.connect(db_name)
+
+        # mode=ro so a reader can neither write nor create a missing file
+        uri = f"file:{pathname2url(os.path.abspath(db_name))}?mode=ro"
+        if profile in SHARED_CACHE_PROFILES:
+            uri += "&cache=shared"
+        try:
+            return sqlite3.connect(uri, uri=True, check_same_thread=False)
+        except sqlite3.OperationalError as e:
+            raise SchemaError(f"Cannot open {db_name} read-only ({e}), create it with main.py first")
+
+    def check_schema(self, db_name):
+        self.cursor.execute('PRAGMA user_version')
+        user_version = self.cursor.fetchone()[0]
+        if user_version < SCHEMA_VERSION:
+            self.conn.close()
+            raise SchemaError(
+                f"{db_name} is at schema version {user_version}, expected {SCHEMA_VERSION}. "
+                "Open it once with a writer profile (run main.py) to create or migrate it."
+            )
+
+    def defer_foreign_keys(self):
+        # Check foreign keys at the next commit rather than after each statement,
+        # for a transaction that replaces rows other tables refer to. The pragma
+        # lasts until the end of the transaction, so one is opened first
+        if not self.conn.in_transaction:
+            self.cursor.execute('BEGIN')
+        self.cursor.execute('PRAGMA defer_foreign_keys = ON')
+
+    def apply_pragmas(self, pragmas):
+        for name, value in pragmas.items():
+            self.cursor.execute(f'PRAGMA {name} = {value}')
 
     def setup_tables(self):
         # Create Hadiths, Narrators, and Isnads tables if they don't exist
@@ -18,7 +149,8 @@ class HadithDatabase:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 matn TEXT NOT NULL,
                 comments TEXT,
-                file_path TEXT
+                file_path TEXT,
+                content_hash TEXT
             )
         ''')
 
@@ -46,6 +178,99 @@ class HadithDatabase:
             )
         ''')
 
+        # Manifest of ingested hadith files, used to only re-ingest changed files
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS HadithFiles (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                hash_value TEXT NOT NULL,
+                hadith_id INTEGER NOT NULL,
+                FOREIGN KEY (hadith_id) REFERENCES Hadiths(id)
+            )
+        ''')
+
+        # Normalized full names and truncated names of each narrator, for indexed lookup
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS NarratorAliases (
+                alias TEXT NOT NULL,
+                narrator_id INTEGER NOT NULL,
+                is_name INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (narrator_id) REFERENCES Narrators(id)
+            )
+        ''')
+
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_narrator_aliases_alias ON NarratorAliases(alias)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_narrator_aliases_narrator ON NarratorAliases(narrator_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_narrators_name ON Narrators(name)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_narrators_location ON Narrators(location)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_narrators_death_date ON Narrators(death_date)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_isnads_hadith_position ON Isnads(hadith_id, position_in_chain)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_isnads_narrator ON Isnads(narrator_id)')
+
+        # Teacher -> student transmissions with the hadiths supporting each one.
+        # inferred marks the links guessed between two groups of co-narrators,
+        # which the isnad itself does not state (see link_co_narrators)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS NarratorTransmissions (
+                teacher_id INTEGER NOT NULL,
+                student_id INTEGER NOT NULL,
+                hadith_id INTEGER NOT NULL,
+                inferred INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (teacher_id, student_id, hadith_id),
+                FOREIGN KEY (teacher_id) REFERENCES Narrators(id),
+                FOREIGN KEY (student_id) REFERENCES Narrators(id),
+                FOREIGN KEY (hadith_id) REFERENCES Hadiths(id)
+            ) WITHOUT ROWID
+        ''')
+
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_transmissions_student ON NarratorTransmissions(student_id, teacher_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_transmissions_hadith ON NarratorTransmissions(hadith_id)')
+
+        # MinHash signature and variant cluster of each matn, with its LSH buckets
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MatnSignatures (
+                hadith_id INTEGER PRIMARY KEY,
+                signature BLOB,
+                cluster_id INTEGER NOT NULL,
+                FOREIGN KEY (hadith_id) REFERENCES Hadiths(id)
+            )
+        ''')
+
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MatnBuckets (
+                bucket INTEGER NOT NULL,
+                hadith_id INTEGER NOT NULL,
+                PRIMARY KEY (bucket, hadith_id),
+                FOREIGN KEY (hadith_id) REFERENCES Hadiths(id)
+            ) WITHOUT ROWID
+        ''')
+
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_matn_signatures_cluster ON MatnSignatures(cluster_id)')
+
+        # Full-text index of each hadith's matn, comments and narrator names,
+        # folded with fold_arabic and keyed by hadith id
+        self.cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS HadithSearch USING fts5(
+                matn, comments, narrators, tokenize = 'unicode61'
+            )
+        ''')
+
+        # Isnad names that were not found, or only found by fuzzy matching,
+        # with their best candidates as JSON [[narrator_id, alias, score], ...]
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS NarratorReviews (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                file_path TEXT NOT NULL DEFAULT '',
+                candidates TEXT NOT NULL,
+                narrator_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                UNIQUE (name, file_path),
+                FOREIGN KEY (narrator_id) REFERENCES Narrators(id)
+            )
+        ''')
+
         # Create a table to store the CSV hash
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS CsvHash (
@@ -56,6 +281,54 @@ class HadithDatabase:
 
         self.conn.commit()
 
+        # Databases created before NarratorAliases existed need it filled in
+        self.cursor.execute('SELECT EXISTS (SELECT 1 FROM NarratorAliases), EXISTS (SELECT 1 FROM Narrators)')
+        has_aliases, has_narrators = self.cursor.fetchone()
+        if has_narrators and not has_aliases:
+            self.rebuild_narrator_aliases()
+
+        # Likewise for NarratorTransmissions, which databases before schema
+        # version 1 lack or filled by linking every pair of co-narrators at
+        # adjacent positions, and before version 3 did not flag inferred links.
+        # Only user_version records that it was done, as an isnad with a single
+        # resolved narrator has no transmissions at all.
+        self.cursor.execute('PRAGMA user_version')
+        user_version = self.cursor.fetchone()[0]
+        if user_version < 3:
+            self.cursor.execute('PRAGMA table_info(NarratorTransmissions)')
+            if 'inferred' not in [row[1] for row in self.cursor.fetchall()]:
+                self.cursor.execute('ALTER TABLE NarratorTransmissions ADD COLUMN inferred INTEGER NOT NULL DEFAULT 0')
+            self.rebuild_narrator_transmissions()
+
+        # Before version 2 empty CSV fields were stored as '' instead of NULL
+        if user_version < 2:
+            self.cursor.execute('''
+                UPDATE Narrators
+                SET location = NULLIF(location, ''), death_date = NULLIF(death_date, ''), link = NULLIF(link, '')
+            ''')
+
+        # Version 4 stores the content hash of each hadith's tree, for render cache keys
+        if user_version < 4:
+            self.cursor.execute('PRAGMA table_info(Hadiths)')
+            if 'content_hash' not in [row[1] for row in self.cursor.fetchall()]:
+                self.cursor.execute('ALTER TABLE Hadiths ADD COLUMN content_hash TEXT')
+            self.update_content_hashes()
+
+        if user_version < SCHEMA_VERSION:
+            self.cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self.conn.commit()
+
+        # And for the matn index
+        self.cursor.execute('SELECT EXISTS (SELECT 1 FROM MatnSignatures), EXISTS (SELECT 1 FROM Hadiths)')
+        has_signatures, has_hadiths = self.cursor.fetchone()
+        if has_hadiths and not has_signatures:
+            self.rebuild_matn_index()
+
+        # And for the search index
+        self.cursor.execute('SELECT EXISTS (SELECT 1 FROM HadithSearch)')
+        if has_hadiths and not self.cursor.fetchone()[0]:
+            self.rebuild_search_index()
+
     # -------------
     # CSV Functions
     # -------------
@@ -80,137 +353,782 @@ class HadithDatabase:
         self.conn.commit()
 
     def read_narrators_from_csv(self, file_path="data/narrators.csv"):
-        # Read the narrators from a CSV file and insert them into the database
+        # Read the narrators from a CSV file and sync them into the database,
+        # returning the (added, updated, removed) counts or None if it did not change
         new_hash = self.compute_file_hash(file_path)
         stored_hash = self.get_stored_hash()
 
         if stored_hash == new_hash:
             print("No changes in the CSV file. Skipping update.")
-            return
+            return None
         else:
             print("CSV file has changed. Updating the database...")
 
-        self.truncate_narrators()
-
         with open(file_path, newline='', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
-            for row in reader:
-                truncated_names = row['truncated_names'].split(',') if row['truncated_names'] else []
-                self.add_narrator(
-                    name=row['name'], 
-                    location=row['location'], 
-                    death_date=row['death_date'], 
-                    link=row['link'],
-                    truncated_names=truncated_names  # Pass truncated names as a list
-                )
+            added, updated, removed = self.sync_narrators(reader)
 
         self.store_new_hash(new_hash)
+        print(f"Narrators added: {added}, updated: {updated}, removed: {removed}")
+        return added, updated, removed
+
+    def sync_narrators(self, rows):
+        """
+        Apply the difference between the CSV rows and the Narrators table in one
+        transaction, so unchanged narrators keep their IDs and existing isnads
+        stay linked. Rows are keyed on the 'id' column when the CSV has one and
+        on the narrator's name otherwise, so narrators sharing a name need an
+        id. A CSV listing the same key twice, or leaving out a narrator that
+        isnads still use, is rejected with a ValueError before anything is
+        written. Empty fields are stored as NULL. Returns
+        (added, updated, removed) counts.
+        """
+        fields = ('name', 'location', 'death_date', 'link', 'truncated_names')
+
+        # Fetch the stored fields as they would appear in the CSV
+        self.cursor.execute('''
+            SELECT id, name, COALESCE(location, ''), COALESCE(CAST(death_date AS TEXT), ''),
+                   COALESCE(link, ''), COALESCE(truncated_names, '')
+            FROM Narrators ORDER BY id
+        ''')
+        existing = {}  # narrator id -> field values
+        ids_by_name = {}
+        for row in self.cursor.fetchall():
+            existing[row[0]] = row[1:]
+            ids_by_name.setdefault(row[1], row[0])
+
+        desired = {}
+        duplicates = []
+        next_narrator_id = self.next_row_id('Narrators')
+
+        for row in rows:
+            values = tuple(row.get(field) or '' for field in fields)
+            if row.get('id'):
+                narrator_id = int(row['id'])
+            elif values[0] in ids_by_name:
+                narrator_id = ids_by_name[values[0]]
+            else:
+                narrator_id = next_narrator_id
+                next_narrator_id += 1
+                ids_by_name[values[0]] = narrator_id
+
+            # Two people with one name must not be merged into one narrator
+            if narrator_id in desired:
+                duplicates.append(row.get('id') or values[0])
+            desired[narrator_id] = values
+
+        if duplicates:
+            raise ValueError(
+                f"The narrators CSV lists {', '.join(map(str, duplicates))} more than once. "
+                "Give narrators sharing a name distinct values in an 'id' column."
+            )
+
+        added = [(narrator_id, *values) for narrator_id, values in desired.items() if narrator_id not in existing]
+        updated = [(*values, narrator_id) for narrator_id, values in desired.items()
+                   if narrator_id in existing and existing[narrator_id] != values]
+        removed = [narrator_id for narrator_id in existing if narrator_id not in desired]
+
+        # Isnads keep the ids of their narrators, so those cannot be dropped
+        self.cursor.execute('''
+            SELECT narrator_id, COUNT(*) FROM Isnads
+            WHERE narrator_id IN (SELECT value FROM json_each(?)) GROUP BY narrator_id
+        ''', (json.dumps(removed),))
+        in_use = self.cursor.fetchall()
+        if in_use:
+            raise ValueError(
+                "The narrators CSV no longer lists narrators still used in isnads: "
+                f"{', '.join(f'{existing[narrator_id][0]} ({narrator_id}, {count} links)' for narrator_id, count in in_use)}. "
+                "Keep them in the CSV, or remove their hadiths first."
+            )
+
+        self.cursor.executemany('''
+            INSERT INTO Narrators (id, name, location, death_date, link, truncated_names)
+            VALUES (?, ?, NULLIF(?, ''), NULLIF(?, ''), NULLIF(?, ''), NULLIF(?, ''))
+        ''', added)
+        self.cursor.executemany('''
+            UPDATE Narrators
+            SET name = ?, location = NULLIF(?, ''), death_date = NULLIF(?, ''), link = NULLIF(?, ''),
+                truncated_names = NULLIF(?, '')
+            WHERE id = ?
+        ''', updated)
+        self.delete_narrator_aliases(removed + [row[-1] for row in updated])
+        self.write_narrator_aliases(
+            [(row[0], row[1], row[5]) for row in added] + [(row[-1], row[0], row[4]) for row in updated]
+        )
+
+        # Names a reviewer linked to a removed narrator go back to the queue
+        self.cursor.execute('''
+            UPDATE NarratorReviews SET narrator_id = NULL, status = 'pending'
+            WHERE narrator_id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(removed),))
+        self.cursor.executemany('DELETE FROM Narrators WHERE id = ?', [(narrator_id,) for narrator_id in removed])
+
+        # Hadiths listing a renamed narrator are searchable by the old name
+        self.cursor.execute('''
+            SELECT DISTINCT hadith_id FROM Isnads WHERE narrator_id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps([row[-1] for row in updated]),))
+        touched = {row[0] for row in self.cursor.fetchall()}
+        self.index_search(touched)
+        self.update_content_hashes(touched)
+        self.conn.commit()
+        self.notify_ingest(touched)  # Their trees show the old name and location
+
+        if added or updated or removed:
+            self.invalidate_narrator_resolver()
+
+        return len(added), len(updated), len(removed)
 
 
     # --------
     # Narrator
     # --------
-    def truncate_narrators(self):
-        # Remove all records from the Narrators table
-        self.cursor.execute('DELETE FROM Narrators')
+    @property
+    def narrator_resolver(self):
+        """
+        In-memory copy of NarratorAliases with narrator death dates, used for
+        fuzzy matching and ranking ambiguous names. Exact lookups query
+        NarratorAliases itself. Built on first use and rebuilt after the
+        narrators change, here or from another connection.
+        """
+        data_version = self.get_data_version()
+        if self._narrator_resolver is None or self._narrator_resolver_version != data_version:
+            self._narrator_resolver = NarratorResolver.from_alias_rows(self.conn.execute('''
+                SELECT a.narrator_id, a.alias, a.is_name, n.death_date
+                FROM NarratorAliases a JOIN Narrators n ON a.narrator_id = n.id
+                ORDER BY a.narrator_id, a.is_name DESC, a.rowid
+            '''))
+            self._narrator_resolver_version = data_version
+
+            ambiguous = self._narrator_resolver.ambiguous_aliases()
+            if ambiguous:
+                print(f"Warning: {len(ambiguous)} narrator aliases are ambiguous.")
+        return self._narrator_resolver
+
+    def invalidate_narrator_resolver(self):
+        self._narrator_resolver = None
+
+    def write_narrator_aliases(self, narrators):
+        # Narrators are (id, name, truncated_names) rows, the caller commits
+        rows = []
+        for narrator_id, name, truncated_names in narrators:
+            rows.append((normalize_name(name), narrator_id, 1))
+            rows.extend((alias, narrator_id, 0) for alias in dict.fromkeys(map(normalize_name, split_aliases(truncated_names))))
+
+        self.cursor.executemany('INSERT INTO NarratorAliases (alias, narrator_id, is_name) VALUES (?, ?, ?)', rows)
+
+    def delete_narrator_aliases(self, narrator_ids):
+        self.cursor.executemany('DELETE FROM NarratorAliases WHERE narrator_id = ?', [(narrator_id,) for narrator_id in narrator_ids])
+
+    def rebuild_narrator_aliases(self):
+        self.cursor.execute('DELETE FROM NarratorAliases')
+        self.cursor.execute('SELECT id, name, truncated_names FROM Narrators')
+        self.write_narrator_aliases(self.cursor.fetchall())
         self.conn.commit()
 
     def insert_hadith(self, hadith: Hadith):
-        # Insert a new hadith into the Hadiths table
-        self.cursor.execute('''
-            INSERT INTO Hadiths (matn, comments, file_path)
-            VALUES (?, ?, ?)
-        ''', (hadith.matn, hadith.comment, hadith.file_path))
+        # Insert a new hadith and its isnad chain, returning the hadith's ID
+        return self.insert_hadiths([hadith])[0]
+
+    def insert_hadiths(self, hadiths, commit_every=None, hadith_ids=None):
+        """
+        Insert many hadiths and their isnad chains with executemany inside one
+        transaction. If commit_every is given, commit after every that many
+        hadiths. hadith_ids optionally gives the ID to use for each hadith, in
+        order. Returns the list of new hadith IDs.
+        """
+        new_hadith_ids = []
+        hadith_rows = []
+        isnad_rows = []
+        transmission_rows = []
+        next_hadith_id = self.next_row_id('Hadiths')
+        given_ids = iter(hadith_ids) if hadith_ids is not None else None
+
+        for hadith in hadiths:
+            if given_ids is not None:
+                hadith_id = next(given_ids)
+            else:
+                hadith_id = next_hadith_id
+                next_hadith_id += 1
+
+            isnad = self.resolve_isnad(hadith)
+            hadith_rows.append((hadith_id, hadith.matn, hadith.comment, hadith.file_path))
+            isnad_rows.extend(self.build_isnad_rows(hadith_id, isnad))
+            transmission_rows.extend(self.build_transmission_rows(hadith_id, isnad))
+            new_hadith_ids.append(hadith_id)
+
+            if commit_every and len(hadith_rows) >= commit_every:
+                self.write_hadith_rows(hadith_rows, isnad_rows, transmission_rows)
+                self.conn.commit()
+                hadith_rows, isnad_rows, transmission_rows = [], [], []
+
+        self.write_hadith_rows(hadith_rows, isnad_rows, transmission_rows)
         self.conn.commit()
 
-        hadith_id = self.cursor.lastrowid  # Return the new hadith's ID
+        return new_hadith_ids
+
+    def next_row_id(self, table):
+        # The next AUTOINCREMENT id, so ids can be assigned before inserting
+        self.cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+        result = self.cursor.fetchone()
+        sequence = result[0] if result else 0
+
+        self.cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        return max(sequence, self.cursor.fetchone()[0]) + 1
+
+    def write_hadith_rows(self, hadith_rows, isnad_rows, transmission_rows=()):
+        self.cursor.executemany('''
+            INSERT INTO Hadiths (id, matn, comments, file_path)
+            VALUES (?, ?, ?, ?)
+        ''', hadith_rows)
+
+        self.cursor.executemany('''
+            INSERT INTO Isnads (hadith_id, narrator_id, next_narrator_id, position_in_chain)
+            VALUES (?, ?, ?, ?)
+        ''', isnad_rows)
+
+        self.write_transmission_rows(transmission_rows)
+        self.index_matns((row[0], row[1]) for row in hadith_rows)
 
-        self.link_narrators_in_isnad(hadith_id, hadith)
+        hadith_ids = {row[0] for row in hadith_rows} | {row[0] for row in isnad_rows}
+        self.index_search(hadith_ids)
+        self.update_content_hashes(hadith_ids)
+        self.notify_ingest(hadith_ids)
 
-        return hadith_id
+    def notify_ingest(self, hadith_ids):
+        if hadith_ids:
+            for listener in self.ingest_listeners:
+                listener(hadith_ids)
+
+    def get_data_version(self):
+        # Changes whenever another connection commits to the database
+        self.cursor.execute('PRAGMA data_version')
+        return self.cursor.fetchone()[0]
 
     def add_narrator(self, name, location=None, death_date=None, link=None, truncated_names=None):
-        # Join truncated names into a comma-separated string
-        truncated_names_str = ','.join(truncated_names) if truncated_names else None
+        # Join truncated names with '|', the separator used in the CSV
+        truncated_names_str = '|'.join(truncated_names) if truncated_names else None
 
         # Insert a new narrator into the Narrators table, including multiple truncated names
         self.cursor.execute('''
             INSERT INTO Narrators (name, location, death_date, link, truncated_names)
             VALUES (?, ?, ?, ?, ?)
         ''', (name, location, death_date, link, truncated_names_str))
+        narrator_id = self.cursor.lastrowid
+
+        self.write_narrator_aliases([(narrator_id, name, truncated_names_str)])
         self.conn.commit()
-        return self.cursor.lastrowid  # Return the new narrator's ID
+        self.invalidate_narrator_resolver()
+        return narrator_id  # Return the new narrator's ID
 
-    def check_narrator_in_db(self, hadith, narrator_name):
-        # First, try to find the narrator by full name
-        self.cursor.execute('SELECT id, truncated_names FROM Narrators WHERE name = ?', (narrator_name,))
-        result = self.cursor.fetchone()
+    def add_narrators(self, narrators):
+        """
+        Insert many narrators in one transaction. Each narrator is a
+        (name, location, death_date, link, truncated_names) tuple.
+        """
+        rows = []
+        narrator_id = self.next_row_id('Narrators')
+        for name, location, death_date, link, truncated_names in narrators:
+            truncated_names_str = '|'.join(truncated_names) if truncated_names else None
+            rows.append((narrator_id, name, location, death_date, link, truncated_names_str))
+            narrator_id += 1
+
+        self.cursor.executemany('''
+            INSERT INTO Narrators (id, name, location, death_date, link, truncated_names)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        self.write_narrator_aliases([(row[0], row[1], row[5]) for row in rows])
+        self.conn.commit()
+        self.invalidate_narrator_resolver()
+
+    def find_narrator_candidates(self, narrator_name):
+        """
+        Return the IDs of every narrator the name could refer to with one indexed
+        query. A full name match takes precedence over truncated names.
+        """
+        self.cursor.execute('''
+            SELECT narrator_id, is_name FROM NarratorAliases
+            WHERE alias = ?
+            ORDER BY is_name DESC, narrator_id
+        ''', (normalize_name(narrator_name),))
+        rows = self.cursor.fetchall()
 
-        # If not found by full name, check against truncated names
-        if not result:
-            # Fetch all narrators and check truncated names in Python
-            self.cursor.execute('SELECT id, name, truncated_names FROM Narrators')
-            all_narrators = self.cursor.fetchall()
-
-            found = False
-            for narrator in all_narrators:
-                truncated_names = narrator[2]
-                if truncated_names:
-                    # Split truncated_names and check if the current narrator_name matches
-                    truncated_list = truncated_names.split('|')
-                    if narrator_name in truncated_list:
-                        result = narrator
-                        found = True
-                        break
-
-            if not found:
-                print(f"\n-------\nError: Narrator '{narrator_name}' not found in the database.")
-                print(hadith)
-                return  # Stop if any narrator is missing
+        if rows and rows[0][1]:
+            return [rows[0][0]]
+        return list(dict.fromkeys(row[0] for row in rows))
+
+    def check_narrator_in_db(self, hadith, narrator_name, students=()):
+        # Look the name up among full names and truncated names
+        candidates = self.find_narrator_candidates(narrator_name)
+
+        if not candidates:
+            return self.fuzzy_link_narrator(hadith, narrator_name)
+
+        if len(candidates) == 1:
+            return candidates[0]
+
+        # Pick the reading that fits the narrators already resolved below it
+        ranked = self.rank_narrator_candidates(candidates, students)
+        narrator_id = ranked[0][0]
+        if ranked[0][1][:-1] == ranked[1][1][:-1]:  # Only the listing order separates them
+            print(f"Warning: Narrator '{narrator_name}' is ambiguous between ids {candidates}, using {narrator_id}.")
 
         # Narrator ID
-        return result[0]
+        return narrator_id
+
+    def rank_narrator_candidates(self, candidates, students=()):
+        """
+        Rank the narrators an ambiguous name could refer to, given the
+        narrators at the previous position of the chain (who heard from
+        them). Candidates are ordered by the number of hadiths in which they
+        taught those students, then by whether their death date is plausible
+        for a teacher of those students, then by their number of
+        transmissions overall, and last by the order of find_narrator_candidates.
+        Uses the cached narrator graph and death dates, so no query is made.
+        Returns (narrator_id, key) pairs, best first.
+        """
+        graph = self.narrator_graph
+        death_dates = self.narrator_resolver.death_dates
+
+        ranked = []
+        for order, candidate in enumerate(candidates):
+            taught = graph.students.get(candidate, {})
+            transmissions = sum(len(taught.get(student, ())) for student in students)
 
-    def insert_narrators_into_isnad(self, hadith_id, narrator_id, position, prev_narrator_id):
-        # Insert into Isnads table, linking narrators in the isnad chain
+            plausible = 0  # Unknown
+            teacher_death = death_dates.get(candidate)
+            for student in students:
+                student_death = death_dates.get(student)
+                if teacher_death is None or student_death is None:
+                    continue
+                gap = student_death - teacher_death
+                if -TEACHER_OUTLIVED_STUDENT_YEARS <= gap <= TEACHER_DIED_BEFORE_STUDENT_YEARS:
+                    plausible = max(plausible, 1)
+                else:
+                    plausible = -1
+                    break
+
+            key = (transmissions, plausible, graph.out_degree(candidate, weighted=True), -order)
+            ranked.append((candidate, key))
+
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked
+
+    def fuzzy_link_narrator(self, hadith, narrator_name):
+        """
+        Fall back to fuzzy matching for a name that is neither a full name nor
+        an alias. The best match is linked if it scores at least
+        fuzzy_link_threshold and no other narrator scores the same, and the
+        name is queued in NarratorReviews either way. A name a reviewer
+        already resolved is linked to the narrator they chose.
+        """
         self.cursor.execute('''
-            INSERT INTO Isnads (hadith_id, narrator_id, next_narrator_id, position_in_chain)
-            VALUES (?, ?, ?, ?)
-        ''', (hadith_id, narrator_id, None, position))
+            SELECT narrator_id FROM NarratorReviews
+            WHERE name = ? AND status = 'resolved'
+            ORDER BY id DESC LIMIT 1
+        ''', (narrator_name,))
+        resolved = self.cursor.fetchone()
+        if resolved:
+            return resolved[0]
 
-        # If there's a previous narrator, update the next_narrator_id of the previous one
-        if prev_narrator_id is not None:
-            self.cursor.execute('''
-                UPDATE Isnads
-                SET next_narrator_id = ?
-                WHERE hadith_id = ? AND narrator_id = ?
-            ''', (narrator_id, hadith_id, prev_narrator_id))
+        matches = self.narrator_resolver.fuzzy_candidates(narrator_name)
+        linked = (
+            matches and matches[0].score >= self.fuzzy_link_threshold
+            and (len(matches) == 1 or matches[1].score < matches[0].score)
+        )
+        narrator_id = matches[0].narrator_id if linked else None
+
+        self.cursor.execute('''
+            INSERT INTO NarratorReviews (name, file_path, candidates, narrator_id, status)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (name, file_path) DO UPDATE SET
+                candidates = excluded.candidates, narrator_id = excluded.narrator_id, status = excluded.status
+        ''', (
+            narrator_name, hadith.file_path, json.dumps(matches, ensure_ascii=False),
+            narrator_id, 'linked' if linked else 'pending',
+        ))
+        return narrator_id  # None leaves a gap in the isnad
+
+    def get_narrator_reviews(self, status='pending'):
+        """
+        Return (id, name, file_path, candidates, narrator_id) rows of the review
+        queue with the given status, candidates as FuzzyMatch records.
+        """
+        self.cursor.execute('''
+            SELECT id, name, file_path, candidates, narrator_id FROM NarratorReviews
+            WHERE status = ? ORDER BY id
+        ''', (status,))
+        return [(*row[:3], [FuzzyMatch(*match) for match in json.loads(row[3])], row[4]) for row in self.cursor.fetchall()]
+
+    def resolve_narrator_review(self, review_id, narrator_id):
+        """
+        Record the narrator a reviewer chose. The manifest entries of the
+        reviewed file's hadiths are dropped, so the next sync re-ingests the
+        file under the same hadith IDs and links the name.
+        """
+        self.cursor.execute('''
+            UPDATE NarratorReviews SET narrator_id = ?, status = 'resolved' WHERE id = ?
+        ''', (narrator_id, review_id))
+        self.cursor.execute('''
+            DELETE FROM HadithFiles WHERE hadith_id IN (
+                SELECT h.id FROM Hadiths h
+                JOIN NarratorReviews r ON r.file_path = h.file_path
+                WHERE r.id = ?
+            )
+        ''', (review_id,))
+        self.conn.commit()
+
+    def resolve_isnad(self, hadith):
+        """
+        Resolve the hadith's narrators to a list of narrator ID lists, one per
+        position in the chain. Ambiguous names are resolved in the context of
+        the previous position. A name that is missing is left out of its
+        position, so a position whose names are all missing is an empty list
+        and the chain keeps its later narrators past the gap.
+        """
+        isnad = []
+
+        for narrator_names in hadith.narrators:
+            if not isinstance(narrator_names, list):
+                narrator_names = [narrator_names]
+
+            # The narrators at the previous position heard from this one
+            students = isnad[-1] if isnad else ()
+
+            narrator_ids = []
+            for narrator_name in narrator_names:
+                narrator_id = self.check_narrator_in_db(hadith, narrator_name, students)
+                if narrator_id:
+                    narrator_ids.append(narrator_id)
+
+            isnad.append(narrator_ids)
+
+        return isnad
+
+    def build_isnad_rows(self, hadith_id, isnad):
+        """
+        Build the Isnads rows for a resolved chain. Each row's next_narrator_id
+        is the narrator it heard the hadith from, as linked by transmission_pairs.
+        """
+        teachers = {}
+        for position in range(len(isnad) - 1):
+            for teacher_id, student_id in link_co_narrators(isnad[position + 1], isnad[position]):
+                teachers.setdefault((position, student_id), teacher_id)
+
+        return [
+            (hadith_id, narrator_id, teachers.get((position, narrator_id)), position)
+            for position, narrator_ids in enumerate(isnad)
+            for narrator_id in narrator_ids
+        ]
 
     def link_narrators_in_isnad(self, hadith_id, hadith):
-        prev_narrator_id = None
-
-        for position, narrator_names in enumerate(hadith.narrators):
-            if isinstance(narrator_names, list):
-                for narrator_name in narrator_names:
-                    narrator_id = self.check_narrator_in_db(hadith, narrator_name)
-                    if not narrator_id:
-                        print(f"\n-------\nError: Narrator '{narrator_name}' not found in the database.")
-                        print(hadith)
-                        return  # Stop if any narrator is missing
-                    self.insert_narrators_into_isnad(hadith_id, narrator_id, position, prev_narrator_id)
-            else:
-                narrator_name = narrator_names
-                narrator_id = self.check_narrator_in_db(hadith, narrator_name)
-                if not narrator_id:
-                    print(f"\n-------\nError: Narrator '{narrator_name}' not found in the database.")
-                    print(hadith)
-                    return  # Stop if any narrator is missing
-                self.insert_narrators_into_isnad(hadith_id, narrator_id, position, prev_narrator_id)
+        isnad = self.resolve_isnad(hadith)
+        isnad_rows = self.build_isnad_rows(hadith_id, isnad)
+        self.write_hadith_rows([], isnad_rows, self.build_transmission_rows(hadith_id, isnad))
+        self.conn.commit()
+
+    def delete_hadiths(self, hadith_ids):
+        # Remove hadiths and their isnads, the caller commits
+        rows = [(hadith_id,) for hadith_id in hadith_ids]
+        self.remove_matns(hadith_ids)
+        self.cursor.executemany('DELETE FROM NarratorTransmissions WHERE hadith_id = ?', rows)
+        self.cursor.executemany('DELETE FROM Isnads WHERE hadith_id = ?', rows)
+        self.cursor.executemany('DELETE FROM HadithSearch WHERE rowid = ?', rows)
+        self.cursor.executemany('DELETE FROM Hadiths WHERE id = ?', rows)
+        if rows:
+            self._narrator_graph = None
+            self.notify_ingest(set(hadith_ids))
+
+    # ----------------------
+    # Narrator Transmissions
+    # ----------------------
+    def build_transmission_rows(self, hadith_id, isnad):
+        # A link the isnad states elsewhere in the chain is not inferred
+        inferred = {}
+        for teacher_id, student_id, pair_inferred in transmission_pairs(isnad):
+            inferred[teacher_id, student_id] = inferred.get((teacher_id, student_id), True) and pair_inferred
+        return [
+            (teacher_id, student_id, hadith_id, int(pair_inferred))
+            for (teacher_id, student_id), pair_inferred in inferred.items()
+        ]
+
+    def write_transmission_rows(self, transmission_rows):
+        # Rows are (teacher_id, student_id, hadith_id, inferred), the caller commits
+        if self._narrator_graph is None:
+            self.cursor.executemany('''
+                INSERT OR IGNORE INTO NarratorTransmissions (teacher_id, student_id, hadith_id, inferred)
+                VALUES (?, ?, ?, ?)
+            ''', transmission_rows)
+            return
 
-            prev_narrator_id = narrator_id
+        # Keep a loaded graph up to date instead of reloading it, with only the
+        # rows the primary key let through so a hadith is never counted twice
+        inserted = self.conn.execute('''
+            INSERT OR IGNORE INTO NarratorTransmissions (teacher_id, student_id, hadith_id, inferred)
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+                json_extract(value, '$[3]')
+            FROM json_each(?)
+            RETURNING teacher_id, student_id, hadith_id
+        ''', (json.dumps(transmission_rows),)).fetchall()
+        for teacher_id, student_id, hadith_id in inserted:
+            self._narrator_graph.add_transmission(teacher_id, student_id, hadith_id)
 
+    def rebuild_narrator_transmissions(self):
+        # Recreate the transmissions and next_narrator_id links from the isnads already stored
+        self.cursor.execute('DELETE FROM NarratorTransmissions')
+        rows = self.conn.execute('''
+            SELECT hadith_id, position_in_chain, narrator_id, id FROM Isnads
+            ORDER BY hadith_id, position_in_chain, id
+        ''').fetchall()
+
+        transmission_rows = []
+        next_narrator_rows = []
+        for hadith_id, hadith_rows in groupby(rows, key=itemgetter(0)):
+            positions = [list(position_rows) for _, position_rows in groupby(hadith_rows, key=itemgetter(1))]
+            isnad = [[row[2] for row in position_rows] for position_rows in positions]
+            transmission_rows.extend(self.build_transmission_rows(hadith_id, isnad))
+
+            # build_isnad_rows lists narrators in the same order as the stored rows
+            isnad_ids = [row[3] for position_rows in positions for row in position_rows]
+            for isnad_id, isnad_row in zip(isnad_ids, self.build_isnad_rows(hadith_id, isnad)):
+                next_narrator_rows.append((isnad_row[2], isnad_id))
+
+        self.cursor.executemany('UPDATE Isnads SET next_narrator_id = ? WHERE id = ?', next_narrator_rows)
+        self._narrator_graph = None
+        self.write_transmission_rows(transmission_rows)
         self.conn.commit()
 
+    @property
+    def narrator_graph(self):
+        # Loaded on first use, then updated in place as hadiths are inserted
+        if self._narrator_graph is None:
+            rows = self.conn.execute('SELECT teacher_id, student_id, hadith_id FROM NarratorTransmissions')
+            self._narrator_graph = NarratorGraph.from_rows(rows)
+        return self._narrator_graph
+
+    def get_transmissions(self, hadith_ids=None):
+        """
+        Return (teacher_id, student_id, hadith_id) rows for the given hadiths,
+        or for the whole corpus if hadith_ids is None.
+        """
+        if hadith_ids is None:
+            return self.conn.execute('SELECT teacher_id, student_id, hadith_id FROM NarratorTransmissions')
+
+        return self.conn.execute('''
+            SELECT teacher_id, student_id, hadith_id FROM NarratorTransmissions
+            WHERE hadith_id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(sorted(hadith_ids)),))
+
+    def get_chains_through_narrator(self, narrator_id):
+        """
+        Return {hadith id: isnad} for every hadith whose isnad contains the
+        narrator, each isnad being a list of narrator ID lists by position.
+        """
+        rows = self.conn.execute('''
+            SELECT i.hadith_id, i.position_in_chain, i.narrator_id
+            FROM Isnads i
+            WHERE i.hadith_id IN (SELECT hadith_id FROM Isnads WHERE narrator_id = ?)
+            ORDER BY i.hadith_id, i.position_in_chain, i.id
+        ''', (narrator_id,))
+
+        return {
+            hadith_id: [[row[2] for row in position_rows] for _, position_rows in groupby(hadith_rows, key=itemgetter(1))]
+            for hadith_id, hadith_rows in groupby(rows, key=itemgetter(0))
+        }
+
+    # -------------
+    # Matn Clusters
+    # -------------
+    def index_matns(self, matns):
+        """
+        Add (hadith_id, matn) pairs to the matn index, the caller commits. Each
+        matn is only compared with the matns sharing one of its LSH buckets, and
+        joins (or merges) the clusters of those similar enough to it. A cluster
+        is identified by its smallest hadith id.
+        """
+        for hadith_id, matn in matns:
+            signature = minhash_signature(matn)
+            if signature is None:
+                self.cursor.execute('INSERT INTO MatnSignatures (hadith_id, signature, cluster_id) VALUES (?, NULL, ?)',
+                                    (hadith_id, hadith_id))
+                continue
+
+            # A few matns per bucket are enough to find its cluster, so a large
+            # cluster of near-identical matns does not make inserts quadratic.
+            # The newest are read, so a matn is always compared with the
+            # variants ingested just before it, not only the oldest matns of a
+            # crowded bucket
+            buckets = band_buckets(signature)
+            candidates = self.conn.execute(
+                MATN_CANDIDATES_SQL, [value for bucket in buckets for value in (bucket, MAX_BUCKET_CANDIDATES)]
+            )
+
+            clusters = set()
+            for blob, candidate_cluster_id in candidates:
+                if candidate_cluster_id in clusters:
+                    continue
+                if estimated_similarity(signature, signature_from_blob(blob)) >= SIMILARITY_THRESHOLD:
+                    clusters.add(candidate_cluster_id)
+            cluster_id = min(clusters | {hadith_id})
+
+            merged = [(cluster_id, other_id) for other_id in clusters if other_id != cluster_id]
+            self.cursor.executemany('UPDATE MatnSignatures SET cluster_id = ? WHERE cluster_id = ?', merged)
+            self.cursor.execute('INSERT INTO MatnSignatures (hadith_id, signature, cluster_id) VALUES (?, ?, ?)',
+                                (hadith_id, signature.tobytes(), cluster_id))
+            self.cursor.executemany('INSERT OR IGNORE INTO MatnBuckets (bucket, hadith_id) VALUES (?, ?)',
+                                    [(bucket, hadith_id) for bucket in buckets])
+
+    def remove_matns(self, hadith_ids):
+        """
+        Remove matns from the index, the caller commits. The rest of a cluster
+        stays together even if a removed matn was what linked it, as checking
+        for a split means comparing the whole cluster again; rebuild_matn_index
+        recomputes every cluster. A cluster whose smallest hadith id is removed
+        is renamed after the next one, so a new hadith reusing the id does not
+        join it by accident.
+        """
+        rows = self.conn.execute('''
+            SELECT hadith_id, signature, cluster_id FROM MatnSignatures
+            WHERE hadith_id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(sorted(hadith_ids)),)).fetchall()
+
+        bucket_rows = []
+        for hadith_id, blob, _ in rows:
+            if blob is not None:
+                bucket_rows.extend((bucket, hadith_id) for bucket in band_buckets(signature_from_blob(blob)))
+        self.cursor.executemany('DELETE FROM MatnBuckets WHERE bucket = ? AND hadith_id = ?', bucket_rows)
+        self.cursor.executemany('DELETE FROM MatnSignatures WHERE hadith_id = ?', [(row[0],) for row in rows])
+
+        renamed = {cluster_id for hadith_id, _, cluster_id in rows if hadith_id == cluster_id}
+        self.cursor.executemany('''
+            UPDATE MatnSignatures SET cluster_id = (SELECT min(hadith_id) FROM MatnSignatures WHERE cluster_id = ?1)
+            WHERE cluster_id = ?1
+        ''', [(cluster_id,) for cluster_id in sorted(renamed)])
+
+    def rebuild_matn_index(self):
+        self.cursor.execute('DELETE FROM MatnBuckets')
+        self.cursor.execute('DELETE FROM MatnSignatures')
+        self.index_matns(self.conn.execute('SELECT id, matn FROM Hadiths ORDER BY id'))
+        self.conn.commit()
+
+    def get_matn_clusters(self, min_size=1):
+        """
+        Return {cluster id: hadith ids} for clusters of at least min_size matns.
+        """
+        rows = self.conn.execute('SELECT cluster_id, hadith_id FROM MatnSignatures ORDER BY cluster_id, hadith_id')
+        clusters = {
+            cluster_id: [row[1] for row in cluster_rows]
+            for cluster_id, cluster_rows in groupby(rows, key=itemgetter(0))
+        }
+        return {cluster_id: hadith_ids for cluster_id, hadith_ids in clusters.items() if len(hadith_ids) >= min_size}
+
+    def get_matn_cluster(self, hadith_id):
+        """
+        Return the hadith ids whose matn is a variant of the given hadith's, including it.
+        """
+        self.cursor.execute('''
+            SELECT hadith_id FROM MatnSignatures
+            WHERE cluster_id = (SELECT cluster_id FROM MatnSignatures WHERE hadith_id = ?)
+            ORDER BY hadith_id
+        ''', (hadith_id,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_matn_cluster_ids(self, hadith_ids):
+        """
+        Return {hadith id: matn cluster id} for those of the given hadiths that are indexed.
+        """
+        rows = self.conn.execute('''
+            SELECT hadith_id, cluster_id FROM MatnSignatures
+            WHERE hadith_id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(sorted(hadith_ids)),))
+        return dict(rows)
+
+    # ------
+    # Search
+    # ------
+    def index_search(self, hadith_ids):
+        # (Re)index the given hadiths for full-text search, the caller commits
+        if not hadith_ids:
+            return
+        params = (json.dumps(sorted(hadith_ids)),)
+        self.cursor.execute('DELETE FROM HadithSearch WHERE rowid IN (SELECT value FROM json_each(?))', params)
+        self.cursor.execute('''
+            INSERT INTO HadithSearch (rowid, matn, comments, narrators)
+            SELECT h.id, fold_arabic(h.matn), fold_arabic(h.comments), fold_arabic((
+                SELECT group_concat(n.name, '، ')
+                FROM Isnads i JOIN Narrators n ON i.narrator_id = n.id
+                WHERE i.hadith_id = h.id
+            ))
+            FROM Hadiths h
+            WHERE h.id IN (SELECT value FROM json_each(?))
+        ''', params)
+
+    def rebuild_search_index(self):
+        self.cursor.execute('DELETE FROM HadithSearch')
+        self.cursor.execute('SELECT id FROM Hadiths')
+        self.index_search([row[0] for row in self.cursor.fetchall()])
+        self.conn.commit()
+
+    def search(self, query, limit=20, columns=None, phrase=False):
+        """
+        Search the matn, comments and narrator names of every hadith for all
+        the words of query, ignoring tashkeel and alef/hamza, ta marbuta and
+        alif maqsura spelling variants. A word ending with * matches as a
+        prefix. columns optionally restricts the search to some of 'matn',
+        'comments' and 'narrators'. Returns SearchResult records, best first,
+        matches in the matn weighing twice as much.
+
+        Ranking scans the index entries of every word searched for, so words
+        found in most hadiths (like بن in names) are slow on their own. Search
+        names with phrase=True, which ranks the whole phrase instead.
+        """
+        match = build_match_query(query, columns, phrase)
+        if match is None:
+            return []
+
+        rows = self.conn.execute('''
+            SELECT rowid, bm25(HadithSearch, 2.0, 1.0, 1.0) AS score,
+                   snippet(HadithSearch, -1, '[', ']', '…', 12)
+            FROM HadithSearch
+            WHERE HadithSearch MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ''', (match, limit))
+        return [SearchResult(*row) for row in rows]
+
+    # --------------------
+    # Hadith File Manifest
+    # --------------------
+    def get_hadith_files(self):
+        """
+        Return the manifest as a dict of path -> (mtime_ns, size, hash_value, hadith_id).
+        """
+        self.cursor.execute('SELECT path, mtime_ns, size, hash_value, hadith_id FROM HadithFiles')
+        return {row[0]: row[1:] for row in self.cursor.fetchall()}
+
+    def get_unmanaged_hadiths(self):
+        """
+        Return a dict of file_path -> hadith IDs for hadiths that were inserted
+        without a manifest entry, for example by an older version of main.py.
+        """
+        self.cursor.execute('''
+            SELECT id, file_path FROM Hadiths
+            WHERE id NOT IN (SELECT hadith_id FROM HadithFiles)
+            ORDER BY id
+        ''')
+        unmanaged = {}
+        for hadith_id, file_path in self.cursor.fetchall():
+            unmanaged.setdefault(file_path, []).append(hadith_id)
+        return unmanaged
+
+    def store_hadith_files(self, rows):
+        # Rows are (path, mtime_ns, size, hash_value, hadith_id), the caller commits
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO HadithFiles (path, mtime_ns, size, hash_value, hadith_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+
+    def delete_hadith_files(self, paths):
+        self.cursor.executemany('DELETE FROM HadithFiles WHERE path = ?', [(path,) for path in paths])
 
     def get_hadith_with_isnad(self, hadith_id):
         # Retrieve the hadith with its isnad chain
@@ -225,44 +1143,76 @@ class HadithDatabase:
         
         return self.cursor.fetchall()
 
-    def get_all_hadiths_with_isnad(self):
+    def iter_hadiths_with_isnad(self, hadith_ids=None):
         """
-        Fetch all hadiths along with their isnad chain and matn.
-        Returns a list of hadiths, each with its isnad chain and matn.
+        Yield one HadithRecord per hadith, in hadith id order, walking the
+        database cursors instead of loading the whole join. The isnad is a list
+        of NarratorLink ordered by position_in_chain. hadith_ids optionally
+        restricts the hadiths returned.
         """
-        # Query to fetch hadiths and their isnads
-        query = """
-        SELECT h.id, h.matn, n.name, n.location, i.position_in_chain
-        FROM Hadiths h
-        JOIN Isnads i ON h.id = i.hadith_id
-        JOIN Narrators n ON i.narrator_id = n.id
-        ORDER BY h.id, i.position_in_chain
+        if hadith_ids is None:
+            hadith_filter, isnad_filter, params = '', '', ()
+        else:
+            hadith_filter = 'WHERE id IN (SELECT value FROM json_each(?))'
+            isnad_filter = 'WHERE i.hadith_id IN (SELECT value FROM json_each(?))'
+            params = (json.dumps(sorted(hadith_ids)),)
+
+        # Separate cursors so self.cursor stays usable while the generator is alive
+        hadith_cursor = self.conn.execute(f'SELECT id, matn FROM Hadiths {hadith_filter} ORDER BY id', params)
+        isnad_cursor = self.conn.execute(f'''
+            SELECT i.hadith_id, n.name, n.location, i.position_in_chain
+            FROM Isnads i
+            JOIN Narrators n ON i.narrator_id = n.id
+            {isnad_filter}
+            ORDER BY i.hadith_id, i.position_in_chain
+        ''', params)
+
+        # Merge the two ordered cursors so the matn is read once per hadith
+        hadith_row = hadith_cursor.fetchone()
+        for hadith_id, rows in groupby(isnad_cursor, key=itemgetter(0)):
+            while hadith_row is not None and hadith_row[0] < hadith_id:
+                hadith_row = hadith_cursor.fetchone()
+            if hadith_row is None:
+                break
+            if hadith_row[0] != hadith_id:
+                continue  # Isnad rows of a deleted hadith
+
+            isnad = [NarratorLink(row[1], row[2], row[3]) for row in rows]
+            yield HadithRecord(hadith_id, hadith_row[1], isnad)
+
+    def update_content_hashes(self, hadith_ids=None):
+        # Store the content_hash of the given hadiths, or all of them, the caller commits.
+        # One left without an isnad has no tree and gets none
+        rows = [(content_hash(hadith), hadith.id) for hadith in self.iter_hadiths_with_isnad(hadith_ids)]
+        if hadith_ids is None:
+            self.cursor.execute('UPDATE Hadiths SET content_hash = NULL')
+        else:
+            self.cursor.execute('''
+                UPDATE Hadiths SET content_hash = NULL WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(sorted(hadith_ids)),))
+        self.cursor.executemany('UPDATE Hadiths SET content_hash = ? WHERE id = ?', rows)
+
+    def get_content_hashes(self, hadith_ids=None):
         """
-        self.cursor.execute(query)
-        rows = self.cursor.fetchall()
+        Return (hadith_id, content_hash) rows in hadith id order for the given
+        hadiths, or the whole corpus. Hadiths without an isnad have no tree
+        and are left out, as in iter_hadiths_with_isnad.
+        """
+        if hadith_ids is None:
+            return self.conn.execute('SELECT id, content_hash FROM Hadiths WHERE content_hash IS NOT NULL ORDER BY id')
 
-        # Organize the data by hadith
-        hadith_dict = {}
-        for row in rows:
-            hadith_id = row[0]
-            matn = row[1]
-            narrator = {
-                "name": row[2],
-                "geography": row[3],
-                "position_in_chain": row[4]
-            }
-
-            if hadith_id not in hadith_dict:
-                hadith_dict[hadith_id] = {"matn": matn, "isnad": []}
-            
-            hadith_dict[hadith_id]["isnad"].append(narrator)
-
-        # Convert to a list format
-        hadith_list = []
-        for hadith in hadith_dict.values():
-            hadith_list.append(hadith)
-
-        return hadith_list
+        return self.conn.execute('''
+            SELECT id, content_hash FROM Hadiths
+            WHERE id IN (SELECT value FROM json_each(?)) AND content_hash IS NOT NULL
+            ORDER BY id
+        ''', (json.dumps(sorted(hadith_ids)),))
+
+    def get_all_hadiths_with_isnad(self):
+        """
+        Fetch all hadiths along with their isnad chain and matn.
+        Returns a list of HadithRecord, each with its isnad chain and matn.
+        """
+        return list(self.iter_hadiths_with_isnad())
 
     def close(self):
         # Close the connection when done
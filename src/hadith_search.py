@@ -0,0 +1,60 @@
+import re
+from typing import NamedTuple
+
+from hadith import TASHKEEL_TABLE
+
+# The remove_tashkeel table, plus letters whose spelling varies between
+# sources folded to one form: alef and hamza seats, ta marbuta, alif maqsura
+SEARCH_FOLD_TABLE = {
+    **TASHKEEL_TABLE,
+    **dict.fromkeys(map(ord, 'أإآٱ'), 'ا'),
+    ord('ؤ'): 'و',
+    ord('ئ'): 'ي',
+    ord('ى'): 'ي',
+    ord('ة'): 'ه',
+    0x0640: None,  # Tatweel
+}
+
+# Columns of the HadithSearch table
+SEARCH_COLUMNS = ('matn', 'comments', 'narrators')
+
+# A search word, optionally ending with * to match it as a prefix
+SEARCH_TERM_REGEX = re.compile(r'(\w+)(\*?)')
+
+
+class SearchResult(NamedTuple):
+    """
+    A hadith matching a search, with its bm25 score (lower is better) and a
+    snippet of the best matching column, matches wrapped in [ and ].
+    """
+    hadith_id: int
+    score: float
+    snippet: str
+
+
+def fold_arabic(text):
+    # Applied to both the indexed text and the queries
+    return text.translate(SEARCH_FOLD_TABLE) if text else text
+
+
+def build_match_query(query, columns=None, phrase=False):
+    """
+    Turn free text into an FTS5 MATCH expression requiring every word, or
+    the words in order if phrase is set. Returns None if it has no words.
+    Words are quoted so FTS5 operators in the text are searched for literally.
+    """
+    terms = SEARCH_TERM_REGEX.findall(fold_arabic(query))
+    if not terms:
+        return None
+
+    if phrase:
+        match = '"{}"{}'.format(' '.join(word for word, _ in terms), terms[-1][1])
+    else:
+        match = ' '.join(f'"{word}"{star}' for word, star in terms)
+
+    if columns:
+        unknown = set(columns) - set(SEARCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown search columns {sorted(unknown)}")
+        match = f"{{{' '.join(columns)}}} : ({match})"
+    return match
@@ -1,10 +1,42 @@
 import json
+from collections import OrderedDict
+from itertools import groupby, islice
+from operator import attrgetter
+
 from hadith_database import HadithDatabase
-from generate_html import generate_html
+from generate_html import OUTPUT_PATH, generate_html
+from graph_export import export_narrator_graph
+from graph_snapshot import SNAPSHOT_PATH, GraphSnapshot
+from layout import LayoutCache
+from narrator_graph import link_co_narrators
+from records import Edge, HadithRecord, NarratorLink, Node, NotFound, elements_to_json
+from render_cache import RenderCache
+from subgraph import SubgraphExtractor
+from tree_chunks import CHUNK_SIZE, write_tree_chunks
+
+# Narrator and matn nodes iter_tree_elements remembers having yielded. One last
+# seen longer ago is yielded again with the same node id, so memory stays bounded
+MAX_SEEN_NARRATORS = 100000
+MAX_SEEN_MATNS = 100000
+
+# Hadiths read per matn cluster lookup when variant matns are merged
+MATN_CLUSTER_BATCH = 5000
 
 class HadithTree:
-    def __init__(self, db_name='data/hadith.db'):
-        self.db = HadithDatabase(db_name)
+    def __init__(self, db_name='data/hadith.db', profile="serving", render_cache_dir=None, snapshot_path=None):
+        # Read-only by default so trees can be built while an ingest is running
+        self.db = HadithDatabase(db_name, profile=profile)
+        self.snapshot_path = snapshot_path  # Whole-corpus trees read a current GraphSnapshot here instead
+        self.subgraph = SubgraphExtractor(self.db, self)
+        self.layout_cache = LayoutCache()
+
+        # With a render cache, unchanged views are served from their earlier HTML file
+        self.render_cache = None
+        self.render_keys = {}  # (view, hadith ids, colors) -> render cache key
+        self.render_keys_version = None
+        if render_cache_dir is not None:
+            self.render_cache = RenderCache(render_cache_dir)
+            self.db.ingest_listeners.append(self.invalidate_render_cache)
 
     def fetch_all_hadiths(self):
         """
@@ -16,106 +48,232 @@ class HadithTree:
         matn_list = []
 
         for hadith_data in hadiths:
-            isnad_chain = hadith_data["isnad"]  # Extract isnad
-            matn = hadith_data["matn"]  # Extract matn
+            isnad_chain = hadith_data.isnad  # Extract isnad
+            matn = hadith_data.matn  # Extract matn
             hadith_list.append(isnad_chain)
             matn_list.append(matn)
 
         return hadith_list, matn_list
 
-    def build_hadith_tree_for_multiple_hadiths(self, hadith_list, matn_list):
+    def group_by_position(self, isnad, group_co_narrators=False):
+        """
+        Return the isnad as a list of narrator lists in ascending position_in_chain.
+        With group_co_narrators, co-narrators at one position are merged into a
+        single narrator so the tree gets one grouped node per position.
+        """
+        isnad_sorted = sorted(isnad, key=lambda x: x.position_in_chain)
+        positions = [list(narrators) for _, narrators in groupby(isnad_sorted, key=attrgetter("position_in_chain"))]
+
+        if group_co_narrators:
+            positions = [[self.merge_co_narrators(narrators)] for narrators in positions]
+        return positions
+
+    def merge_co_narrators(self, narrators):
+        if len(narrators) == 1:
+            return narrators[0]
+
+        # Keep the geography only if all co-narrators share it
+        geographies = {narrator.geography for narrator in narrators}
+        geography = geographies.pop() if len(geographies) == 1 else None
+        name = " و ".join(narrator.name for narrator in narrators)
+        return NarratorLink(name, geography, narrators[0].position_in_chain)
+
+    def build_hadith_tree_for_multiple_hadiths(self, hadiths, matn_list=None, group_co_narrators=False, matn_clusters=None):
         """
         Build a hierarchical tree for multiple hadiths, ensuring shared narrators
         (except for the last child node) do not create duplicate nodes.
+        hadiths is consumed incrementally and can be the iterator returned by
+        HadithDatabase.iter_hadiths_with_isnad. The older form taking a list of
+        isnads and a matching list of matns is still accepted.
+        Co-narrators are linked as in HadithDatabase, so each hadith adds edges
+        linear in its chain length, or they can be grouped into one node.
+        matn_clusters optionally maps hadith ids to matn cluster ids, so variant
+        wordings of a matn share one matn node.
+        Returns a list of Node and Edge records.
         """
-        nodes = []
+        nodes = {}  # Node id -> node, as iter_tree_elements may yield a narrator again
         edges = []
-        seen_narrators = {}  # To track narrators that have already been added (except last child)
-
-        for hadith_id, isnad in enumerate(hadith_list):
-            matn = matn_list[hadith_id]
-
-            # Sort isnad by position_in_chain in ascending order
-            isnad_sorted = sorted(isnad, key=lambda x: x["position_in_chain"], reverse=True)  # Reverse order to treat position 0 as the child
-
-            last_narrator = None  # Track the last narrator to connect it to the matn
-            for idx, narrator in enumerate(isnad_sorted):
-                narrator_name = narrator["name"]
-                narrator_position = narrator["position_in_chain"]
-
-                # Only the last child node should be duplicated
-                if narrator_name not in seen_narrators or narrator_position == 0:  # Allow duplication only for the last child node
-                    node_id = f"n{narrator_name}_{narrator_position}_{hadith_id}" if narrator_position == 0 else f"n{narrator_name}"
-                    
-                    node = {
-                        "data": {
-                            "id": node_id,
-                            "label": narrator_name,
-                            "geography": narrator["geography"]
-                        }
-                    }
-                    nodes.append(node)
-                    
-                    # Only add the narrator to seen_narrators if it's not the last child node
-                    if narrator_position != 0:  # Do not track the last child node to allow multiple instances
-                        seen_narrators[narrator_name] = node_id
+        for element in self.iter_tree_elements(hadiths, matn_list, group_co_narrators, matn_clusters):
+            if isinstance(element, Node):
+                nodes.setdefault(element.id, element)
+            else:
+                edges.append(element)
+        return list(nodes.values()) + edges
+
+    def iter_tree_elements(self, hadiths, matn_list=None, group_co_narrators=False, matn_clusters=None):
+        """
+        Yield the Node and Edge records of build_hadith_tree_for_multiple_hadiths
+        as each hadith is read, every node before the edges that use it, so
+        large trees can be written out without holding them in memory. Only
+        the last MAX_SEEN_NARRATORS narrators and MAX_SEEN_MATNS matn clusters
+        are remembered, so a node can be yielded more than once, always with
+        the same node id.
+        """
+        seen_narrators = OrderedDict()  # Recently added narrators (except last child), least recent first
+        seen_matns = OrderedDict()  # Recently added matn nodes of clusters, least recent first
+
+        if matn_list is not None:
+            hadiths = (HadithRecord(None, matn, isnad) for isnad, matn in zip(hadiths, matn_list))
+
+        for hadith_id, hadith in enumerate(hadiths):
+            matn = hadith.matn
+
+            # Walk from the position nearest the source down to the child (position 0)
+            teacher_ids = []
+            for narrators in reversed(self.group_by_position(hadith.isnad, group_co_narrators)):
+                student_ids = []
+                for narrator in narrators:
+                    narrator_name = narrator.name
+                    narrator_position = narrator.position_in_chain
+
+                    # Only the last child node should be duplicated
+                    if narrator_name not in seen_narrators or narrator_position == 0:  # Allow duplication only for the last child node
+                        node_id = f"n{narrator_name}_{narrator_position}_{hadith_id}" if narrator_position == 0 else f"n{narrator_name}"
+
+                        yield Node(node_id, narrator_name, narrator.geography, position_in_chain=narrator_position)
+
+                        # Only add the narrator to seen_narrators if it's not the last child node
+                        if narrator_position != 0:  # Do not track the last child node to allow multiple instances
+                            seen_narrators[narrator_name] = node_id
+                            if len(seen_narrators) > MAX_SEEN_NARRATORS:
+                                seen_narrators.popitem(last=False)
+                    else:
+                        node_id = seen_narrators[narrator_name]
+                        seen_narrators.move_to_end(narrator_name)
+                    student_ids.append(node_id)
+
+                # Add edges from the teachers at the previous level to these narrators
+                for teacher, student in link_co_narrators(teacher_ids, student_ids):
+                    yield Edge(teacher, student)
+                teacher_ids = student_ids
+
+            # Add the matn node, once per cluster of variants
+            if matn_clusters is not None and hadith.id in matn_clusters:
+                matn_node_id = f"matn_c{matn_clusters[hadith.id]}"
+                if matn_node_id not in seen_matns:
+                    yield Node(matn_node_id, matn, is_matn=True)
+                    seen_matns[matn_node_id] = None
+                    if len(seen_matns) > MAX_SEEN_MATNS:
+                        seen_matns.popitem(last=False)
                 else:
-                    node_id = seen_narrators[narrator_name]
-
-                # Add edge from the previous node to the current node
-                if last_narrator:
-                    edges.append({
-                        "data": {
-                            "source": last_narrator,
-                            "target": node_id
-                        }
-                    })
-
-                # Update the last narrator
-                last_narrator = node_id
-
-            # Add the matn node
-            matn_node_id = f"matn_{hadith_id}"
-            matn_node = {
-                "data": {
-                    "id": matn_node_id,
-                    "label": matn,
-                    "isMatn": True
-                }
-            }
-            nodes.append(matn_node)
-
-            # Connect the matn to the last child narrator
-            edges.append({
-                "data": {
-                    "source": last_narrator,  # Last child node is the source
-                    "target": matn_node_id  # Matn is the target
-                }
-            })
+                    seen_matns.move_to_end(matn_node_id)
+            else:
+                matn_node_id = f"matn_{hadith_id}"
+                yield Node(matn_node_id, matn, is_matn=True)
 
-        return nodes + edges
+            # Connect the matn to the last child narrators (the source)
+            for node_id in teacher_ids:
+                yield Edge(node_id, matn_node_id)
 
-    def generate_tree_from_database(self, geography_colors):
+    def generate_tree_from_database(self, geography_colors, group_co_narrators=False, merge_variant_matns=False):
         """
         Fetch all hadiths from the database, build the hierarchical tree, and generate the HTML file.
+        With merge_variant_matns, variant wordings of a matn share one matn node.
+        Returns the path of the HTML file.
         """
-        # Fetch all hadiths and isnads from the database
-        hadith_list, matn_list = self.fetch_all_hadiths()
-
-        # Build the tree with all the hadiths
-        tree_data = self.build_hadith_tree_for_multiple_hadiths(hadith_list, matn_list)
+        # Stream hadiths from the database straight into the tree
+        def build():
+            hadiths, matn_clusters = self.iter_hadiths(merge_variant_matns)
+            return self.build_hadith_tree_for_multiple_hadiths(
+                hadiths, group_co_narrators=group_co_narrators, matn_clusters=matn_clusters
+            )
 
         # Pass the tree data to the generate_html function
-        generate_html(json.dumps(tree_data, ensure_ascii=False), geography_colors)
+        view = ("corpus", group_co_narrators, merge_variant_matns)
+        return self.cached_render(view, None, geography_colors, build)
+
+    def generate_chunked_tree_from_database(self, geography_colors, output_dir='hadith_tree_chunks', group_co_narrators=False,
+                                            merge_variant_matns=False, chunk_size=CHUNK_SIZE):
+        """
+        Like generate_tree_from_database, but stream the tree into chunk files
+        and a lazy-loading viewer in output_dir (see tree_chunks), for corpora
+        too large for one HTML file. Returns the path of the viewer.
+        """
+        hadiths, matn_clusters = self.iter_hadiths(merge_variant_matns)
+        elements = self.iter_tree_elements(hadiths, group_co_narrators=group_co_narrators, matn_clusters=matn_clusters)
+        return write_tree_chunks(elements, geography_colors, output_dir, chunk_size)
+
+    def iter_hadiths(self, merge_variant_matns=False):
+        """
+        Return (hadiths, matn_clusters) to pass to iter_tree_elements for the
+        whole corpus. With merge_variant_matns, matn_clusters holds the cluster
+        ids of the MATN_CLUSTER_BATCH hadiths being read, looked up as each
+        batch is read, so the clusters of the whole corpus are never loaded.
+        """
+        hadiths = self.iter_corpus()
+        if not merge_variant_matns:
+            return hadiths, None
+
+        matn_clusters = {}
+
+        def batches():
+            for batch in iter(lambda: list(islice(hadiths, MATN_CLUSTER_BATCH)), []):
+                matn_clusters.clear()
+                matn_clusters.update(self.db.get_matn_cluster_ids(hadith.id for hadith in batch))
+                yield from batch
+
+        return batches(), matn_clusters
+
+    def iter_corpus(self):
+        """
+        Yield the HadithRecord of every hadith from the snapshot at
+        snapshot_path if it was written from the current data, and from the
+        database otherwise.
+        """
+        try:
+            snapshot = GraphSnapshot(self.snapshot_path, db=self.db) if self.snapshot_path else None
+        except (OSError, ValueError):
+            snapshot = None  # Missing, of an older format or stale
+        if snapshot is None:
+            yield from self.db.iter_hadiths_with_isnad()
+            return
+
+        try:
+            yield from snapshot.iter_hadiths()
+        finally:
+            snapshot.close()
+
+    def build_cluster_trees(self, min_size=2, group_co_narrators=False):
+        """
+        Yield (cluster id, elements) with the combined tree of each cluster of
+        variant matns, largest clusters first.
+        """
+        clusters = self.db.get_matn_clusters(min_size)
+        for cluster_id in sorted(clusters, key=lambda cluster_id: (-len(clusters[cluster_id]), cluster_id)):
+            hadith_ids = clusters[cluster_id]
+            matn_clusters = dict.fromkeys(hadith_ids, cluster_id)
+            elements = self.build_hadith_tree_for_multiple_hadiths(
+                self.db.iter_hadiths_with_isnad(hadith_ids), group_co_narrators=group_co_narrators, matn_clusters=matn_clusters
+            )
+            yield cluster_id, elements
+
+    def generate_cluster_tree_html(self, hadith_id, geography_colors, group_co_narrators=False):
+        """
+        Generate the Cytoscape.js HTML visualization for the cluster of variant
+        matns the given hadith belongs to. Returns the path of the HTML file.
+        """
+        hadith_ids = self.db.get_matn_cluster(hadith_id)
+        if not hadith_ids:
+            raise NotFound(f"No hadith found for id {hadith_id}")
+
+        matn_clusters = dict.fromkeys(hadith_ids, hadith_ids[0])
+
+        def build():
+            return self.build_hadith_tree_for_multiple_hadiths(
+                self.db.iter_hadiths_with_isnad(hadith_ids), group_co_narrators=group_co_narrators, matn_clusters=matn_clusters
+            )
 
-    def fetch_hadith_tree_data(self, hadith_id):
+        view = ("cluster", group_co_narrators)
+        return self.cached_render(view, hadith_ids, geography_colors, build)
+
+    def fetch_hadith_tree_data(self, hadith_id, group_co_narrators=False):
         """
-        Query the hadith and isnad from the database and format it into a Cytoscape.js compatible JSON structure.
+        Query the hadith and isnad from the database and build its tree of Node and Edge records.
         """
         hadith_data = self.db.get_hadith_with_isnad(hadith_id)
 
         if not hadith_data:
-            raise ValueError(f"No hadith found for id {hadith_id}")
+            raise NotFound(f"No hadith found for id {hadith_id}")
 
         # Extract matn and comment from the first row
         matn = hadith_data[0][0]
@@ -126,95 +284,124 @@ class HadithTree:
             narrator_name = row[2]  # Narrator's name
             geography = row[3]  # Narrator's geography
             position = row[4]  # Position in the isnad chain
-            isnad.append({"name": narrator_name, "geography": geography, "position_in_chain": position})
+            isnad.append(NarratorLink(narrator_name, geography, position))
 
         # Build a hierarchical structure where the root is the last narrator
-        tree_data = self.build_hadith_tree(isnad, matn)
+        tree_data = self.build_hadith_tree(isnad, matn, group_co_narrators)
         return tree_data
 
-    def build_hadith_tree(self, isnad, matn):
+    def build_hadith_tree(self, isnad, matn, group_co_narrators=False):
         """
-        Build a hierarchical tree compatible with Cytoscape.js, starting with the child node (position = 0).
+        Build a hierarchical tree of Node and Edge records, starting with the child node (position = 0).
         Each node represents a narrator, and edges represent the isnad chain.
+        Co-narrators are linked as in HadithDatabase, or grouped into one node.
         """
         nodes = []
         edges = []
 
-        # Sort isnad by position_in_chain in ascending order
-        isnad_sorted = sorted(isnad, key=lambda x: x["position_in_chain"])
-
-        # Group narrators by their position in the isnad
-        isnad_by_position = {}
-        for idx, narrator in enumerate(isnad_sorted):
-            position = narrator['position_in_chain']
-            if position not in isnad_by_position:
-                isnad_by_position[position] = []
-            isnad_by_position[position].append({
-                "id": f"n{idx}",
-                "name": narrator["name"],
-                "geography": narrator["geography"]
-            })
+        # Group narrator nodes by their position in the isnad, in ascending order
+        isnad_by_position = []
+        idx = 0
+        for narrators in self.group_by_position(isnad, group_co_narrators):
+            isnad_by_position.append([])
+            for narrator in narrators:
+                isnad_by_position[-1].append(Node(f"n{idx}", narrator.name, narrator.geography, position_in_chain=narrator.position_in_chain))
+                idx += 1
 
         # Create nodes for each narrator, starting from the child
-        for position, narrators in isnad_by_position.items():
-            for narrator in narrators:
-                node = {
-                    "data": {
-                        "id": narrator["id"],
-                        "label": narrator["name"],
-                        "geography": narrator["geography"]
-                    }
-                }
-                nodes.append(node)
-
-        # Add edges between nodes at different levels
-        positions_sorted = sorted(isnad_by_position.keys())
-        for i in range(1, len(positions_sorted)):
-            current_position = positions_sorted[i]
-            previous_position = positions_sorted[i - 1]
-
-            # Connect all narrators at the current level to the previous level (parent node)
-            for current_narrator in isnad_by_position[current_position]:
-                for previous_narrator in isnad_by_position[previous_position]:
-                    edges.append({
-                        "data": {
-                            "source": current_narrator["id"],
-                            "target": previous_narrator["id"]
-                        }
-                    })
+        for narrators in isnad_by_position:
+            nodes.extend(narrators)
+
+        # Add edges from each narrator to the narrators at the previous level who heard from them
+        for i in range(1, len(isnad_by_position)):
+            current_ids = [narrator.id for narrator in isnad_by_position[i]]
+            previous_ids = [narrator.id for narrator in isnad_by_position[i - 1]]
+            edges.extend(Edge(source, target) for source, target in link_co_narrators(current_ids, previous_ids))
 
         # Add a node for the matn (place it visually below the last child)
-        matn_node = {
-            "data": {
-                "id": "matn",
-                "label": matn,
-                "isMatn": True
-            }
-        }
-        nodes.append(matn_node)
+        nodes.append(Node("matn", matn, is_matn=True))
 
         # Connect the matn to the last position's narrators
-        last_position = positions_sorted[0]  # The child node(s) at the lowest position
-        for narrator in isnad_by_position[last_position]:
-            edges.append({
-                "data": {
-                    "source": narrator["id"],
-                    "target": "matn"
-                }
-            })
-
-        # Return the combined nodes and edges for Cytoscape.js
+        for narrator in isnad_by_position[0]:  # The child node(s) at the lowest position
+            edges.append(Edge(narrator.id, "matn"))
+
+        # Return the combined nodes and edges
         return nodes + edges
 
-    def generate_tree_html(self, hadith_id, geography_colors):
+    def generate_tree_html(self, hadith_id, geography_colors, group_co_narrators=False):
         """
         Generate the Cytoscape.js HTML visualization for the given hadith_id.
+        Returns the path of the HTML file.
         """
-        tree_data = self.fetch_hadith_tree_data(hadith_id)
-        tree_data_json = json.dumps(tree_data, ensure_ascii=False)  # Convert to JSON
+        def build():
+            return self.fetch_hadith_tree_data(hadith_id, group_co_narrators)
 
         # Call the generate_html function to create the HTML file
-        generate_html(tree_data_json, geography_colors)
+        return self.cached_render(("hadith", group_co_narrators), [hadith_id], geography_colors, build)
+
+    def generate_subgraph_html(self, elements, geography_colors):
+        """
+        Generate the Cytoscape.js HTML visualization for elements extracted with
+        self.subgraph, for example self.subgraph.around_narrator(name, up=2, down=1).
+        Returns the path of the HTML file.
+        """
+        return self.render_html(elements, geography_colors)
+
+    def render_html(self, elements, geography_colors, output_path=OUTPUT_PATH):
+        """
+        Lay out the elements (cached by graph hash) and generate the HTML file,
+        which then only has to paint the precomputed positions.
+        """
+        positions = self.layout_cache.positions(elements)
+        generate_html(elements_to_json(elements, positions), geography_colors, output_path)
+        return output_path
+
+    def cached_render(self, view, hadith_ids, geography_colors, build):
+        """
+        Return the path of the HTML file for a view of hadith_ids (None for
+        the whole corpus). build() makes the tree, and is only called if the
+        render cache has no file for the current data of those hadiths.
+        """
+        if self.render_cache is None:
+            return self.render_html(build(), geography_colors)
+
+        key = self.render_key(view, hadith_ids, geography_colors)
+        path = self.render_cache.get(key)
+        if path is None:
+            elements = build()
+            path = self.render_cache.put(
+                key, hadith_ids, lambda output_path: self.render_html(elements, geography_colors, output_path)
+            )
+        return path
+
+    def render_key(self, view, hadith_ids, geography_colors):
+        """
+        Render cache key of a view, from the content hashes stored at ingest.
+        Keys are remembered until an ingest on this connection, or a commit by
+        any other (PRAGMA data_version), so an unchanged view reads nothing.
+        The matn clusters of a view follow from its hadiths and are not hashed.
+        """
+        version = self.db.get_data_version()
+        if version != self.render_keys_version:
+            self.render_keys.clear()
+            self.render_keys_version = version
+
+        spec = json.dumps([view, sorted(hadith_ids) if hadith_ids is not None else None, geography_colors], sort_keys=True)
+        if spec not in self.render_keys:
+            self.render_keys[spec] = self.render_cache.key(view, self.db.get_content_hashes(hadith_ids), geography_colors)
+        return self.render_keys[spec]
+
+    def invalidate_render_cache(self, hadith_ids=None):
+        # Called by this connection's ingests, which do not change its data_version
+        self.render_keys.clear()
+        self.render_cache.invalidate(hadith_ids)
+
+    def export_narrator_graph(self, path, file_format):
+        """
+        Write the narrator transmission graph for network analysis tools, as
+        graphml, gexf, dot, csv or parquet (see graph_export).
+        """
+        export_narrator_graph(self.db, path, file_format)
 
     def close(self):
         """
@@ -224,8 +411,8 @@ class HadithTree:
 
 
 if __name__ == "__main__":
-    # Initialize the HadithTree
-    hadith_tree = HadithTree()
+    # Initialize the HadithTree, reading the corpus from the snapshot main.py writes
+    hadith_tree = HadithTree(snapshot_path=SNAPSHOT_PATH)
 
     # Define geography colors for visualization
     geography_colors = {
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+
+from records import Edge, Node
+
+# Distances in pixels, multiples of the 50px grid the nodes used to be snapped to
+GRID_SIZE = 50
+NODE_SPACING = 4  # Grid cells between node centres in a rank: 150px nodes and a 50px gap
+RANK_SPACING = 2  # Grid cells between ranks: 40px nodes and a 60px gap
+NODE_HEIGHT = 40
+SWEEPS = 4
+
+
+def matn_height(label):
+    # Same estimate as the matn node style in generate_html: 30 characters per 20px line, plus 20%
+    return 20 * math.ceil(len(label) / 30) * 1.2
+
+
+def graph_hash(elements):
+    """
+    Hash of a list of Node and Edge records, identifying its layout.
+    """
+    return hashlib.sha256(json.dumps(elements, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def assign_ranks(nodes, students):
+    """
+    Return {node id: level}, with matn nodes at level 0 and the sources at the
+    top. A narrator's level is its position_in_chain + 1, raised where needed
+    so every node is above its students. Nodes on a cycle (a name repeated
+    in one chain) are placed above whichever students were placed first.
+    """
+    levels = {}
+    remaining = {node.id: len(students[node.id]) for node in nodes}
+    teachers = {node.id: [] for node in nodes}
+    for node_id, node_students in students.items():
+        for student in node_students:
+            teachers[student].append(node_id)
+
+    minimum = {
+        node.id: 0 if node.is_matn or node.position_in_chain is None else node.position_in_chain + 1
+        for node in nodes
+    }
+    queue = [node.id for node in nodes if remaining[node.id] == 0]
+    order = [node.id for node in nodes]
+    while len(levels) < len(nodes):
+        if not queue:
+            # Break a cycle at the first node that is left
+            queue.append(next(node_id for node_id in order if node_id not in levels))
+
+        node_id = queue.pop()
+        if node_id in levels:
+            continue
+        levels[node_id] = max([minimum[node_id]] + [levels[student] + 1 for student in students[node_id] if student in levels])
+
+        for teacher in teachers[node_id]:
+            remaining[teacher] -= 1
+            if remaining[teacher] == 0:
+                queue.append(teacher)
+    return levels
+
+
+def layered_layout(elements, top_level=None):
+    """
+    Compute a top-down layered (Sugiyama-style) layout of a tree of Node and
+    Edge records. Nodes are ranked by position_in_chain, edges spanning
+    several ranks get virtual nodes, the order within each rank is improved
+    with barycenter sweeps to reduce crossings, and nodes are then placed
+    near the average of their neighbours. Returns {node id: (x, y)} in
+    pixels, on a 50px grid. The highest level is drawn at y = 0, or top_level
+    is, so parts of a tree laid out separately can share their ranks.
+    """
+    nodes = [element for element in elements if isinstance(element, Node)]
+    node_ids = {node.id for node in nodes}
+    students = {node.id: {} for node in nodes}  # Dicts drop the edges repeated by several hadiths
+    for element in elements:
+        if isinstance(element, Edge) and element.source in node_ids and element.target in node_ids:
+            students[element.source][element.target] = None
+
+    levels = assign_ranks(nodes, students)
+    top = max(levels.values(), default=0)
+    first_row = top_level - top if top_level is not None else 0
+
+    # Ranks from the top, with virtual nodes where an edge skips ranks
+    ranks = [[] for _ in range(top + 1)]
+    for node in nodes:
+        ranks[top - levels[node.id]].append(node.id)
+
+    upper = {node_id: [] for node_id in node_ids}
+    lower = {node_id: [] for node_id in node_ids}
+    virtual = 0
+    for source, targets in students.items():
+        for target in targets:
+            previous = source
+            for rank in range(top - levels[source] + 1, top - levels[target]):
+                virtual += 1
+                ranks[rank].append(virtual)
+                upper[virtual], lower[virtual] = [previous], []
+                lower[previous].append(virtual)
+                previous = virtual
+            if levels[target] < levels[source]:
+                lower[previous].append(target)
+                upper[target].append(previous)
+
+    # Order each rank by the barycenter of its neighbours, sweeping down then up
+    index = {}
+    for rank in ranks:
+        index.update((node_id, i) for i, node_id in enumerate(rank))
+
+    def reorder(rank, neighbours):
+        def barycenter(node_id):
+            adjacent = neighbours[node_id]
+            return sum(index[other] for other in adjacent) / len(adjacent) if adjacent else index[node_id]
+
+        rank.sort(key=barycenter)
+        index.update((node_id, i) for i, node_id in enumerate(rank))
+
+    for _ in range(SWEEPS):
+        for rank in ranks[1:]:
+            reorder(rank, upper)
+        for rank in reversed(ranks[:-1]):
+            reorder(rank, lower)
+
+    # Place nodes in grid cells near their neighbours, keeping the order and spacing
+    x = {node_id: i * NODE_SPACING for rank in ranks for i, node_id in enumerate(rank)}
+
+    def place(rank, neighbours):
+        desired = [
+            round(sum(x[other] for other in neighbours[node_id]) / len(neighbours[node_id]))
+            if neighbours[node_id] else x[node_id]
+            for node_id in rank
+        ]
+        placed = []
+        for wanted in desired:
+            placed.append(wanted if not placed else max(wanted, placed[-1] + NODE_SPACING))
+
+        # Shift the rank back so it is balanced around where its nodes want to be
+        shift = round(sum(wanted - position for wanted, position in zip(desired, placed)) / len(rank)) if rank else 0
+        for node_id, position in zip(rank, placed):
+            x[node_id] = position + shift
+
+    for _ in range(SWEEPS):
+        for rank in ranks[1:]:
+            place(rank, upper)
+        for rank in reversed(ranks[:-1]):
+            place(rank, lower)
+
+    positions = {}
+    heights = {node.id: matn_height(node.label) if node.is_matn else NODE_HEIGHT for node in nodes}
+    for row, rank in enumerate(ranks):
+        for node_id in rank:
+            if node_id in node_ids:
+                # Tall matn boxes hang down from their rank instead of overlapping the one above
+                y = (first_row + row) * RANK_SPACING * GRID_SIZE + (heights[node_id] - NODE_HEIGHT) / 2
+                positions[node_id] = (x[node_id] * GRID_SIZE, y)
+    return positions
+
+
+class LayoutCache:
+    """
+    Layouts keyed by graph_hash, so a tree is only laid out once. The most
+    recent max_entries layouts are kept in memory, and every layout is also
+    written to cache_dir if one is given.
+    """
+    def __init__(self, cache_dir=None, max_entries=64):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.layouts = OrderedDict()  # graph hash -> {node id: (x, y)}
+
+    def positions(self, elements):
+        key = graph_hash(elements)
+        if key in self.layouts:
+            self.layouts.move_to_end(key)
+            return self.layouts[key]
+
+        path = os.path.join(self.cache_dir, f"{key}.json") if self.cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                positions = {node_id: tuple(position) for node_id, position in json.load(f).items()}
+        else:
+            positions = layered_layout(elements)
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(positions, f, ensure_ascii=False)
+
+        self.layouts[key] = positions
+        if len(self.layouts) > self.max_entries:
+            self.layouts.popitem(last=False)
+        return positions
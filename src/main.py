@@ -1,34 +1,153 @@
+import argparse
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
 from hadith import Hadith
+from graph_snapshot import SNAPSHOT_PATH, snapshot_is_current, write_snapshot
 from hadith_database import HadithDatabase
 
+HADITH_DIR = os.path.join(os.path.dirname(__file__), '..', 'hadiths')
+
+# Hadiths written and committed together with their manifest entries when syncing
+COMMIT_EVERY = 1000
+
 def load_hadith_from_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         return file.read()
 
-def generate_hadiths():
-    hadith_dir = os.path.join(os.path.dirname(__file__), '..', 'hadiths')
-    hadith_paths =  sorted(os.listdir(hadith_dir), key=lambda x: int(re.search(r'\d+', x).group()))
+def list_hadith_files(hadith_dir=HADITH_DIR):
+    # Sort by hadith number, then by name so variants like 5a/5b keep a stable order
+    hadith_paths = [path for path in os.listdir(hadith_dir) if path.endswith('.txt')]
+    return sorted(hadith_paths, key=lambda x: (int(re.search(r'\d+', x).group()), x))
+
+def parse_hadith_file(hadith_dir, hadith_path):
+    # Runs in worker processes, so it must stay a module-level function
+    file_path = os.path.join(hadith_dir, hadith_path)
+    hadith_text = load_hadith_from_file(file_path)
+    return Hadith(hadith_text, hadith_path)
+
+def iter_hadiths(hadith_dir=HADITH_DIR, workers=1, chunksize=16, hadith_paths=None):
+    """
+    Yield parsed hadiths in file order. With more than one worker, files are
+    parsed in a process pool and results are streamed back in order, so a
+    single database writer can consume them while parsing continues.
+    """
+    if hadith_paths is None:
+        hadith_paths = list_hadith_files(hadith_dir)
+
+    if workers <= 1:
+        for hadith_path in hadith_paths:
+            yield parse_hadith_file(hadith_dir, hadith_path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(parse_hadith_file, [hadith_dir] * len(hadith_paths), hadith_paths, chunksize=chunksize)
+
+def generate_hadiths(workers=1):
+    return list(iter_hadiths(workers=workers))
+
+def sync_hadiths(db, hadith_dir=HADITH_DIR, workers=1, commit_every=COMMIT_EVERY):
+    """
+    Bring the database in line with the hadiths directory. Only new or changed
+    files are parsed and upserted, keeping their hadith IDs, and hadiths whose
+    file was removed are deleted, including hadiths inserted before the
+    manifest existed. New and changed hadiths are committed every
+    commit_every files along with their manifest entries, so an interrupted
+    sync picks up where it stopped. Returns (added, updated, removed) counts.
+    """
+    manifest = db.get_hadith_files()
+    unmanaged = db.get_unmanaged_hadiths()
+    next_hadith_id = db.next_row_id('Hadiths')
+
+    pending_paths = []
+    pending_ids = []
+    pending_rows = []
+    refreshed_rows = []
+    stale_ids = []
+    added = updated = 0
+
+    for hadith_path in list_hadith_files(hadith_dir):
+        file_path = os.path.join(hadith_dir, hadith_path)
+        stat = os.stat(file_path)
+        stored = manifest.pop(hadith_path, None)
 
-    hadiths = []
-    for hadith_path in hadith_paths:
-        if hadith_path.endswith('.txt'):
-            file_path = os.path.join(hadith_dir, hadith_path)
-            hadith_text = load_hadith_from_file(file_path)
-            hadith = Hadith(hadith_text, hadith_path)
-            hadiths.append(hadith)
+        # Unchanged size and mtime means the file was not touched
+        if stored and stored[:2] == (stat.st_mtime_ns, stat.st_size):
+            continue
 
-    return hadiths
+        hash_value = db.compute_file_hash(file_path)
+        if stored and stored[2] == hash_value:
+            # Touched but identical, only refresh the manifest entry
+            refreshed_rows.append((hadith_path, stat.st_mtime_ns, stat.st_size, hash_value, stored[3]))
+            continue
+
+        if stored:
+            hadith_id = stored[3]
+            stale_ids.append(hadith_id)
+            updated += 1
+        elif unmanaged.get(hadith_path):
+            # Adopt a hadith inserted before the manifest existed and drop its duplicates
+            hadith_id = unmanaged[hadith_path][0]
+            stale_ids.extend(unmanaged.pop(hadith_path))
+            updated += 1
+        else:
+            hadith_id = next_hadith_id
+            next_hadith_id += 1
+            added += 1
+
+        pending_paths.append(hadith_path)
+        pending_ids.append(hadith_id)
+        pending_rows.append((hadith_path, stat.st_mtime_ns, stat.st_size, hash_value, hadith_id))
+
+    # Whatever is left in the manifest no longer exists on disk, and neither
+    # does the file of an unmanaged hadith that was not adopted. Hadiths
+    # inserted without a file path did not come from the directory.
+    removed_ids = [stored[3] for stored in manifest.values()]
+    removed_ids.extend(hadith_id for file_path, hadith_ids in unmanaged.items() if file_path for hadith_id in hadith_ids)
+    # Hadiths are replaced under the same id while their manifest rows still
+    # refer to them, so foreign keys are checked when each batch commits
+    db.defer_foreign_keys()
+    db.delete_hadiths(stale_ids + removed_ids)
+    db.delete_hadith_files(list(manifest))
+    db.store_hadith_files(refreshed_rows)
+
+    # insert_hadiths commits each batch with its manifest entries, the first
+    # one together with the deletions
+    hadiths = iter_hadiths(hadith_dir, workers=workers, hadith_paths=pending_paths)
+    for start in range(0, max(len(pending_paths), 1), commit_every):
+        db.defer_foreign_keys()
+        db.store_hadith_files(pending_rows[start:start + commit_every])
+        db.insert_hadiths(islice(hadiths, commit_every), hadith_ids=pending_ids[start:start + commit_every])
+    hadiths.close()  # Shuts the process pool down
+
+    return added, updated, len(removed_ids)
 
 if __name__ == "__main__":
-    # Directory containing the hadith text files
-    hadiths = generate_hadiths()
-    db = HadithDatabase()
+    parser = argparse.ArgumentParser(description="Load the hadiths directory into the database.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to parse hadith files")
+    parser.add_argument("--profile", default="ingest",
+                        help="Connection profile: ingest (WAL, trees can be read meanwhile), default or bulk-load")
+    parser.add_argument("--commit-every", type=int, default=COMMIT_EVERY, help="Hadith files written per transaction")
+    args = parser.parse_args()
+
+    db = HadithDatabase(profile=args.profile)
 
     # Read narrators from the CSV file
-    db.read_narrators_from_csv()
-    for hadith in hadiths:
-        db.insert_hadith(hadith)
+    narrator_changes = db.read_narrators_from_csv()
+
+    # Parse and write only the hadith text files that changed since the last run
+    added, updated, removed = sync_hadiths(db, workers=args.workers, commit_every=args.commit_every)
+    print(f"Hadiths added: {added}, updated: {updated}, removed: {removed}")
+
+    # Analysis and rendering processes map the snapshot instead of querying the database
+    if narrator_changes or added or updated or removed or not snapshot_is_current(db):
+        write_snapshot(db)
+        print(f"Snapshot written to {SNAPSHOT_PATH}")
+
+    # Names that could not be linked are queued instead of printed
+    pending = db.get_narrator_reviews()
+    if pending:
+        print(f"Narrator names pending review: {len(pending)} (see the NarratorReviews table)")
 
@@ -0,0 +1,97 @@
+import re
+from array import array
+from hashlib import blake2b
+from zlib import crc32
+
+from hadith import remove_tashkeel
+
+SHINGLE_SIZE = 4
+BANDS = 20
+ROWS_PER_BAND = 3
+NUM_HASHES = BANDS * ROWS_PER_BAND
+
+# Two matns whose estimated Jaccard similarity reaches this are variants. With
+# 20 bands of 3 rows, pairs at 0.5 share a bucket about 93% of the time and
+# pairs at 0.2 about 15% of the time.
+SIMILARITY_THRESHOLD = 0.5
+
+# Matns read from each LSH bucket when looking for the clusters of a new matn
+MAX_BUCKET_CANDIDATES = 20
+
+# Odd 32-bit constant (from the golden ratio) for multiplicative hashing
+SHINGLE_HASH_MULTIPLIER = 0x9E3779B1
+
+# Keeps borrowed values of empty bins apart from the values of filled bins
+EMPTY_BIN_OFFSET = 2 ** 32 // NUM_HASHES + 1
+
+NON_LETTERS_REGEX = re.compile(r'[^\w]+|[\d_]+')
+
+
+def normalize_matn(matn):
+    # Matns are compared without tashkeel, punctuation or line breaks
+    return ' '.join(NON_LETTERS_REGEX.sub(' ', remove_tashkeel(matn)).split())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(matn):
+    """
+    Return the MinHash signature of a matn's character shingles as an
+    array('Q'), or None if the matn has no letters. Uses one permutation
+    hashing: each shingle hash is sorted into one of NUM_HASHES bins by its
+    remainder and each bin keeps its smallest quotient, so a matn is hashed in
+    one pass. An empty bin borrows the next non-empty bin's value, offset by
+    the distance, which keeps agreeing bins an estimate of the Jaccard
+    similarity.
+    """
+    bins = [None] * NUM_HASHES
+    for shingle in shingles(normalize_matn(matn)):
+        # CRC-32 is fast, the multiplication spreads similar shingles apart
+        shingle_hash = crc32(shingle.encode()) * SHINGLE_HASH_MULTIPLIER & 0xFFFFFFFF
+        index, value = shingle_hash % NUM_HASHES, shingle_hash // NUM_HASHES
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+
+    filled = [index for index, value in enumerate(bins) if value is not None]
+    if not filled:
+        return None
+
+    signature = array('Q', bytes(8 * NUM_HASHES))
+    for position, index in enumerate(filled):
+        next_index = filled[(position + 1) % len(filled)]
+        signature[index] = bins[index]
+        # Fill the empty bins up to the next filled one
+        empty = (index + 1) % NUM_HASHES
+        while empty != next_index:
+            distance = (next_index - empty) % NUM_HASHES
+            signature[empty] = bins[next_index] + distance * EMPTY_BIN_OFFSET
+            empty = (empty + 1) % NUM_HASHES
+    return signature
+
+
+def band_buckets(signature):
+    """
+    Return the LSH bucket of each band of a signature as signed 64-bit
+    integers. Matns sharing any bucket are candidate variants.
+    """
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'little', signed=True))
+    return buckets
+
+
+def estimated_similarity(signature, other):
+    # The fraction of hashes that agree estimates the Jaccard similarity
+    return sum(a == b for a, b in zip(signature, other)) / NUM_HASHES
+
+
+def signature_from_blob(blob):
+    signature = array('Q')
+    signature.frombytes(blob)
+    return signature
@@ -0,0 +1,120 @@
+from array import array
+
+
+def link_co_narrators(teachers, students):
+    """
+    Yield the (teacher, student) pairs between two adjacent positions of an
+    isnad. A narrator alone at a position is linked to every co-narrator at
+    the other one, as the isnad states. When both positions list co-narrators
+    the isnad does not say who heard whom, so they are paired in order and any
+    extra ones linked to the last narrator of the other position. Those links
+    are a guess that keeps the number of links linear in the chain length,
+    see co_narrators_inferred. Nobody is linked across a position whose
+    names were all left unresolved.
+    """
+    if not teachers or not students:
+        return
+
+    if len(teachers) == 1 or len(students) == 1:
+        for student in students:
+            for teacher in teachers:
+                yield teacher, student
+        return
+
+    for index in range(max(len(teachers), len(students))):
+        yield teachers[min(index, len(teachers) - 1)], students[min(index, len(students) - 1)]
+
+
+def co_narrators_inferred(teachers, students):
+    # Only a lone narrator on either side makes the links explicit in the isnad
+    return len(teachers) > 1 and len(students) > 1
+
+
+def transmission_pairs(isnad):
+    """
+    Yield (teacher_id, student_id, inferred) for a resolved isnad, given as a
+    list of narrator ID lists ordered by position_in_chain. Position 0 is the
+    compiler, so each narrator learned the hadith from the next position.
+    inferred is True for the links link_co_narrators guessed between two
+    groups of co-narrators.
+    """
+    for position in range(len(isnad) - 1):
+        teachers, students = isnad[position + 1], isnad[position]
+        inferred = co_narrators_inferred(teachers, students)
+        for teacher_id, student_id in link_co_narrators(teachers, students):
+            yield teacher_id, student_id, inferred
+
+
+class NarratorGraph:
+    """
+    In-memory adjacency of the narrator transmission graph. Each teacher ->
+    student edge keeps the IDs of the hadiths it was transmitted in, so its
+    multiplicity is the number of supporting hadiths.
+    """
+    def __init__(self):
+        self.students = {}  # teacher id -> {student id: hadith ids}
+        self.teachers = {}  # student id -> {teacher id: hadith ids}
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Build the graph from (teacher_id, student_id, hadith_id) rows
+        graph = cls()
+        for teacher_id, student_id, hadith_id in rows:
+            graph.add_transmission(teacher_id, student_id, hadith_id)
+        return graph
+
+    def add_transmission(self, teacher_id, student_id, hadith_id):
+        # Each (teacher, student, hadith) is added once, as NarratorTransmissions
+        # only holds it once and the database only passes on the rows it inserted
+        hadith_ids = self.students.setdefault(teacher_id, {}).get(student_id)
+        if hadith_ids is None:
+            hadith_ids = array('q')
+            self.students[teacher_id][student_id] = hadith_ids
+            # Both directions share the same array of hadith ids
+            self.teachers.setdefault(student_id, {})[teacher_id] = hadith_ids
+
+        hadith_ids.append(hadith_id)
+
+    def students_of(self, narrator_id):
+        """
+        Return {student id: multiplicity} for a narrator.
+        """
+        return {student_id: len(hadith_ids) for student_id, hadith_ids in self.students.get(narrator_id, {}).items()}
+
+    def teachers_of(self, narrator_id):
+        """
+        Return {teacher id: multiplicity} for a narrator.
+        """
+        return {teacher_id: len(hadith_ids) for teacher_id, hadith_ids in self.teachers.get(narrator_id, {}).items()}
+
+    def supporting_hadiths(self, teacher_id, student_id):
+        return list(self.students.get(teacher_id, {}).get(student_id, []))
+
+    def out_degree(self, narrator_id, weighted=False):
+        students = self.students.get(narrator_id, {})
+        return sum(map(len, students.values())) if weighted else len(students)
+
+    def in_degree(self, narrator_id, weighted=False):
+        teachers = self.teachers.get(narrator_id, {})
+        return sum(map(len, teachers.values())) if weighted else len(teachers)
+
+    def degree_ranking(self, direction="out", weighted=False, limit=None):
+        """
+        Rank narrators by their number of students ("out") or teachers ("in"),
+        or by the number of transmissions if weighted. Returns (id, degree) pairs.
+        """
+        if direction == "out":
+            adjacency, degree = self.students, self.out_degree
+        elif direction == "in":
+            adjacency, degree = self.teachers, self.in_degree
+        else:
+            raise ValueError(f"Unknown direction '{direction}'")
+
+        ranking = sorted(
+            ((narrator_id, degree(narrator_id, weighted)) for narrator_id in adjacency),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return ranking[:limit] if limit else ranking
+
+    def __len__(self):
+        return sum(map(len, self.students.values()))
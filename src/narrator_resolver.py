@@ -0,0 +1,180 @@
+import re
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from typing import NamedTuple
+
+from hadith import remove_tashkeel
+from hadith_search import fold_arabic
+
+# Aliases are stored and read from the CSV joined with '|', narrators stored
+# before that have them joined with ','
+ALIAS_SEPARATOR_REGEX = re.compile(r'[|,]')
+
+# Fuzzy matching reads the postings of trigrams shared by at most this many
+# names, and compares the best FUZZY_CANDIDATES of them by edit distance
+FUZZY_MAX_POSTINGS = 2000
+FUZZY_CANDIDATES = 20
+
+
+def normalize_name(name):
+    # Names are compared without tashkeel and surrounding whitespace
+    return remove_tashkeel(name).strip()
+
+
+def split_aliases(truncated_names):
+    if not truncated_names:
+        return []
+    return [alias.strip() for alias in ALIAS_SEPARATOR_REGEX.split(truncated_names) if alias.strip()]
+
+
+def parse_death_date(death_date):
+    # Death dates are years, stored as integers or text
+    try:
+        return int(death_date)
+    except (TypeError, ValueError):
+        return None
+
+
+class FuzzyMatch(NamedTuple):
+    """
+    A narrator whose name or alias is close to a searched name. score is
+    1 - edit distance / length of the longer name.
+    """
+    narrator_id: int
+    alias: str
+    score: float
+
+
+def name_trigrams(key):
+    # Spelling variants are folded, and the name padded so its start and end count as well
+    padded = f" {fold_arabic(key)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Levenshtein distance between a and b, or max_distance + 1 as soon as it
+    is known to be larger than max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class NarratorResolver:
+    """
+    In-memory copy of the NarratorAliases table with narrator death dates,
+    for what the indexed table cannot answer: fuzzy matching, ranking the
+    readings of an ambiguous name and listing ambiguous aliases. Exact
+    lookups query NarratorAliases (HadithDatabase.find_narrator_candidates).
+    """
+    def __init__(self):
+        self.names = {}  # normalized full name -> narrator id
+        self.aliases = {}  # normalized alias -> list of narrator ids
+        self.death_dates = {}  # narrator id -> year of death, when known
+        self.trigrams = None  # trigram -> set of name and alias keys, built on first fuzzy lookup
+
+    @classmethod
+    def from_alias_rows(cls, rows):
+        """
+        Build the index from (narrator_id, alias, is_name, death_date) rows of
+        the NarratorAliases table, ordered by narrator id with the full name first.
+        """
+        resolver = cls()
+        for narrator_id, narrator_rows in groupby(rows, key=itemgetter(0)):
+            narrator_rows = list(narrator_rows)
+            name = next((row[1] for row in narrator_rows if row[2]), None)
+            aliases = [row[1] for row in narrator_rows if not row[2]]
+            if name is not None:
+                resolver.add_narrator(narrator_id, name, aliases, narrator_rows[0][3])
+        return resolver
+
+    def add_narrator(self, narrator_id, name, aliases=(), death_date=None):
+        death_year = parse_death_date(death_date)
+        if death_year is not None:
+            self.death_dates[narrator_id] = death_year
+
+        name_key = normalize_name(name)
+        alias_keys = [normalize_name(alias) for alias in aliases]
+        if self.trigrams is not None:
+            for key in [name_key, *alias_keys]:
+                self.index_trigrams(key)
+        self.names.setdefault(name_key, narrator_id)
+
+        for alias_key in alias_keys:
+            narrator_ids = self.aliases.setdefault(alias_key, [])
+            if narrator_id not in narrator_ids:
+                narrator_ids.append(narrator_id)
+
+    def ambiguous_aliases(self):
+        """
+        Return a dict of every alias shared by more than one narrator.
+        """
+        return {
+            alias: list(narrator_ids)
+            for alias, narrator_ids in self.aliases.items()
+            if len(narrator_ids) > 1 and alias not in self.names
+        }
+
+    def index_trigrams(self, key):
+        for trigram in name_trigrams(key):
+            self.trigrams.setdefault(trigram, set()).add(key)
+
+    def fuzzy_candidates(self, narrator_name, min_score=0.6, limit=5):
+        """
+        Return FuzzyMatch records for the narrators whose name or an alias
+        scores at least min_score against the name, best first. Candidates are
+        the names sharing the most trigrams with it, read from the trigram
+        index rarest trigram first. Trigrams found in more than
+        FUZZY_MAX_POSTINGS names (like those of بن) are skipped once there are
+        candidates, and only the best FUZZY_CANDIDATES are compared by edit
+        distance. Names are compared with spelling variants folded as in
+        search, so قتاده matches قتادة exactly.
+        """
+        if self.trigrams is None:
+            self.trigrams = {}
+            for key in self.names.keys() | self.aliases.keys():
+                self.index_trigrams(key)
+
+        key = fold_arabic(normalize_name(narrator_name))
+        if not key:
+            return []
+
+        shared = Counter()
+        for trigram in sorted(name_trigrams(key), key=lambda trigram: len(self.trigrams.get(trigram, ()))):
+            postings = self.trigrams.get(trigram, ())
+            if len(postings) > FUZZY_MAX_POSTINGS and shared:
+                break
+            shared.update(postings)
+
+        # score >= min_score allows this many edits, even against a longer name
+        max_distance = int((1 - min_score) * len(key) / min_score)
+
+        matches = {}
+        for candidate, _ in shared.most_common(FUZZY_CANDIDATES):
+            distance = edit_distance(key, fold_arabic(candidate), max_distance)
+            if distance > max_distance:
+                continue
+            score = 1 - distance / max(len(key), len(candidate))
+            if score < min_score:
+                continue
+
+            narrator_ids = [self.names[candidate]] if candidate in self.names else self.aliases[candidate]
+            for narrator_id in narrator_ids:
+                if narrator_id not in matches or matches[narrator_id].score < score:
+                    matches[narrator_id] = FuzzyMatch(narrator_id, candidate, score)
+
+        return sorted(matches.values(), key=lambda match: (-match.score, match.narrator_id))[:limit]
+
+    def __len__(self):
+        return len(self.names.keys() | self.aliases.keys())
@@ -0,0 +1,98 @@
+import hashlib
+import json
+from typing import NamedTuple, Optional
+
+# Compact records passed between HadithDatabase, HadithTree and generate_html.
+# They are tuples without a per-instance __dict__, and are only turned into
+# Cytoscape.js dicts when the graph is written out.
+
+
+class NotFound(ValueError):
+    """
+    Raised when a hadith or narrator asked for is not in the database.
+    """
+
+
+class AmbiguousNarrator(ValueError):
+    """
+    Raised when a narrator is asked for by a name several narrators share.
+    candidates lists their (narrator_id, name), so one can be asked for by id.
+    """
+    def __init__(self, message, candidates):
+        super().__init__(message)
+        self.candidates = candidates
+
+
+class NarratorLink(NamedTuple):
+    """
+    One narrator in a hadith's isnad.
+    """
+    name: str
+    geography: Optional[str]
+    position_in_chain: int
+
+
+class HadithRecord(NamedTuple):
+    """
+    A hadith's matn with its isnad ordered by position_in_chain.
+    """
+    id: int
+    matn: str
+    isnad: list
+
+
+def content_hash(hadith):
+    """
+    Hash of what a tree draws for a HadithRecord: its matn and the names,
+    locations and positions of its isnad.
+    """
+    return hashlib.sha256(json.dumps(hadith, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class Node(NamedTuple):
+    """
+    A narrator or matn node of a tree.
+    """
+    id: str
+    label: str
+    geography: Optional[str] = None
+    is_matn: bool = False
+    position_in_chain: Optional[int] = None  # Used for the layout, not written out
+
+    def to_cytoscape(self):
+        if self.is_matn:
+            return {"data": {"id": self.id, "label": self.label, "isMatn": True}}
+        return {"data": {"id": self.id, "label": self.label, "geography": self.geography}}
+
+
+class Edge(NamedTuple):
+    """
+    A directed edge between two nodes of a tree.
+    """
+    source: str
+    target: str
+
+    def to_cytoscape(self):
+        return {"data": {"source": self.source, "target": self.target}}
+
+
+def to_cytoscape(elements, positions=None):
+    """
+    Convert nodes and edges to the Cytoscape.js elements format. positions
+    optionally gives the {node id: (x, y)} of a precomputed layout.
+    """
+    if positions is None:
+        return [element.to_cytoscape() for element in elements]
+
+    converted = []
+    for element in elements:
+        data = element.to_cytoscape()
+        if isinstance(element, Node) and element.id in positions:
+            x, y = positions[element.id]
+            data["position"] = {"x": x, "y": y}
+        converted.append(data)
+    return converted
+
+
+def elements_to_json(elements, positions=None):
+    return json.dumps(to_cytoscape(elements, positions), ensure_ascii=False)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# Part of every key, bump it when the generated HTML changes so old files are not served
+RENDER_VERSION = 1
+
+RENDER_CACHE_MAX_BYTES = 256 * 2**20
+
+
+class RenderCache:
+    """
+    Generated HTML files on disk, keyed by a hash of everything drawn in them:
+    the view, the content hashes of its hadiths (see
+    HadithDatabase.get_content_hashes) and the geography colors. A view whose
+    data did not change is served from its file, and any change to the data,
+    made by any process, gives a new key. Files are evicted least recently
+    used first once they add up to more than max_bytes, and invalidate drops
+    the files of views showing hadiths an ingest touched. suffix is the
+    extension of the cached files.
+    """
+    def __init__(self, cache_dir, max_bytes=RENDER_CACHE_MAX_BYTES, suffix='.html'):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.entries = OrderedDict()  # key -> (size, frozenset of hadith ids or None for the whole corpus)
+        self.total_bytes = 0
+
+        # Pick up the files of earlier runs, least recently used first
+        os.makedirs(cache_dir, exist_ok=True)
+        found = []
+        for file_name in os.listdir(cache_dir):
+            key, extension = os.path.splitext(file_name)
+            if extension != self.suffix:
+                continue
+            try:
+                stat = os.stat(self.html_path(key))
+                with open(self.meta_path(key), encoding='utf-8') as f:
+                    hadith_ids = json.load(f)['hadith_ids']
+            except (OSError, ValueError, KeyError):
+                self.remove(key)  # Left incomplete by an interrupted run
+                continue
+            found.append((stat.st_mtime_ns, key, stat.st_size, hadith_ids))
+
+        for _, key, size, hadith_ids in sorted(found):
+            self.entries[key] = (size, frozenset(hadith_ids) if hadith_ids is not None else None)
+            self.total_bytes += size
+        self.evict()
+
+    def html_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def meta_path(self, key):
+        # The hadiths a file shows, as JSON
+        return os.path.join(self.cache_dir, f"{key}.meta")
+
+    def key(self, view, content_hashes, geography_colors):
+        """
+        Hash a view description, the (hadith_id, content_hash) rows of the
+        hadiths it is built from (read as a stream) and its rendering options
+        into a cache key.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([RENDER_VERSION, view, geography_colors], sort_keys=True).encode('utf-8'))
+        for hadith_id, hadith_hash in content_hashes:
+            digest.update(f"{hadith_id}:{hadith_hash}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Return the path of the cached file for key, or None.
+        """
+        if key not in self.entries:
+            return None
+        path = self.html_path(key)
+        try:
+            os.utime(path)  # The modification time keeps the LRU order across runs
+        except OSError:
+            self.forget(key)  # Deleted by hand or by another process
+            return None
+        self.entries.move_to_end(key)
+        return path
+
+    def put(self, key, hadith_ids, render):
+        """
+        Call render(path) to write the file for key, record which hadiths it
+        shows (None for all of them) and return its path.
+        """
+        shown = frozenset(hadith_ids) if hadith_ids is not None else None
+        path = self.html_path(key)
+        temp_path = f"{path}.tmp"
+        try:
+            render(temp_path)
+            with open(self.meta_path(key), 'w', encoding='utf-8') as f:
+                json.dump({'hadith_ids': sorted(shown) if shown is not None else None}, f)
+            os.replace(temp_path, path)  # Readers never see a partly written file
+        except BaseException:
+            self.remove_file(temp_path)  # A failed render leaves nothing behind
+            raise
+
+        self.forget(key)
+        size = os.path.getsize(path)
+        self.entries[key] = (size, shown)
+        self.total_bytes += size
+        self.evict()
+        return path
+
+    def invalidate(self, hadith_ids=None):
+        """
+        Remove the files showing any of hadith_ids, or every file if
+        hadith_ids is None. Whole-corpus views show every hadith.
+        """
+        hadith_ids = set(hadith_ids) if hadith_ids is not None else None
+        for key, (_, shown) in list(self.entries.items()):
+            if hadith_ids is None or shown is None or not hadith_ids.isdisjoint(shown):
+                self.remove(key)
+
+    def evict(self):
+        # Keep the most recently used file even if it is larger than max_bytes
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self.remove(next(iter(self.entries)))
+
+    def forget(self, key):
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)[0]
+
+    def remove(self, key):
+        self.forget(key)
+        self.remove_file(self.html_path(key))
+        self.remove_file(self.meta_path(key))
+
+    def remove_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,118 @@
+import json
+
+from records import AmbiguousNarrator, Edge, Node, NotFound
+
+# Teacher -> student links between the selected narrators, given a `selected`
+# CTE of narrator ids
+INDUCED_EDGES_SQL = '''
+    SELECT teacher_id, student_id FROM NarratorTransmissions
+    WHERE teacher_id IN selected AND student_id IN selected
+    GROUP BY teacher_id, student_id
+'''
+
+SELECTED_NARRATORS_SQL = '''
+    SELECT id, name, location FROM Narrators
+    WHERE id IN selected
+    ORDER BY id
+'''
+
+
+class SubgraphExtractor:
+    """
+    Extract the part of the narrator graph relevant to a focused view, so only
+    that part is rendered. Narrator, geography and death-date selectors return
+    narrator graph elements (one node per narrator), while a list of hadith
+    ids returns their full trees including matn nodes.
+    """
+    def __init__(self, db, tree):
+        self.db = db
+        self.tree = tree
+
+    def narrator_graph_elements(self, selected_cte, params):
+        # Both queries share the CTE that selects the narrator ids
+        nodes = [
+            Node(f"n{narrator_id}", name, location)
+            for narrator_id, name, location in self.db.conn.execute(f"{selected_cte} {SELECTED_NARRATORS_SQL}", params)
+        ]
+        edges = [
+            Edge(f"n{teacher_id}", f"n{student_id}")
+            for teacher_id, student_id in self.db.conn.execute(f"{selected_cte} {INDUCED_EDGES_SQL}", params)
+        ]
+        return nodes + edges
+
+    def narrator_id(self, narrator):
+        # A narrator id, or a name or alias that only one narrator has
+        if isinstance(narrator, int):
+            found = self.db.conn.execute('SELECT id FROM Narrators WHERE id = ?', (narrator,)).fetchone()
+            candidates = list(found or ())
+        else:
+            candidates = self.db.find_narrator_candidates(narrator)
+        if not candidates:
+            raise NotFound(f"Narrator '{narrator}' not found in the database")
+
+        if len(candidates) > 1:
+            names = self.db.conn.execute(
+                'SELECT id, name FROM Narrators WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id',
+                (json.dumps(candidates),),
+            ).fetchall()
+            raise AmbiguousNarrator(
+                f"'{narrator}' could be any of {', '.join(f'{name} ({narrator_id})' for narrator_id, name in names)}, "
+                "ask for one by id",
+                names,
+            )
+        return candidates[0]
+
+    def around_narrator(self, narrator, up=2, down=2):
+        """
+        Narrators within up hops towards the source (teachers) and down hops
+        towards the collectors (students) of a narrator, with their links.
+        narrator is a narrator id, or a name or alias; a name shared by several
+        narrators raises AmbiguousNarrator rather than picking one of them.
+        """
+        narrator_id = self.narrator_id(narrator)
+
+        selected_cte = '''
+            WITH RECURSIVE
+            teachers(id, depth) AS (
+                SELECT ?, 0
+                UNION
+                SELECT t.teacher_id, teachers.depth + 1
+                FROM NarratorTransmissions t JOIN teachers ON t.student_id = teachers.id
+                WHERE teachers.depth < ?
+            ),
+            students(id, depth) AS (
+                SELECT ?, 0
+                UNION
+                SELECT t.student_id, students.depth + 1
+                FROM NarratorTransmissions t JOIN students ON t.teacher_id = students.id
+                WHERE students.depth < ?
+            ),
+            selected(id) AS (SELECT id FROM teachers UNION SELECT id FROM students)
+        '''
+        return self.narrator_graph_elements(selected_cte, (narrator_id, up, narrator_id, down))
+
+    def for_geography(self, geography):
+        """
+        Narrators located in a geography and the links between them.
+        """
+        selected_cte = 'WITH selected(id) AS (SELECT id FROM Narrators WHERE location = ?)'
+        return self.narrator_graph_elements(selected_cte, (geography,))
+
+    def for_death_range(self, start, end):
+        """
+        Narrators who died between start and end (inclusive) and the links between them.
+        """
+        selected_cte = 'WITH selected(id) AS (SELECT id FROM Narrators WHERE death_date BETWEEN ? AND ?)'
+        return self.narrator_graph_elements(selected_cte, (start, end))
+
+    def for_narrator_ids(self, narrator_ids):
+        selected_cte = 'WITH selected(id) AS (SELECT value FROM json_each(?))'
+        return self.narrator_graph_elements(selected_cte, (json.dumps(sorted(narrator_ids)),))
+
+    def for_hadiths(self, hadith_ids, group_co_narrators=False):
+        """
+        The combined tree of the given hadiths, with their matn nodes.
+        """
+        return self.tree.build_hadith_tree_for_multiple_hadiths(
+            self.db.iter_hadiths_with_isnad(hadith_ids), group_co_narrators=group_co_narrators
+        )
@@ -0,0 +1,78 @@
+import json
+import os
+from collections import OrderedDict
+from itertools import islice
+
+from generate_html import generate_chunked_html
+from layout import GRID_SIZE, NODE_SPACING, layered_layout
+from records import Node, to_cytoscape
+
+# Elements per chunk file: a few seconds of layout, a few MB for the browser
+CHUNK_SIZE = 5000
+
+# Ids of the nodes already written that are remembered, so a node yielded
+# again (see HadithTree.iter_tree_elements) keeps its first position
+MAX_PLACED_NODES = 100000
+
+
+def write_chunk(path, index, elements, positions):
+    # A script rather than plain JSON so the viewer also works from file://
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"hadithTreeChunk({index}, [\n")
+        for i, element in enumerate(to_cytoscape(elements, positions)):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(element, ensure_ascii=False))
+        f.write("\n]);\n")
+
+
+def write_tree_chunks(elements, geography_colors, output_dir, chunk_size=CHUNK_SIZE):
+    """
+    Write a stream of Node and Edge records (as from HadithTree.iter_tree_elements)
+    as output_dir/chunks/chunk_<n>.js files of chunk_size elements, plus an
+    index.html viewer that loads the chunks as they scroll into view. Each
+    chunk is laid out on its own, so memory is bounded by chunk_size rather
+    than by the size of the tree, but in one coordinate system: every chunk
+    draws a level at the same height, counted up from the matns at y = 0,
+    and is placed to the right of the previous one. A node written by an
+    earlier chunk is not written again, and edges to it are drawn once both
+    ends are loaded. Returns the path of index.html.
+    """
+    os.makedirs(os.path.join(output_dir, 'chunks'), exist_ok=True)
+    elements = iter(elements)
+    placed = OrderedDict()  # Ids of recently written nodes
+    chunks = []
+    right = None
+
+    while True:
+        chunk = list(islice(elements, chunk_size))
+        if not chunk:
+            break
+
+        kept = []
+        for element in chunk:
+            if isinstance(element, Node):
+                if element.id in placed:
+                    continue
+                placed[element.id] = None
+            kept.append(element)
+        chunk = kept
+        while len(placed) > MAX_PLACED_NODES:
+            placed.popitem(last=False)
+
+        positions = layered_layout(chunk, top_level=0)
+        if positions:
+            xs = [x for x, _ in positions.values()]
+            shift = 0 if right is None else right + NODE_SPACING * GRID_SIZE - min(xs)
+            positions = {node_id: (x + shift, y) for node_id, (x, y) in positions.items()}
+            x_min, right = min(xs) + shift, max(xs) + shift
+        else:
+            x_min = right = right or 0
+
+        file_name = f"chunks/chunk_{len(chunks):05d}.js"
+        write_chunk(os.path.join(output_dir, file_name), len(chunks), chunk, positions)
+        chunks.append({"file": file_name, "elements": len(chunk), "x_min": x_min, "x_max": right})
+
+    output_path = os.path.join(output_dir, 'index.html')
+    generate_chunked_html({"chunks": chunks}, geography_colors, output_path)
+    return output_path
@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from generate_html import DARKER_COLOR_JS, NODE_STYLES
+from hadith_database import HadithDatabase, SchemaError
+from hadith_search import SEARCH_COLUMNS
+from hadith_tree import HadithTree
+from records import AmbiguousNarrator, NotFound, to_cytoscape
+from render_cache import RenderCache
+
+POOL_SIZE = 4
+MAX_SEARCH_RESULTS = 100
+MAX_SUBGRAPH_HOPS = 5
+
+# Rejected requests are read on for up to this long and this many bytes
+# before closing, so the client gets the error response and not a reset
+LINGER_SECONDS = 1
+MAX_LINGER_BYTES = 2**20
+
+HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def int_param(params, name, default, maximum):
+    try:
+        value = int(params.get(name, [default])[0])
+    except ValueError:
+        raise HTTPError(400, f"'{name}' must be an integer")
+    if not 0 <= value <= maximum:
+        raise HTTPError(400, f"'{name}' must be between 0 and {maximum}")
+    return value
+
+
+def flag_param(params, name):
+    return params.get(name, ['0'])[0] in ('1', 'true', 'yes')
+
+
+class TreeServer:
+    """
+    Local asyncio HTTP service for the tree viewer, serving JSON:
+
+        GET /hadith/{id}/tree             the hadith's tree as Cytoscape.js elements with positions
+        GET /narrator/{name}/subgraph     narrators up to ?up= and ?down= hops from a narrator, by
+                                          name or id; a shared name is answered with 409 and the candidates
+        GET /search?q=                    SearchResults, with ?limit=, ?phrase=1, ?columns=matn,comments
+        GET /                             a page that searches and shows trees with the above
+
+    Requests are answered by a pool of pool_size worker threads, so slow
+    queries do not hold up the event loop, each with its own HadithTree on a
+    read-only "serving" connection. Requests wait in one first-come,
+    first-served queue for a free worker. Hadith trees are stored in a
+    RenderCache shared by the workers, keyed by the data they are drawn from.
+    Raises SchemaError if the database cannot be served.
+    """
+    def __init__(self, db_name='data/hadith.db', pool_size=POOL_SIZE, render_cache_dir=None, geography_colors=None):
+        # Check the database here, as a worker that fails to open it would break the pool
+        HadithDatabase(db_name, profile="serving").close()
+        self.db_name = db_name
+        self.trees = []  # One per worker thread, opened as the thread starts
+        self.worker = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, initializer=self.open_worker)
+        self.render_cache = RenderCache(render_cache_dir, suffix='.json') if render_cache_dir else None
+        self.cache_lock = threading.Lock()  # The RenderCache is shared by the worker threads
+        self.geography_colors = geography_colors or {}
+        self.routes = {
+            'hadith': self.hadith_tree,
+            'narrator': self.narrator_subgraph,
+            'search': self.search,
+        }
+
+    def open_worker(self):
+        self.worker.tree = HadithTree(self.db_name, profile="serving")
+        self.trees.append(self.worker.tree)
+
+    async def start(self, host='127.0.0.1', port=8000):
+        # A backlog large enough for a burst of concurrent clients
+        return await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        # A line longer than the stream limit (64 KiB) makes readline raise
+        # ValueError, after which the rest of the request cannot be told apart
+        # from the next one, so the connection is answered and closed.
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except ValueError:
+                    await self.reject(reader, writer, 400, "Request line too long")
+                    break
+                if not request_line:
+                    break
+                headers = {}
+                try:
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                except ValueError:
+                    await self.reject(reader, writer, 431, "Header line too long")
+                    break
+
+                # Split on spaces only, other whitespace may be part of a raw UTF-8 target
+                request = request_line.decode('utf-8', errors='replace').rstrip('\r\n').split(' ')
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.send(writer, *await self.respond(request), keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, content_type, body, keep_alive=True):
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def reject(self, reader, writer, status, message):
+        await self.send(writer, *self.error(status, message), keep_alive=False)
+        writer.write_eof()
+
+        async def discard():
+            remaining = MAX_LINGER_BYTES
+            while remaining > 0:
+                data = await reader.read(min(remaining, 2**16))
+                if not data:
+                    break
+                remaining -= len(data)
+
+        try:
+            await asyncio.wait_for(discard(), LINGER_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    async def respond(self, request):
+        """
+        Return (status, content type, body) for a split request line.
+        """
+        if len(request) != 3:
+            return self.error(400, "Malformed request line")
+        method, target, _ = request
+        if method != 'GET':
+            return self.error(405, f"Method {method} is not supported")
+
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        if not parts:
+            return 200, 'text/html; charset=utf-8', self.viewer_page()
+        if parts[0] not in self.routes:
+            return self.error(404, f"No endpoint {url.path}")
+
+        params = parse_qs(url.query)
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(self.executor, self.handle, parts, params)
+        except HTTPError as e:
+            return self.error(e.status, str(e))
+        except NotFound as e:
+            return self.error(404, str(e))
+        except AmbiguousNarrator as e:
+            return self.error(409, str(e), candidates=[{"id": narrator_id, "name": name} for narrator_id, name in e.candidates])
+        except Exception as e:
+            print(f"Error answering {target}: {e!r}")
+            return self.error(500, "Internal error")
+        return 200, 'application/json; charset=utf-8', body
+
+    def error(self, status, message, **details):
+        return status, 'application/json; charset=utf-8', json.dumps({"error": message, **details}, ensure_ascii=False).encode('utf-8')
+
+    # The handlers run in the worker threads and return the JSON body
+
+    def handle(self, parts, params):
+        return self.routes[parts[0]](self.worker.tree, parts[1:], params)
+
+    def elements_json(self, tree, elements):
+        positions = tree.layout_cache.positions(elements)
+        return json.dumps(to_cytoscape(elements, positions), ensure_ascii=False).encode('utf-8')
+
+    def hadith_tree(self, tree, parts, params):
+        if len(parts) != 2 or parts[1] != 'tree' or not parts[0].isdigit():
+            raise HTTPError(404, "Expected /hadith/{id}/tree")
+        hadith_id = int(parts[0])
+        group_co_narrators = flag_param(params, 'group')
+
+        if self.render_cache is None:
+            return self.elements_json(tree, tree.fetch_hadith_tree_data(hadith_id, group_co_narrators))
+
+        key = self.render_cache.key(("hadith-json", group_co_narrators), tree.db.get_content_hashes([hadith_id]), None)
+        with self.cache_lock:
+            path = self.render_cache.get(key)
+            if path is not None:
+                with open(path, 'rb') as f:
+                    return f.read()
+
+        # Built outside the lock so other requests are not held up by a miss
+        body = self.elements_json(tree, tree.fetch_hadith_tree_data(hadith_id, group_co_narrators))
+
+        def write(path):
+            with open(path, 'wb') as f:
+                f.write(body)
+
+        with self.cache_lock:
+            self.render_cache.put(key, [hadith_id], write)
+        return body
+
+    def narrator_subgraph(self, tree, parts, params):
+        if len(parts) != 2 or parts[1] != 'subgraph':
+            raise HTTPError(404, "Expected /narrator/{name}/subgraph")
+        up = int_param(params, 'up', 2, MAX_SUBGRAPH_HOPS)
+        down = int_param(params, 'down', 2, MAX_SUBGRAPH_HOPS)
+        narrator = int(parts[0]) if parts[0].isdigit() else parts[0]
+        return self.elements_json(tree, tree.subgraph.around_narrator(narrator, up=up, down=down))
+
+    def search(self, tree, parts, params):
+        if parts:
+            raise HTTPError(404, "Expected /search")
+        query = params.get('q', [''])[0]
+        limit = int_param(params, 'limit', 20, MAX_SEARCH_RESULTS)
+        columns = params['columns'][0].split(',') if 'columns' in params else None
+        if columns and not set(columns) <= set(SEARCH_COLUMNS):
+            raise HTTPError(400, f"'columns' must be among {', '.join(SEARCH_COLUMNS)}")
+        results = tree.db.search(query, limit=limit, columns=columns, phrase=flag_param(params, 'phrase'))
+        return json.dumps([result._asdict() for result in results], ensure_ascii=False).encode('utf-8')
+
+    def viewer_page(self):
+        return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8">
+  <title>Hadith Trees</title>
+  <script src="https://unpkg.com/cytoscape/dist/cytoscape.min.js"></script>
+  <style>
+    body {{ margin: 0; font-family: Arial, sans-serif; display: flex; height: 100vh; }}
+    #side {{ width: 320px; padding: 8px; overflow-y: auto; direction: rtl; }}
+    #side div {{ cursor: pointer; padding: 4px 0; border-bottom: 1px solid #eee; }}
+    #cy {{ flex: 1; background-color: #f9f9f9; }}
+  </style>
+</head>
+<body>
+  <div id="side"><input id="q" placeholder="بحث" style="width: 95%"><div id="results"></div></div>
+  <div id="cy"></div>
+  <script>
+    const geographyColors = {json.dumps(self.geography_colors)};
+
+{DARKER_COLOR_JS}
+
+    const cy = cytoscape({{
+      container: document.getElementById('cy'),
+      elements: [],
+      layout: {{ name: 'preset' }},
+{NODE_STYLES}
+    }});
+
+    async function showTree(hadithId) {{
+      const elements = await (await fetch(`/hadith/${{hadithId}}/tree`)).json();
+      cy.elements().remove();
+      cy.add(elements);
+      cy.fit(undefined, 30);
+    }}
+
+    document.getElementById('q').addEventListener('change', async (event) => {{
+      const results = await (await fetch('/search?q=' + encodeURIComponent(event.target.value))).json();
+      const list = document.getElementById('results');
+      list.replaceChildren(...results.map(result => {{
+        const item = document.createElement('div');
+        item.textContent = `${{result.hadith_id}}: ${{result.snippet}}`;
+        item.onclick = () => showTree(result.hadith_id);
+        return item;
+      }}));
+    }});
+  </script>
+</body>
+</html>
+""".encode('utf-8')
+
+    def close(self):
+        self.executor.shutdown()
+        for tree in self.trees:
+            tree.close()
+
+
+async def serve(server, host, port):
+    http_server = await server.start(host, port)
+    print(f"Serving on http://{host}:{http_server.sockets[0].getsockname()[1]}/", flush=True)
+    async with http_server:
+        await http_server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve hadith trees, narrator subgraphs and search as JSON.")
+    parser.add_argument("--db", default="data/hadith.db", help="Database file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="Read-only connections, and worker threads")
+    parser.add_argument("--render-cache", default=os.path.join("data", "render_cache", "json"), help="Directory of cached trees")
+    args = parser.parse_args()
+
+    try:
+        server = TreeServer(args.db, args.pool_size, args.render_cache)
+    except SchemaError as e:
+        parser.exit(1, f"{e}\n")
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat in src/ and import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from hadith import Hadith
+from hadith_database import HadithDatabase
+
+# (name, location, death_date, link, truncated_names) rows, ids 1 to 7 in this order
+NARRATORS = [
+    ("محمد بن إسماعيل", "Bukhara", 256, None, ["البخاري"]),
+    ("مالك بن أنس", "Madinah", 179, None, ["مالك"]),
+    ("نافع", "Madinah", 117, None, []),
+    ("عبد الله بن عمر", "Madinah", 73, None, ["ابن عمر"]),
+    ("شعبة بن الحجاج", "Basra", 160, None, ["شعبة"]),
+    ("قتادة بن دعامة", "Basra", 117, None, ["قتادة"]),
+    ("أنس بن مالك", "Basra", 93, None, ["أنس"]),
+]
+
+BUKHARI, MALIK, NAFI, IBN_UMAR, SHUBA, QATADA, ANAS = range(1, 8)
+
+
+def hadith_text(names, matn="إنما الأعمال بالنيات", comment=None):
+    """
+    Raw text of a hadith whose isnad lists names from the compiler up. A
+    position with co-narrators is a list of names.
+    """
+    lines = [
+        "حدثنا " + (" و ".join(name) if isinstance(name, list) else name)
+        for name in names
+    ]
+    text = "\n".join(lines) + f"\n\n{matn}"
+    if comment:
+        text += f"\n\n{comment}"
+    return text
+
+
+def make_hadith(names, matn="إنما الأعمال بالنيات", file_path=""):
+    return Hadith(hadith_text(names, matn), file_path)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'hadith.db')
+
+
+@pytest.fixture
+def db(db_path):
+    database = HadithDatabase(db_path)
+    database.add_narrators(NARRATORS)
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def corpus(db):
+    """
+    The narrators with three hadiths:
+      1. Bukhari <- Malik <- Nafi <- Ibn Umar
+      2. Bukhari <- Shu'ba <- Qatada <- Anas
+      3. Bukhari <- Malik <- Nafi <- Ibn Umar, with another matn
+    """
+    db.insert_hadiths([
+        make_hadith(["محمد بن إسماعيل", "مالك", "نافع", "ابن عمر"], file_path="h_1.txt"),
+        make_hadith(["محمد بن إسماعيل", "شعبة", "قتادة", "أنس"], "لا يؤمن أحدكم حتى يحب لأخيه", "h_2.txt"),
+        make_hadith(["البخاري", "مالك بن أنس", "نافع", "عبد الله بن عمر"], "صلاة الجماعة تفضل صلاة الفذ", "h_3.txt"),
+    ])
+    return db
@@ -0,0 +1,46 @@
+from common_link import COMMON_LINK, CommonLinkAnalyzer, score_narrators, strongly_connected_components
+from conftest import BUKHARI, IBN_UMAR, MALIK, NAFI, QATADA, SHUBA
+
+
+def test_components_come_after_the_ones_they_reach():
+    components = strongly_connected_components({1: {2}, 2: {3}, 3: {2, 4}, 4: set()})
+    assert [sorted(component) for component in components] == [[4], [2, 3], [1]]
+
+
+def test_common_link_has_the_most_chains():
+    # 1 passed the hadith to 2 and 3, who both passed it to 4 and 5
+    transmissions = [(1, 2, 10), (1, 3, 11), (2, 4, 10), (2, 5, 10), (3, 4, 11), (3, 5, 11)]
+    scores = {score.narrator_id: score for score in score_narrators(transmissions)}
+    assert scores[1].chains == 4
+    assert scores[1].kind == COMMON_LINK
+    assert scores[4].chains == 1
+    assert not any(score.cyclic for score in scores.values())
+
+
+def test_cycle_is_condensed_instead_of_blocking_its_ancestors():
+    # 2 and 3 name each other, which used to leave 1 without a chain count
+    transmissions = [(1, 2, 10), (2, 3, 10), (3, 2, 10), (3, 4, 10), (3, 5, 11), (1, 6, 11)]
+    scores = {score.narrator_id: score for score in score_narrators(transmissions)}
+    assert scores[2].chains == scores[3].chains == 2
+    assert scores[2].cyclic and scores[3].cyclic
+    assert scores[1].chains == 3
+    assert not scores[1].cyclic
+
+
+def test_self_transmission_is_cyclic():
+    scores = {score.narrator_id: score for score in score_narrators([(1, 1, 10), (1, 2, 10)])}
+    assert scores[1].cyclic
+    assert scores[1].chains == 1
+
+
+def test_analyzer_scores_the_corpus(corpus):
+    analyzer = CommonLinkAnalyzer(corpus)
+    common_links = analyzer.common_links()
+    assert common_links == []
+
+    scores = {score.narrator_id: score for score in analyzer.analyze([1, 3])}
+    assert scores[IBN_UMAR].chains == 1
+    assert scores[NAFI].hadiths == 2
+    assert BUKHARI in scores and MALIK in scores
+    assert SHUBA not in scores and QATADA not in scores
+    analyzer.close()
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+
+import pytest
+
+from conftest import NARRATORS, make_hadith
+from hadith_database import SCHEMA_VERSION, HadithDatabase, SchemaError
+
+
+def test_serving_does_not_create_a_missing_database(db_path):
+    with pytest.raises(SchemaError):
+        HadithDatabase(db_path, profile="serving")
+    assert not os.path.exists(db_path)
+
+
+def test_serving_rejects_a_database_without_the_schema(db_path):
+    sqlite3.connect(db_path).close()
+    with pytest.raises(SchemaError):
+        HadithDatabase(db_path, profile="serving")
+
+    # Nothing was created by the failed reader
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT count(*) FROM sqlite_master").fetchone()[0] == 0
+    conn.close()
+
+
+def test_serving_rejects_an_outdated_schema(db_path):
+    HadithDatabase(db_path).close()
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION - 1}")
+    conn.close()
+
+    with pytest.raises(SchemaError, match="writer profile"):
+        HadithDatabase(db_path, profile="serving")
+
+
+def test_serving_keeps_the_journal_mode_and_cannot_write(db_path):
+    HadithDatabase(db_path).close()
+
+    reader = HadithDatabase(db_path, profile="serving")
+    assert reader.cursor.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    with pytest.raises(sqlite3.OperationalError):
+        reader.add_narrators(NARRATORS)
+    reader.close()
+
+
+def test_serving_reads_alongside_an_ingest_writer(db_path):
+    writer = HadithDatabase(db_path, profile="ingest")
+    writer.add_narrators(NARRATORS)
+    reader = HadithDatabase(db_path, profile="serving")
+
+    writer.insert_hadiths([make_hadith(["محمد بن إسماعيل", "مالك", "نافع", "ابن عمر"])])
+    assert reader.cursor.execute("SELECT count(*) FROM Hadiths").fetchone()[0] == 1
+    assert reader.cursor.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    reader.close()
+    writer.close()
+
+
+def test_writer_profiles_enforce_foreign_keys(db_path):
+    for profile in ("default", "ingest"):
+        db = HadithDatabase(db_path, profile=profile)
+        assert db.cursor.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        with pytest.raises(sqlite3.IntegrityError):
+            db.cursor.execute("INSERT INTO Isnads (hadith_id, narrator_id, position_in_chain) VALUES (1, 1, 0)")
+        db.conn.rollback()
+        db.close()
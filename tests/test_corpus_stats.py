@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+from conftest import BUKHARI, make_hadith
+from corpus_stats import CorpusStats
+
+CORPUS_STATS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'corpus_stats.py')
+
+
+def test_statistics_follow_ingests(corpus):
+    stats = CorpusStats(corpus)
+    assert stats.chain_lengths().hadiths == 3
+    assert stats.narrator_frequency(1)[0][0] == BUKHARI
+
+    corpus.insert_hadiths([make_hadith(["محمد بن إسماعيل", "مالك", "نافع"], "الدين النصيحة")])
+    assert stats.chain_lengths().hadiths == 4
+    stats.close()
+
+
+def test_report_opens_the_database_read_only(corpus, db_path):
+    corpus.close()
+    before = os.stat(db_path).st_mtime_ns
+
+    result = subprocess.run([sys.executable, CORPUS_STATS, '--db', db_path], capture_output=True, text=True, check=True)
+    assert "Most frequent narrators:" in result.stdout
+    assert os.stat(db_path).st_mtime_ns == before
+
+
+def test_report_does_not_create_a_missing_database(tmp_path):
+    db_path = tmp_path / 'missing.db'
+    result = subprocess.run([sys.executable, CORPUS_STATS, '--db', str(db_path)], capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "read-only" in result.stderr
+    assert not db_path.exists()
@@ -0,0 +1,46 @@
+import json
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from generate_html import generate_html
+
+# Stands in for the page and Cytoscape.js, logging the layout the page picks
+CYTOSCAPE_STUB = """
+const document = {getElementById: () => null};
+function cytoscape(options) {
+  console.log(options.layout.name);
+  return {on() {}, nodes() { return {forEach() {}}; }};
+}
+"""
+
+
+def page_layout(tmp_path, elements):
+    if shutil.which('node') is None:
+        pytest.skip("node is not installed")
+
+    output_path = tmp_path / 'tree.html'
+    generate_html(json.dumps(elements), {}, str(output_path))
+    script = re.search(r'<script>(.*)</script>', output_path.read_text(encoding='utf-8'), re.S).group(1)
+    result = subprocess.run(['node', '-e', CYTOSCAPE_STUB + script], capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_precomputed_positions_are_painted(tmp_path):
+    elements = [
+        {"data": {"id": "a", "label": "أ"}, "position": {"x": 0, "y": 0}},
+        {"data": {"id": "b", "label": "ب"}, "position": {"x": 0, "y": 100}},
+        {"data": {"source": "a", "target": "b"}},
+    ]
+    assert page_layout(tmp_path, elements) == "preset"
+
+
+def test_missing_positions_fall_back_to_dagre(tmp_path):
+    elements = [
+        {"data": {"id": "a", "label": "أ"}, "position": {"x": 0, "y": 0}},
+        {"data": {"id": "b", "label": "ب"}},
+        {"data": {"source": "a", "target": "b"}},
+    ]
+    assert page_layout(tmp_path, elements) == "dagre"
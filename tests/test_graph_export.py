@@ -0,0 +1,55 @@
+import csv
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from conftest import MALIK, NAFI
+from graph_export import export_narrator_graph
+
+GRAPHML = '{http://graphml.graphdrawing.org/xmlns}'
+
+
+@pytest.fixture
+def free_text_dates(corpus):
+    # Death dates come from the narrators CSV as free text
+    corpus.cursor.execute("UPDATE Narrators SET death_date = 'unknown' WHERE id = ?", (NAFI,))
+    corpus.cursor.execute("UPDATE Narrators SET death_date = '179' WHERE id = ?", (MALIK,))
+    corpus.conn.commit()
+    return corpus
+
+
+def test_graphml_death_dates_are_longs_or_missing(free_text_dates, tmp_path):
+    path = tmp_path / 'graph.graphml'
+    export_narrator_graph(free_text_dates, str(path), 'graphml')
+
+    root = ElementTree.parse(path).getroot()
+    key = root.find(f"{GRAPHML}key[@id='death_date']")
+    assert key.get('attr.type') == 'long'
+
+    death_dates = {
+        node.get('id'): [data.text for data in node.findall(f"{GRAPHML}data[@key='death_date']")]
+        for node in root.iter(f'{GRAPHML}node')
+    }
+    assert death_dates[f'n{MALIK}'] == ['179']
+    assert death_dates[f'n{NAFI}'] == []
+
+
+def test_csv_leaves_unparsed_death_dates_empty(free_text_dates, tmp_path):
+    export_narrator_graph(free_text_dates, str(tmp_path / 'csv'), 'csv')
+    with open(tmp_path / 'csv' / 'nodes.csv', encoding='utf-8') as f:
+        rows = {int(row['id']): row for row in csv.DictReader(f)}
+    assert rows[MALIK]['death_date'] == '179'
+    assert rows[NAFI]['death_date'] == ''
+
+    with open(tmp_path / 'csv' / 'edges.csv', encoding='utf-8') as f:
+        assert (str(NAFI), str(MALIK), '2') in {tuple(row) for row in csv.reader(f)}
+
+
+def test_parquet_death_dates_are_integers(free_text_dates, tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    export_narrator_graph(free_text_dates, str(tmp_path / 'parquet'), 'parquet')
+
+    nodes = parquet.read_table(tmp_path / 'parquet' / 'nodes.parquet').to_pydict()
+    death_dates = dict(zip(nodes['id'], nodes['death_date']))
+    assert death_dates[MALIK] == 179
+    assert death_dates[NAFI] is None
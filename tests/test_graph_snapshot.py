@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from conftest import MALIK, NAFI, make_hadith
+from graph_snapshot import HEADER, SNAPSHOT_PATH, GraphSnapshot, snapshot_is_current, write_snapshot
+from hadith_database import SCHEMA_VERSION
+from hadith_tree import HadithTree
+
+
+@pytest.fixture
+def snapshot_path(corpus, tmp_path):
+    path = str(tmp_path / 'hadith.snapshot')
+    write_snapshot(corpus, path)
+    return path
+
+
+def test_snapshot_matches_the_database(corpus, snapshot_path):
+    snapshot = GraphSnapshot(snapshot_path, db=corpus)
+    assert snapshot.user_version == SCHEMA_VERSION
+    assert snapshot.students_of(NAFI) == {MALIK: 2}
+    assert list(snapshot.iter_hadiths()) == list(corpus.iter_hadiths_with_isnad())
+    snapshot.close()
+
+
+def test_snapshot_of_other_data_is_stale(corpus, snapshot_path):
+    assert snapshot_is_current(corpus, snapshot_path)
+    corpus.insert_hadiths([make_hadith(["محمد بن إسماعيل", "مالك", "نافع"], "الدين النصيحة")])
+    assert not snapshot_is_current(corpus, snapshot_path)
+    with pytest.raises(ValueError):
+        GraphSnapshot(snapshot_path, db=corpus)
+
+    # Without the database it can still be opened, as the data it was written from
+    snapshot = GraphSnapshot(snapshot_path)
+    assert len(list(snapshot.iter_hadiths())) == 3
+    snapshot.close()
+
+
+def test_missing_or_older_snapshots_are_not_current(corpus, tmp_path):
+    path = tmp_path / 'hadith.snapshot'
+    assert not snapshot_is_current(corpus, str(path))
+    path.write_bytes(b'PYICMASN' + bytes(256))
+    assert not snapshot_is_current(corpus, str(path))
+
+
+def test_default_path_is_in_the_data_directory():
+    repository = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    assert os.path.samefile(os.path.dirname(SNAPSHOT_PATH), os.path.join(repository, 'data'))
+
+
+def test_truncated_snapshots_are_rejected(corpus, snapshot_path, tmp_path):
+    data = open(snapshot_path, 'rb').read()
+    for size in (HEADER.size - 1, HEADER.size + 8):
+        path = tmp_path / f'truncated_{size}.snapshot'
+        path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            GraphSnapshot(str(path))
+        assert not snapshot_is_current(corpus, str(path))
+
+
+def test_tree_reads_the_corpus_from_a_current_snapshot(corpus, db_path, snapshot_path, monkeypatch):
+    tree = HadithTree(db_path, snapshot_path=snapshot_path)
+    expected = tree.build_hadith_tree_for_multiple_hadiths(corpus.iter_hadiths_with_isnad())
+
+    def full_read(hadith_ids=None):
+        raise AssertionError("read the corpus from the database")
+
+    monkeypatch.setattr(tree.db, 'iter_hadiths_with_isnad', full_read)
+    assert tree.build_hadith_tree_for_multiple_hadiths(tree.iter_corpus()) == expected
+
+    # A stale snapshot is not used
+    monkeypatch.undo()
+    corpus.insert_hadiths([make_hadith(["محمد بن إسماعيل", "مالك", "نافع"], "الدين النصيحة")])
+    assert len(list(tree.iter_corpus())) == 4
+    tree.close()
@@ -0,0 +1,46 @@
+import pickle
+
+import pytest
+
+from hadith import DEFAULT_NORMALIZER, Hadith, HadithNormalizer, remove_tashkeel
+
+
+def test_extracts_narrators_matn_and_comment():
+    hadith = Hadith(
+        "حَدَّثَنَا يُونُسُ قَالَ # يونس بن حبيب\n"
+        "حَدَّثَنَا شُعْبَةُ وَ هَمَّامٌ\n"
+        "عَنْ أَبِي هُرَيْرَةَ رضي الله عنه\n\n"
+        "إِذَا بَاتَتِ الْمَرْأَةُ\n\n"
+        "شَكَّ أَبُو دَاوُدَ",
+        "h_1.txt",
+    )
+    assert hadith.narrators == ["يونس بن حبيب", ["شعبة", "همام"], "أبي هريرة"]
+    assert hadith.matn == "إذا باتت المرأة"
+    assert hadith.comment == "شك أبو داود"
+    assert hadith.file_path == "h_1.txt"
+
+
+def test_remove_tashkeel():
+    assert remove_tashkeel("حَدَّثَنَا") == "حدثنا"
+
+
+def test_normalizer_is_immutable_and_extendable():
+    with pytest.raises(AttributeError):
+        DEFAULT_NORMALIZER.honorifics = ()
+
+    normalizer = DEFAULT_NORMALIZER.extend(introductory_words=["روى لنا"], honorifics=[" عليه السلام"])
+    assert "روى لنا" in normalizer.introductory_words
+    assert normalizer.remove_honorifics("موسى عليه السلام") == "موسى"
+    assert DEFAULT_NORMALIZER.remove_honorifics("موسى عليه السلام") == "موسى عليه السلام"
+
+
+def test_normalizer_pickles_for_worker_processes():
+    normalizer = pickle.loads(pickle.dumps(DEFAULT_NORMALIZER.extend(honorifics=[" عليه السلام"])))
+    assert isinstance(normalizer, HadithNormalizer)
+    assert normalizer.remove_honorifics("موسى عليه السلام") == "موسى"
+
+
+def test_custom_normalizer_per_hadith():
+    normalizer = DEFAULT_NORMALIZER.extend(introductory_words=["سمعنا"])
+    assert Hadith("سمعنا نافع\n\nمتن", normalizer=normalizer).narrators == ["نافع"]
+    assert Hadith("سمعنا نافع\n\nمتن").narrators == ["سمعنا نافع"]
@@ -0,0 +1,42 @@
+import pytest
+
+from hadith_tree import HadithTree
+from records import Node
+
+
+@pytest.fixture
+def tree(corpus, db_path):
+    tree = HadithTree(db_path)
+    yield tree
+    tree.close()
+
+
+def test_iter_hadiths_with_isnad_streams_records(corpus):
+    records = list(corpus.iter_hadiths_with_isnad([3, 1]))
+    assert [record.id for record in records] == [1, 3]
+    assert records[0].matn == "إنما الأعمال بالنيات"
+    assert [(link.name, link.geography, link.position_in_chain) for link in records[0].isnad][:2] == [
+        ("محمد بن إسماعيل", "Bukhara", 0), ("مالك بن أنس", "Madinah", 1),
+    ]
+    assert len(corpus.get_all_hadiths_with_isnad()) == 3
+
+
+def test_tree_elements_are_built_as_hadiths_are_read(tree):
+    read = []
+
+    def hadiths():
+        for hadith in tree.db.iter_hadiths_with_isnad():
+            read.append(hadith.id)
+            yield hadith
+
+    elements = tree.iter_tree_elements(hadiths())
+    first = next(elements)
+    assert isinstance(first, Node) and read == [1]
+    list(elements)
+    assert read == [1, 2, 3]
+
+
+def test_streamed_tree_matches_the_list_form(tree):
+    isnads, matns = tree.fetch_all_hadiths()
+    streamed = tree.build_hadith_tree_for_multiple_hadiths(tree.db.iter_hadiths_with_isnad())
+    assert streamed == tree.build_hadith_tree_for_multiple_hadiths(isnads, matns)
@@ -0,0 +1,34 @@
+import os
+
+from conftest import ANAS, BUKHARI, IBN_UMAR, MALIK, NAFI, QATADA, SHUBA, hadith_text, make_hadith
+from main import iter_hadiths
+
+
+def isnad_rows(db, hadith_id):
+    return db.conn.execute('''
+        SELECT narrator_id, next_narrator_id, position_in_chain FROM Isnads
+        WHERE hadith_id = ? ORDER BY position_in_chain, id
+    ''', (hadith_id,)).fetchall()
+
+
+def test_insert_hadiths_writes_isnads_in_order(corpus):
+    assert isnad_rows(corpus, 1) == [(BUKHARI, MALIK, 0), (MALIK, NAFI, 1), (NAFI, IBN_UMAR, 2), (IBN_UMAR, None, 3)]
+    assert isnad_rows(corpus, 2)[-1] == (ANAS, None, 3)
+    assert corpus.conn.execute('SELECT COUNT(*) FROM Hadiths').fetchone()[0] == 3
+
+
+def test_insert_hadiths_with_given_ids_and_batches(db):
+    hadiths = [make_hadith(["البخاري", "مالك"], f"متن {i}") for i in range(5)]
+    assert db.insert_hadiths(hadiths, commit_every=2, hadith_ids=[10, 11, 12, 13, 14]) == [10, 11, 12, 13, 14]
+    assert db.insert_hadith(make_hadith(["شعبة", "قتادة"])) == 15
+    assert [row[0] for row in isnad_rows(db, 15)] == [SHUBA, QATADA]
+
+
+def test_parallel_parse_matches_serial(tmp_path):
+    for i in range(6):
+        (tmp_path / f"h_{i}.txt").write_text(hadith_text(["البخاري", "مالك", f"راو {i}"]), encoding='utf-8')
+
+    serial = [(hadith.file_path, hadith.narrators) for hadith in iter_hadiths(str(tmp_path))]
+    parallel = [(hadith.file_path, hadith.narrators) for hadith in iter_hadiths(str(tmp_path), workers=2, chunksize=2)]
+    assert serial == parallel
+    assert [path for path, _ in serial] == sorted(os.listdir(tmp_path), key=lambda name: int(name[2:-4]))
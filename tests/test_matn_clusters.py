@@ -0,0 +1,55 @@
+import hadith_database
+import hadith_tree
+from conftest import make_hadith
+from hadith_tree import HadithTree
+from matn_index import BANDS
+from records import Edge, Node
+
+ISNAD = ["محمد بن إسماعيل", "مالك", "نافع", "ابن عمر"]
+MATN = "إنما الأعمال بالنيات وإنما لكل امرئ ما نوى فمن كانت هجرته إلى الله ورسوله فهجرته إلى الله ورسوله"
+VARIANT = "إنما الأعمال بالنيات وإنما لكل امرئ ما نوى فمن كانت هجرته إلى الله ورسوله فهجرته إلى ما هاجر إليه"
+OTHER = "لا يؤمن أحدكم حتى يحب لأخيه ما يحب لنفسه من الخير وحتى يكون الله ورسوله أحب إليه مما سواهما"
+
+
+def test_variants_share_a_cluster(db):
+    db.insert_hadiths([make_hadith(ISNAD, MATN), make_hadith(ISNAD, OTHER), make_hadith(ISNAD, VARIANT)])
+    assert db.get_matn_cluster(3) == [1, 3]
+    assert db.get_matn_clusters(min_size=2) == {1: [1, 3]}
+
+
+def test_crowded_bucket_compares_the_newest_matns(db, monkeypatch):
+    # Every matn shares every bucket, and only one is read from each
+    monkeypatch.setattr(hadith_database, 'band_buckets', lambda signature: list(range(BANDS)))
+    monkeypatch.setattr(hadith_database, 'MAX_BUCKET_CANDIDATES', 1)
+
+    db.insert_hadiths([make_hadith(ISNAD, OTHER), make_hadith(ISNAD, MATN), make_hadith(ISNAD, VARIANT)])
+    assert db.get_matn_cluster(3) == [2, 3]
+
+
+def test_removing_a_matn_keeps_its_cluster_named_after_the_smallest_id(db):
+    db.insert_hadiths([make_hadith(ISNAD, MATN), make_hadith(ISNAD, VARIANT), make_hadith(ISNAD, MATN)])
+    assert db.get_matn_clusters() == {1: [1, 2, 3]}
+
+    db.delete_hadiths([1])
+    assert db.get_matn_clusters() == {2: [2, 3]}
+
+    # A new hadith reusing the removed id starts its own cluster
+    db.insert_hadiths([make_hadith(ISNAD, OTHER)], hadith_ids=[1])
+    assert db.get_matn_clusters() == {1: [1], 2: [2, 3]}
+
+
+def test_merged_tree_looks_clusters_up_per_batch(db, db_path, monkeypatch):
+    db.insert_hadiths([make_hadith(ISNAD, MATN), make_hadith(ISNAD, OTHER), make_hadith(ISNAD, VARIANT)])
+    assert db.get_matn_cluster_ids([2, 3, 99]) == {2: 2, 3: 1}
+
+    monkeypatch.setattr(hadith_tree, 'MATN_CLUSTER_BATCH', 1)
+    monkeypatch.setattr(hadith_tree, 'MAX_SEEN_MATNS', 1)
+    tree = HadithTree(db_path)
+    hadiths, matn_clusters = tree.iter_hadiths(merge_variant_matns=True)
+    elements = list(tree.iter_tree_elements(hadiths, matn_clusters=matn_clusters))
+    tree.close()
+
+    # The variant joins the matn of hadith 1, forgotten for hadith 2 and so yielded again
+    matn_nodes = [element.id for element in elements if isinstance(element, Node) and element.is_matn]
+    assert matn_nodes == ["matn_c1", "matn_c2", "matn_c1"]
+    assert {element.target for element in elements if isinstance(element, Edge)} >= {"matn_c1", "matn_c2"}
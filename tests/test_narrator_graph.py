@@ -0,0 +1,65 @@
+from conftest import ANAS, BUKHARI, IBN_UMAR, MALIK, NAFI, QATADA, SHUBA, make_hadith
+from hadith_database import HadithDatabase
+
+
+def test_graph_counts_supporting_hadiths(corpus):
+    graph = corpus.narrator_graph
+    assert graph.students_of(MALIK) == {BUKHARI: 2}
+    assert graph.teachers_of(QATADA) == {ANAS: 1}
+    assert graph.supporting_hadiths(IBN_UMAR, NAFI) == [1, 3]
+    assert graph.degree_ranking("in", limit=1) == [(BUKHARI, 2)]
+
+
+def test_loaded_graph_ignores_transmissions_already_stored(corpus):
+    graph = corpus.narrator_graph
+
+    # Linking an isnad again, or one that repeats a pair, adds nothing new
+    hadith = make_hadith(["محمد بن إسماعيل", "مالك", "نافع", "ابن عمر"])
+    corpus.link_narrators_in_isnad(1, hadith)
+    corpus.link_narrators_in_isnad(1, hadith)
+    assert graph.supporting_hadiths(MALIK, BUKHARI) == [1, 3]
+
+    corpus.insert_hadiths([make_hadith(["محمد بن إسماعيل", "شعبة", "قتادة", "شعبة", "قتادة"])])
+    assert graph.supporting_hadiths(QATADA, SHUBA) == [2, 4]
+    assert graph.students_of(SHUBA) == {BUKHARI: 2, QATADA: 1}
+
+
+def test_transmissions_backfill_only_runs_once(db_path, corpus, monkeypatch):
+    # A hadith whose isnad resolves to a single narrator has no transmissions
+    corpus.cursor.execute('DELETE FROM NarratorTransmissions')
+    corpus.conn.commit()
+
+    monkeypatch.setattr(HadithDatabase, 'rebuild_narrator_transmissions', lambda self: 1 / 0)
+    HadithDatabase(db_path).close()
+
+
+CO_NARRATOR_ISNAD = ["محمد بن إسماعيل", ["مالك", "شعبة"], ["نافع", "قتادة"], "ابن عمر"]
+
+
+def inferred_transmissions(db):
+    return db.conn.execute('''
+        SELECT teacher_id, student_id, inferred FROM NarratorTransmissions ORDER BY teacher_id, student_id
+    ''').fetchall()
+
+
+def test_links_between_co_narrator_groups_are_inferred(db):
+    db.insert_hadiths([make_hadith(CO_NARRATOR_ISNAD)])
+    assert inferred_transmissions(db) == [
+        (MALIK, BUKHARI, 0),
+        (NAFI, MALIK, 1),
+        (IBN_UMAR, NAFI, 0),
+        (IBN_UMAR, QATADA, 0),
+        (SHUBA, BUKHARI, 0),
+        (QATADA, SHUBA, 1),
+    ]
+
+
+def test_inferred_flag_is_backfilled(db_path, db):
+    db.insert_hadiths([make_hadith(CO_NARRATOR_ISNAD)])
+    db.cursor.execute('ALTER TABLE NarratorTransmissions DROP COLUMN inferred')
+    db.cursor.execute('PRAGMA user_version = 2')
+    db.conn.commit()
+
+    reopened = HadithDatabase(db_path)
+    assert [row[2] for row in inferred_transmissions(reopened)] == [0, 1, 0, 0, 0, 1]
+    reopened.close()
@@ -0,0 +1,152 @@
+from conftest import BUKHARI, IBN_UMAR, MALIK, NAFI, NARRATORS, QATADA, SHUBA, make_hadith
+from hadith_database import HadithDatabase
+from narrator_graph import transmission_pairs
+from narrator_resolver import NarratorResolver, edit_distance, normalize_name, split_aliases
+
+
+def build_resolver():
+    # (narrator_id, alias, is_name, death_date) rows as read from NarratorAliases
+    return NarratorResolver.from_alias_rows([
+        (1, "مالك بن أنس", 1, 179), (1, "مالك", 0, 179), (1, "أبو عبد الله", 0, 179),
+        (2, "أنس بن مالك", 1, 93), (2, "أنس", 0, 93),
+        (3, "محمد بن إسماعيل", 1, 256), (3, "أبو عبد الله", 0, 256),
+    ])
+
+
+def test_split_aliases_accepts_both_separators():
+    assert split_aliases("مالك| أبو عبد الله ,الإمام") == ["مالك", "أبو عبد الله", "الإمام"]
+    assert split_aliases(None) == []
+
+
+def test_finds_names_and_aliases_without_tashkeel(db):
+    assert db.find_narrator_candidates("مَالِكُ بْنُ أَنَسٍ") == [MALIK]
+    assert db.find_narrator_candidates("مالك") == [MALIK]
+    assert db.find_narrator_candidates("أنس") == [7]
+    assert db.find_narrator_candidates("مجهول") == []
+    assert normalize_name(" مَالِك ") == "مالك"
+
+
+def test_reports_ambiguous_aliases():
+    resolver = build_resolver()
+    assert resolver.ambiguous_aliases() == {"أبو عبد الله": [1, 3]}
+    assert resolver.death_dates == {1: 179, 2: 93, 3: 256}
+
+
+def test_full_name_takes_precedence_over_alias(db):
+    db.add_narrator("نافع مولى ابن عمر", truncated_names=["نافع"])
+    assert db.find_narrator_candidates("نافع") == [NAFI]
+
+
+def test_fuzzy_candidates_find_misspelled_names():
+    resolver = build_resolver()
+    matches = resolver.fuzzy_candidates("مالك بن انس")  # Alef without hamza
+    assert matches[0].narrator_id == 1 and matches[0].score == 1.0
+
+    matches = resolver.fuzzy_candidates("محمد بن اسمعيل")
+    assert matches[0].narrator_id == 3 and 0.85 <= matches[0].score < 1
+    assert resolver.fuzzy_candidates("خالد بن الوليد") == []
+
+
+def test_edit_distance_stops_past_the_limit():
+    assert edit_distance("كتاب", "كاتب", 5) == 2
+    assert edit_distance("كتاب", "مكتبات", 1) == 2
+
+
+def test_database_resolver_follows_added_narrators(db):
+    assert db.narrator_resolver.aliases["البخاري"] == [BUKHARI]
+    db.add_narrator("يحيى بن سعيد", "Basra", 198, truncated_names=["يحيى القطان"])
+    assert db.narrator_resolver.aliases["يحيى القطان"] == [8]
+    assert db.narrator_resolver.death_dates[8] == 198
+
+
+def test_resolve_isnad_uses_aliases(db):
+    isnad = db.resolve_isnad(make_hadith(["البخاري", "مالك", "نافع", "ابن عمر"]))
+    assert isnad == [[BUKHARI], [MALIK], [NAFI], [IBN_UMAR]]
+
+
+def test_resolve_isnad_keeps_the_narrators_past_an_unknown_one(db):
+    isnad = db.resolve_isnad(make_hadith(["البخاري", "رجل مجهول تماما", "نافع", ["ابن عمر", "رجل آخر مجهول"]]))
+    assert isnad == [[BUKHARI], [], [NAFI], [IBN_UMAR]]
+    reviews = db.get_narrator_reviews()
+    assert [review[1] for review in reviews] == ["رجل مجهول تماما", "رجل آخر مجهول"]
+
+    # Nobody is linked across the gap
+    assert list(transmission_pairs(isnad)) == [(IBN_UMAR, NAFI, False)]
+    assert db.build_isnad_rows(1, isnad) == [(1, BUKHARI, None, 0), (1, NAFI, IBN_UMAR, 2), (1, IBN_UMAR, None, 3)]
+
+
+def test_fuzzy_match_links_and_queues_for_review(db):
+    isnad = db.resolve_isnad(make_hadith(["البخاري", "مالك بن انس", "نافع"]))
+    assert isnad == [[BUKHARI], [MALIK], [NAFI]]
+    assert db.get_narrator_reviews('linked')[0][4] == MALIK
+
+
+def test_ambiguous_alias_resolved_from_chain_context(db_path):
+    db = HadithDatabase(db_path)
+    db.add_narrators([
+        ("سفيان بن عيينة", "Makkah", 198, None, ["سفيان"]),
+        ("سفيان الثوري", "Kufa", 161, None, ["سفيان"]),
+        ("عبد الرحمن بن مهدي", "Basra", 198, None, []),
+        ("الحميدي", "Makkah", 219, None, []),
+    ])
+    # Ibn Mahdi is known to have heard from al-Thawri
+    db.insert_hadiths([make_hadith(["عبد الرحمن بن مهدي", "سفيان الثوري"])])
+
+    assert db.resolve_isnad(make_hadith(["عبد الرحمن بن مهدي", "سفيان"])) == [[3], [2]]
+    # Without context the narrator with more transmissions overall is preferred
+    assert db.resolve_isnad(make_hadith(["الحميدي", "سفيان"])) == [[4], [2]]
+    assert db.rank_narrator_candidates([1, 2])[0][0] == 2
+    db.close()
+
+
+def test_ambiguous_alias_resolved_from_death_dates(db):
+    # Neither Shu'ba has transmissions, so only the death dates tell them apart
+    db.add_narrator("شعبة بن دينار", "Kufa", 20, truncated_names=["شعبة"])
+    db.add_narrator("الراوي المتأخر", "Basra", 200)
+    assert db.resolve_isnad(make_hadith(["الراوي المتأخر", "شعبة"])) == [[9], [SHUBA]]
+
+    # A teacher dying over a century before the student is implausible
+    ranked = db.rank_narrator_candidates([8, SHUBA], students=[9])
+    assert [narrator_id for narrator_id, _ in ranked] == [SHUBA, 8]
+    assert ranked[1][1][1] == -1
+
+
+def test_co_narrators_are_context_for_the_next_position(db):
+    db.add_narrator("شعبة بن دينار", "Basra", 170, truncated_names=["شعبة"])
+    db.insert_hadiths([
+        make_hadith(["مالك", "شعبة بن دينار"]),
+        make_hadith(["نافع", "شعبة بن دينار"]),
+        make_hadith(["قتادة", "شعبة بن الحجاج"]),
+    ])
+    # Without context the Shu'ba with more transmissions is preferred
+    assert db.resolve_isnad(make_hadith(["البخاري", "شعبة"])) == [[BUKHARI], [8]]
+    # Qatada, listed with a co-narrator, is known to have heard from the other one
+    assert db.resolve_isnad(make_hadith([["البخاري", "قتادة"], "شعبة"])) == [[BUKHARI, QATADA], [SHUBA]]
+
+
+def test_resolver_is_built_from_narrator_aliases(db):
+    resolver = db.narrator_resolver
+    for alias, narrator_id, is_name in db.conn.execute('SELECT alias, narrator_id, is_name FROM NarratorAliases'):
+        assert resolver.names[alias] == narrator_id if is_name else narrator_id in resolver.aliases[alias]
+    assert resolver.death_dates[MALIK] == 179
+
+
+def test_resolver_follows_narrator_sync(db):
+    db.narrator_resolver
+    rows = [
+        {"name": name, "location": location, "death_date": str(death_date), "truncated_names": "|".join(aliases), "id": str(narrator_id)}
+        for narrator_id, (name, location, death_date, _, aliases) in enumerate(NARRATORS, 1)
+    ]
+    rows[MALIK - 1]["truncated_names"] = "إمام دار الهجرة"
+    db.sync_narrators(rows)
+    assert db.narrator_resolver.aliases["إمام دار الهجرة"] == [MALIK]
+    assert "مالك" not in db.narrator_resolver.aliases
+    assert db.find_narrator_candidates("مالك") == []
+
+
+def test_resolver_follows_other_connections(db, db_path):
+    db.narrator_resolver
+    other = HadithDatabase(db_path)
+    other.add_narrator("سفيان الثوري", "Kufa", 161, truncated_names=["الثوري"])
+    other.close()
+    assert db.narrator_resolver.aliases["الثوري"] == [8]
@@ -0,0 +1,25 @@
+import json
+
+from records import Edge, HadithRecord, NarratorLink, Node, elements_to_json, to_cytoscape
+
+
+def test_records_have_no_instance_dict():
+    for record in (NarratorLink("نافع", "Madinah", 2), Node("nنافع", "نافع"), Edge("a", "b"), HadithRecord(1, "متن", [])):
+        assert not hasattr(record, '__dict__')
+
+
+def test_cytoscape_elements_are_made_at_the_output():
+    elements = [
+        Node("nنافع", "نافع", "Madinah", position_in_chain=2),
+        Node("matn_0", "إنما الأعمال بالنيات", is_matn=True),
+        Edge("nنافع", "matn_0"),
+    ]
+    assert to_cytoscape(elements) == [
+        {"data": {"id": "nنافع", "label": "نافع", "geography": "Madinah"}},
+        {"data": {"id": "matn_0", "label": "إنما الأعمال بالنيات", "isMatn": True}},
+        {"data": {"source": "nنافع", "target": "matn_0"}},
+    ]
+
+    converted = json.loads(elements_to_json(elements, {"nنافع": (10, -200)}))
+    assert converted[0]["position"] == {"x": 10, "y": -200}
+    assert "position" not in converted[1]
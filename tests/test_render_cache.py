@@ -0,0 +1,69 @@
+import pytest
+
+from conftest import make_hadith
+from hadith_database import HadithDatabase
+from hadith_tree import HadithTree
+from render_cache import RenderCache
+
+
+@pytest.fixture
+def tree(corpus, db_path, tmp_path):
+    cached = HadithTree(db_path, render_cache_dir=str(tmp_path / 'render_cache'))
+    yield cached
+    cached.close()
+
+
+def test_content_hashes_are_stored_at_ingest(corpus):
+    hashes = dict(corpus.get_content_hashes())
+    assert sorted(hashes) == [1, 2, 3]
+    assert len(set(hashes.values())) == 3
+
+    corpus.insert_hadiths([make_hadith(["محمد بن إسماعيل", "مالك", "نافع"], "الدين النصيحة")])
+    assert dict(corpus.get_content_hashes([1, 2, 3])) == hashes
+    assert len(list(corpus.get_content_hashes())) == 4
+
+
+def test_content_hashes_are_backfilled(corpus, db_path):
+    hashes = list(corpus.get_content_hashes())
+    corpus.cursor.execute('UPDATE Hadiths SET content_hash = NULL')
+    corpus.cursor.execute('PRAGMA user_version = 3')
+    corpus.conn.commit()
+
+    reopened = HadithDatabase(db_path)
+    assert list(reopened.get_content_hashes()) == hashes
+    reopened.close()
+
+
+def test_unchanged_view_reads_no_hadiths(tree, monkeypatch):
+    path = tree.generate_tree_from_database({})
+
+    def full_read(hadith_ids=None):
+        raise AssertionError("read every hadith to find a cached view")
+
+    monkeypatch.setattr(tree.db, 'iter_hadiths_with_isnad', full_read)
+    assert tree.generate_tree_from_database({}) == path
+
+
+def test_commit_by_another_connection_changes_the_key(tree, db_path):
+    path = tree.generate_tree_from_database({})
+
+    # Another writer, as a separate ingest process would be, whose listeners this tree never sees
+    writer = HadithDatabase(db_path)
+    writer.insert_hadiths([make_hadith(["محمد بن إسماعيل", "مالك", "نافع"], "الدين النصيحة")])
+    writer.close()
+
+    assert tree.generate_tree_from_database({}) != path
+
+
+def test_failed_render_leaves_no_files(tmp_path):
+    cache = RenderCache(str(tmp_path))
+
+    def render(path):
+        with open(path, 'w') as f:
+            f.write('<html>')
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        cache.put('key', [1], render)
+    assert list(tmp_path.iterdir()) == []
+    assert cache.get('key') is None
@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import make_hadith
+from hadith_search import build_match_query, fold_arabic
+
+
+def test_fold_arabic_spelling_variants():
+    assert fold_arabic("أَحْمَدُ إِلى الصَّلاةِ") == "احمد الي الصلاه"
+    assert fold_arabic(None) is None
+
+
+def test_build_match_query():
+    assert build_match_query("صلاة الجماعة") == '"صلاه" "الجماعه"'
+    assert build_match_query("صلا*") == '"صلا"*'
+    assert build_match_query("مالك بن أنس", columns=["narrators"], phrase=True) == '{narrators} : ("مالك بن انس")'
+    assert build_match_query("  ") is None
+    with pytest.raises(ValueError):
+        build_match_query("صلاة", columns=["isnad"])
+
+
+def test_search_matn_and_narrators(corpus):
+    assert [result.hadith_id for result in corpus.search("صَلاةُ الفذ")] == [3]
+    assert {result.hadith_id for result in corpus.search("الأعمال")} == {1}
+    assert {result.hadith_id for result in corpus.search("نافع", columns=["narrators"])} == {1, 3}
+    assert corpus.search("نافع", columns=["matn"]) == []
+    assert {result.hadith_id for result in corpus.search("قتادة بن دعامة", phrase=True)} == {2}
+
+
+def test_search_snippet_marks_matches(corpus):
+    result = corpus.search("الجماعة", columns=["matn"])[0]
+    assert "[الجماعه]" in result.snippet
+
+
+def test_search_index_follows_deletes(corpus):
+    corpus.delete_hadiths([3])
+    corpus.conn.commit()
+    assert corpus.search("الفذ") == []
+
+
+def test_ingest_indexes_as_a_rebuild_would(corpus):
+    corpus.insert_hadiths([make_hadith(["البخاري", "مالك"], "صلاة الليل مثنى مثنى", "h_4.txt")])
+    incremental = corpus.conn.execute('SELECT rowid, matn, narrators FROM HadithSearch ORDER BY rowid').fetchall()
+    corpus.rebuild_search_index()
+    assert corpus.conn.execute('SELECT rowid, matn, narrators FROM HadithSearch ORDER BY rowid').fetchall() == incremental
+    assert [result.hadith_id for result in corpus.search("الليل")] == [4]
+
+
+def test_matn_matches_rank_first_and_limit_applies(corpus):
+    # نافع is a narrator of hadiths 1 and 3, and in the matn of the new one
+    corpus.insert_hadiths([make_hadith(["شعبة", "قتادة"], "قال نافع الحديث", "h_4.txt")])
+    results = corpus.search("نافع")
+    assert results[0].hadith_id == 4
+    assert [result.score for result in results] == sorted(result.score for result in results)
+    assert len(corpus.search("نافع", limit=2)) == 2
@@ -0,0 +1,53 @@
+import pytest
+
+from hadith_tree import HadithTree
+from conftest import NAFI
+from records import AmbiguousNarrator, Edge, Node
+
+
+@pytest.fixture
+def tree(corpus, db_path):
+    tree = HadithTree(db_path)
+    yield tree
+    tree.close()
+
+
+def narrator_nodes(elements):
+    return {element.label for element in elements if isinstance(element, Node)}
+
+
+def test_around_narrator(tree):
+    elements = tree.subgraph.around_narrator("نافع", up=1, down=1)
+    assert narrator_nodes(elements) == {"نافع", "مالك بن أنس", "عبد الله بن عمر"}
+    assert sum(isinstance(element, Edge) for element in elements) == 2
+
+    with pytest.raises(ValueError):
+        tree.subgraph.around_narrator("مجهول")
+
+
+def test_ambiguous_name_lists_the_candidates(tree, corpus):
+    # Two narrators known as نافع, which one is asked for by id
+    corpus.add_narrator("نافع بن جبير", "Madinah", 99, truncated_names=["نافع"])
+    corpus.add_narrator("نافع مولى ابن عمر", "Madinah", 117, truncated_names=["نافع"])
+    corpus.cursor.execute("UPDATE Narrators SET name = 'نافع المدني' WHERE id = ?", (NAFI,))
+    corpus.rebuild_narrator_aliases()
+
+    with pytest.raises(AmbiguousNarrator) as error:
+        tree.subgraph.around_narrator("نافع")
+    assert [narrator_id for narrator_id, _ in error.value.candidates] == [8, 9]
+
+    assert narrator_nodes(tree.subgraph.around_narrator(NAFI, up=1, down=0)) == {"نافع المدني", "عبد الله بن عمر"}
+    with pytest.raises(ValueError):
+        tree.subgraph.around_narrator(99)
+
+
+def test_for_geography_and_death_range(tree):
+    assert narrator_nodes(tree.subgraph.for_geography("Basra")) == {"شعبة بن الحجاج", "قتادة بن دعامة", "أنس بن مالك"}
+    assert narrator_nodes(tree.subgraph.for_death_range(100, 120)) == {"نافع", "قتادة بن دعامة"}
+
+
+def test_for_hadiths_includes_matn(tree):
+    elements = tree.subgraph.for_hadiths([2])
+    assert any(isinstance(element, Node) and element.is_matn for element in elements)
+    assert "شعبة بن الحجاج" in narrator_nodes(elements)
+    assert "نافع" not in narrator_nodes(elements)
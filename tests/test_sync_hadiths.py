@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+from conftest import BUKHARI, MALIK, NAFI, hadith_text, make_hadith
+from main import iter_hadiths, sync_hadiths
+
+
+@pytest.fixture
+def hadith_dir(tmp_path):
+    directory = tmp_path / 'hadiths'
+    directory.mkdir()
+    for i in range(1, 6):
+        (directory / f"h_{i}.txt").write_text(hadith_text(["البخاري", "مالك", "نافع"], f"متن {i}"), encoding='utf-8')
+    return directory
+
+
+def stored_matns(db):
+    return dict(db.conn.execute('SELECT file_path, matn FROM Hadiths').fetchall())
+
+
+def test_first_sync_adds_every_file(db, hadith_dir):
+    assert sync_hadiths(db, str(hadith_dir), commit_every=2) == (5, 0, 0)
+    assert stored_matns(db) == {f"h_{i}.txt": f"متن {i}" for i in range(1, 6)}
+    assert len(db.get_hadith_files()) == 5
+
+
+def test_resync_only_touches_changed_files(db, hadith_dir):
+    sync_hadiths(db, str(hadith_dir))
+    ids = dict(db.conn.execute('SELECT file_path, id FROM Hadiths').fetchall())
+
+    assert sync_hadiths(db, str(hadith_dir)) == (0, 0, 0)
+
+    (hadith_dir / "h_2.txt").write_text(hadith_text(["البخاري", "مالك"], "متن معدل"), encoding='utf-8')
+    os.remove(hadith_dir / "h_4.txt")
+    (hadith_dir / "h_6.txt").write_text(hadith_text(["شعبة", "قتادة"], "متن جديد"), encoding='utf-8')
+    assert sync_hadiths(db, str(hadith_dir)) == (1, 1, 1)
+
+    matns = stored_matns(db)
+    assert matns["h_2.txt"] == "متن معدل" and "h_4.txt" not in matns and matns["h_6.txt"] == "متن جديد"
+    # The edited file keeps its hadith id
+    assert db.conn.execute("SELECT id FROM Hadiths WHERE file_path = 'h_2.txt'").fetchone()[0] == ids["h_2.txt"]
+    assert db.conn.execute('SELECT COUNT(*) FROM Isnads WHERE hadith_id = ?', (ids["h_4.txt"],)).fetchone()[0] == 0
+
+
+def test_touched_but_identical_file_is_not_reingested(db, hadith_dir):
+    sync_hadiths(db, str(hadith_dir))
+    os.utime(hadith_dir / "h_1.txt", ns=(1, 1))
+    assert sync_hadiths(db, str(hadith_dir)) == (0, 0, 0)
+    assert db.get_hadith_files()["h_1.txt"][0] == 1
+
+
+def test_unmanaged_hadiths_are_adopted_or_removed(db, hadith_dir):
+    # Inserted by an older main.py, without manifest entries, twice over
+    db.insert_hadiths(iter_hadiths(str(hadith_dir)))
+    db.insert_hadiths(iter_hadiths(str(hadith_dir)))
+    os.remove(hadith_dir / "h_5.txt")
+
+    added, updated, removed = sync_hadiths(db, str(hadith_dir))
+    assert (added, updated, removed) == (0, 4, 2)
+    assert sorted(stored_matns(db)) == [f"h_{i}.txt" for i in range(1, 5)]
+    assert db.conn.execute('SELECT COUNT(*) FROM Hadiths').fetchone()[0] == 4
+
+
+def test_hadiths_without_a_file_are_kept(db, hadith_dir):
+    db.insert_hadith(make_hadith(["البخاري", "مالك"], "بلا ملف"))
+    sync_hadiths(db, str(hadith_dir))
+    assert stored_matns(db)[""] == "بلا ملف"
+
+
+def test_interrupted_sync_resumes(db, hadith_dir, monkeypatch):
+    calls = []
+    insert_hadiths = db.insert_hadiths
+
+    def failing_insert(hadiths, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return insert_hadiths(hadiths, **kwargs)
+
+    monkeypatch.setattr(db, 'insert_hadiths', failing_insert)
+    with pytest.raises(KeyboardInterrupt):
+        sync_hadiths(db, str(hadith_dir), commit_every=2)
+    db.conn.rollback()
+    monkeypatch.undo()
+
+    # The first batch was committed with its manifest entries
+    assert len(db.get_hadith_files()) == 2
+    assert sync_hadiths(db, str(hadith_dir), commit_every=2) == (3, 0, 0)
+    assert len(stored_matns(db)) == 5
+
+
+def test_resolved_review_is_linked_on_the_next_sync(db, hadith_dir):
+    (hadith_dir / "h_6.txt").write_text(hadith_text(["البخاري", "رجل مجهول تماما", "نافع"], "متن 6"), encoding='utf-8')
+    sync_hadiths(db, str(hadith_dir))
+    hadith_id = db.conn.execute("SELECT id FROM Hadiths WHERE file_path = 'h_6.txt'").fetchone()[0]
+
+    review_id = db.get_narrator_reviews()[0][0]
+    db.resolve_narrator_review(review_id, MALIK)
+    assert sync_hadiths(db, str(hadith_dir)) == (0, 1, 0)
+    assert db.conn.execute("SELECT id FROM Hadiths WHERE file_path = 'h_6.txt'").fetchone()[0] == hadith_id
+    narrators = db.conn.execute(
+        'SELECT narrator_id FROM Isnads WHERE hadith_id = ? ORDER BY position_in_chain', (hadith_id,)
+    ).fetchall()
+    assert narrators == [(BUKHARI,), (MALIK,), (NAFI,)]
@@ -0,0 +1,119 @@
+import csv
+import sqlite3
+
+import pytest
+
+from conftest import NAFI, NARRATORS
+from hadith_database import HadithDatabase
+
+FIELDS = ['name', 'location', 'death_date', 'link', 'truncated_names']
+
+
+def write_csv(path, rows, fields=FIELDS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def narrator(name, location='Basra', death_date='150', link='', truncated_names='', **extra):
+    return dict(name=name, location=location, death_date=death_date, link=link, truncated_names=truncated_names, **extra)
+
+
+@pytest.fixture
+def empty_db(db_path):
+    database = HadithDatabase(db_path)
+    yield database
+    database.close()
+
+
+def narrators(db):
+    return db.conn.execute('SELECT id, name, location, death_date, link, truncated_names FROM Narrators ORDER BY id').fetchall()
+
+
+def test_sync_reports_changes_and_keeps_ids(empty_db, tmp_path):
+    path = tmp_path / 'narrators.csv'
+    write_csv(path, [narrator("نافع", truncated_names="نافع مولى ابن عمر"), narrator("قتادة"), narrator("شعبة")])
+    assert empty_db.read_narrators_from_csv(path) == (3, 0, 0)
+    assert empty_db.read_narrators_from_csv(path) is None  # Unchanged file
+
+    write_csv(path, [narrator("نافع", location='Madinah', truncated_names="نافع مولى ابن عمر"), narrator("شعبة"), narrator("الأعمش")])
+    assert empty_db.read_narrators_from_csv(path) == (1, 1, 1)
+    assert [row[:3] for row in narrators(empty_db)] == [(1, "نافع", "Madinah"), (3, "شعبة", "Basra"), (4, "الأعمش", "Basra")]
+    assert empty_db.find_narrator_candidates("نافع مولى ابن عمر") == [1]
+    assert empty_db.find_narrator_candidates("قتادة") == []
+
+
+def test_empty_fields_are_stored_as_null(empty_db):
+    empty_db.sync_narrators([narrator("نافع", location='', death_date='', link='')])
+    assert narrators(empty_db) == [(1, "نافع", None, None, None, None)]
+
+    # Filling a field in and emptying it again goes back to NULL
+    empty_db.sync_narrators([narrator("نافع", location='Madinah')])
+    empty_db.sync_narrators([narrator("نافع", location='', death_date='')])
+    assert narrators(empty_db) == [(1, "نافع", None, None, None, None)]
+
+
+def test_duplicate_names_are_rejected(empty_db):
+    empty_db.sync_narrators([narrator("نافع")])
+    with pytest.raises(ValueError, match="نافع"):
+        empty_db.sync_narrators([narrator("نافع", location='Madinah'), narrator("نافع", location='Kufa')])
+    # Nothing was written
+    assert [row[:3] for row in narrators(empty_db)] == [(1, "نافع", "Basra")]
+
+
+def test_narrators_used_in_isnads_are_not_removed(corpus):
+    rows = [
+        narrator(name, location, str(death_date), truncated_names='|'.join(aliases), id=str(narrator_id))
+        for narrator_id, (name, location, death_date, _, aliases) in enumerate(NARRATORS, 1)
+    ]
+    with pytest.raises(ValueError, match="نافع"):
+        corpus.sync_narrators(rows[:2] + rows[3:])
+    assert corpus.find_narrator_candidates("نافع") == [NAFI]
+
+    # One that no isnad uses is removed with its aliases
+    corpus.add_narrator("سفيان الثوري", "Kufa", 161, truncated_names=["الثوري"])
+    assert corpus.sync_narrators(rows) == (0, 0, 1)
+    assert corpus.find_narrator_candidates("الثوري") == []
+
+
+def test_homonyms_are_kept_apart_by_id(empty_db, tmp_path):
+    path = tmp_path / 'narrators.csv'
+    fields = ['id'] + FIELDS
+    write_csv(path, [narrator("سفيان", 'Kufa', '161', id='1'), narrator("سفيان", 'Makkah', '198', id='2')], fields)
+    assert empty_db.read_narrators_from_csv(path) == (2, 0, 0)
+    assert [row[:3] for row in narrators(empty_db)] == [(1, "سفيان", "Kufa"), (2, "سفيان", "Makkah")]
+
+    write_csv(path, [narrator("سفيان", 'Kufa', '161', id='1'), narrator("سفيان", 'Makkah', '198', id='1')], fields)
+    with pytest.raises(ValueError):
+        empty_db.read_narrators_from_csv(path)
+
+
+def test_renamed_narrator_reindexes_search(corpus):
+    corpus.sync_narrators([
+        narrator(name, location, str(death_date), truncated_names='|'.join(aliases), id=str(narrator_id))
+        for narrator_id, (name, location, death_date, _, aliases) in enumerate([
+            ("محمد بن إسماعيل", "Bukhara", 256, None, ["البخاري"]),
+            ("مالك بن أنس الأصبحي", "Madinah", 179, None, ["مالك"]),
+            ("نافع", "Madinah", 117, None, []),
+            ("عبد الله بن عمر", "Madinah", 73, None, ["ابن عمر"]),
+            ("شعبة بن الحجاج", "Basra", 160, None, ["شعبة"]),
+            ("قتادة بن دعامة", "Basra", 117, None, ["قتادة"]),
+            ("أنس بن مالك", "Basra", 93, None, ["أنس"]),
+        ], 1)
+    ])
+    assert {result.hadith_id for result in corpus.search("الأصبحي")} == {1, 3}
+
+
+def test_empty_strings_from_older_versions_become_null(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE Narrators (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, location TEXT, '
+                 'death_date DATE, link TEXT, truncated_names TEXT)')
+    conn.execute("INSERT INTO Narrators (name, location, death_date, link) VALUES ('نافع', '', '', '')")
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    db = HadithDatabase(db_path)
+    assert narrators(db) == [(1, "نافع", None, None, None, None)]
+    db.close()
@@ -0,0 +1,110 @@
+import json
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import hadith_tree
+from hadith_tree import HadithTree
+from layout import layered_layout
+from records import Edge, Node
+
+# Stands in for the page and Cytoscape.js, holding the added elements by id
+VIEWER_STUB = """
+const document = {
+  getElementById: () => ({}),
+  createElement: () => ({}),
+  body: {appendChild() {}},
+};
+const added = new Map();
+let edges = 0;
+function cytoscape(options) {
+  return {
+    hasElementWithId: id => added.has(id),
+    add(elements) {
+      for (const element of [].concat(elements)) {
+        if (element.data.source === undefined) {
+          added.set(element.data.id, element);
+        } else {
+          edges += 1;
+        }
+      }
+    },
+    fit() {},
+    on() {},
+  };
+}
+"""
+
+
+def read_chunks(output_dir):
+    chunks = []
+    for chunk in json.loads(re.search(r'const manifest = (.*);', (output_dir / 'index.html').read_text(encoding='utf-8')).group(1))['chunks']:
+        text = (output_dir / chunk['file']).read_text(encoding='utf-8')
+        chunks.append(json.loads(text[text.index('['):text.rindex(']') + 1]))
+    return chunks
+
+
+@pytest.fixture
+def chunks(corpus, db_path, tmp_path):
+    tree = HadithTree(db_path)
+    tree.generate_chunked_tree_from_database({}, str(tmp_path / 'chunks'), chunk_size=5)
+    tree.close()
+    return read_chunks(tmp_path / 'chunks')
+
+
+def written_node_ids(chunks):
+    return [element['data']['id'] for chunk in chunks for element in chunk if 'source' not in element['data']]
+
+
+def test_each_node_is_written_once(chunks):
+    node_ids = written_node_ids(chunks)
+    assert len(node_ids) == len(set(node_ids))
+    assert len(chunks) > 1
+
+
+def test_chunks_share_the_height_of_each_level(chunks):
+    heights = {}
+    for chunk in chunks:
+        for element in chunk:
+            if 'position' in element:
+                heights.setdefault(element['data']['label'], element['position']['y'])
+
+    # Ibn Umar and Anas are both the source, at the top of different chunks
+    assert heights['عبد الله بن عمر'] == heights['أنس بن مالك'] < heights['مالك بن أنس'] < 0
+
+
+def test_top_level_fixes_the_rank_heights():
+    elements = [Node('a', 'a', position_in_chain=1), Node('b', 'b', position_in_chain=0), Edge('a', 'b')]
+    assert layered_layout(elements)['a'][1] == 0
+    assert layered_layout(elements, top_level=4)['a'][1] == layered_layout(elements)['a'][1] + 200
+
+
+def test_viewer_adds_every_edge_whatever_the_chunk_order(chunks, tmp_path):
+    if shutil.which('node') is None:
+        pytest.skip("node is not installed")
+
+    page = (tmp_path / 'chunks' / 'index.html').read_text(encoding='utf-8')
+    script = re.search(r'<script>(.*)</script>', page, re.S).group(1)
+    loads = "".join(f"hadithTreeChunk({index}, {json.dumps(chunk)});\n" for index, chunk in reversed(list(enumerate(chunks))))
+    check = "console.log(JSON.stringify([edges, waiting.size]));"
+    result = subprocess.run(['node', '-e', VIEWER_STUB + script + loads + check], capture_output=True, text=True, check=True)
+
+    edge_count = sum('source' in element['data'] for chunk in chunks for element in chunk)
+    assert json.loads(result.stdout) == [edge_count, 0]
+
+
+def test_forgotten_narrators_keep_one_node(corpus, db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(hadith_tree, 'MAX_SEEN_NARRATORS', 1)
+    tree = HadithTree(db_path)
+
+    elements = tree.build_hadith_tree_for_multiple_hadiths(tree.db.iter_hadiths_with_isnad())
+    node_ids = [element.id for element in elements if isinstance(element, Node)]
+    assert len(node_ids) == len(set(node_ids))
+    assert 'nمالك بن أنس' in node_ids
+
+    tree.generate_chunked_tree_from_database({}, str(tmp_path / 'chunks'), chunk_size=5)
+    tree.close()
+    node_ids = written_node_ids(read_chunks(tmp_path / 'chunks'))
+    assert len(node_ids) == len(set(node_ids))
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from urllib.parse import quote
+
+import pytest
+
+from hadith_database import HadithDatabase, SchemaError
+from tree_server import TreeServer
+
+TREE_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'tree_server.py')
+
+
+@pytest.fixture
+def server(corpus, db_path, tmp_path):
+    tree_server = TreeServer(db_path, pool_size=1, render_cache_dir=str(tmp_path / 'render_cache'))
+    yield tree_server
+    tree_server.close()
+
+
+def exchange(server, request):
+    """
+    Send raw request bytes to the server and return (status, body) of the
+    response, read until the server closes the connection.
+    """
+    async def run():
+        http_server = await server.start(port=0)
+        async with http_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', http_server.sockets[0].getsockname()[1])
+            writer.write(request)
+            writer.write_eof()
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    head, _, body = asyncio.run(run()).partition(b'\r\n\r\n')
+    return int(head.split()[1]), body
+
+
+def get(server, path):
+    return exchange(server, f"GET {path} HTTP/1.1\r\nConnection: close\r\n\r\n".encode('utf-8'))
+
+
+def test_hadith_tree(server):
+    status, body = get(server, '/hadith/1/tree')
+    assert status == 200
+    assert any(element['data'].get('label') == 'نافع' for element in json.loads(body))
+
+
+def test_unknown_hadith_and_narrator_are_not_found(server):
+    assert get(server, '/hadith/99/tree')[0] == 404
+    assert get(server, '/narrator/missing/subgraph')[0] == 404
+
+
+def test_ambiguous_narrator_lists_the_candidates(server, corpus):
+    corpus.add_narrator("أنس بن عياض", "Madinah", 200, truncated_names=["أنس"])
+    status, body = get(server, '/narrator/' + quote("أنس") + '/subgraph')
+    assert status == 409
+    assert [candidate['id'] for candidate in json.loads(body)['candidates']] == [7, 8]
+    assert get(server, '/narrator/7/subgraph?up=1&down=0')[0] == 200
+
+
+def test_other_value_errors_are_internal(server, monkeypatch):
+    def search(*args, **kwargs):
+        raise ValueError("bug")
+
+    monkeypatch.setattr(HadithDatabase, 'search', search)
+    assert get(server, '/search?q=x')[0] == 500
+
+
+def test_over_long_lines_are_rejected(server):
+    assert exchange(server, b"GET /" + b"a" * 2**17 + b" HTTP/1.1\r\n\r\n")[0] == 400
+    assert exchange(server, b"GET / HTTP/1.1\r\nX-Long: " + b"a" * 2**17 + b"\r\n\r\n")[0] == 431
+
+
+def test_database_is_checked_before_serving(tmp_path):
+    db_path = tmp_path / 'missing.db'
+    with pytest.raises(SchemaError):
+        TreeServer(str(db_path), pool_size=1)
+
+    result = subprocess.run([sys.executable, TREE_SERVER, '--db', str(db_path), '--port', '0'], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 1
+    assert "read-only" in result.stderr and "Traceback" not in result.stderr
+    assert not db_path.exists()